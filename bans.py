@@ -0,0 +1,81 @@
+"""Registro de sanciones activas con expiración automática.
+
+Las sanciones vigentes se indexan en memoria en un diccionario (consulta O(1))
+y en un min-heap ordenado por fecha de fin, de modo que las vencidas se
+eliminan en O(log n) según van caducando. La persistencia (con ids enteros)
+queda en el ``StateStore``.
+"""
+import heapq
+import time
+
+STRIKE_WINDOW = 30 * 86400  # Las sanciones de los últimos 30 días cuentan como reincidencia
+MAX_MULTIPLIER = 8  # Tope del escalado por reincidencia
+PURGE_INTERVAL = 60  # Segundos mínimos entre limpiezas de la base de datos
+
+
+class BanRegistry:
+    """Índice de sanciones vigentes respaldado por el store"""
+
+    def __init__(self, store, strike_window=STRIKE_WINDOW, max_multiplier=MAX_MULTIPLIER):
+        self._store = store
+        self.strike_window = strike_window
+        self.max_multiplier = max_multiplier
+        self._active = {}  # user_id -> until
+        self._heap = []  # (until, user_id); entradas obsoletas se descartan al salir
+        self._last_store_purge = 0.0
+
+    def load(self, now=None):
+        """Reconstruir el índice con las sanciones vigentes del store"""
+        now = now or time.time()
+        self._active = {int(user_id): until for user_id, until in self._store.active_bans(now)}
+        self._heap = [(until, user_id) for user_id, until in self._active.items()]
+        heapq.heapify(self._heap)
+        return len(self._active)
+
+    def __len__(self):
+        self.purge()
+        return len(self._active)
+
+    def purge(self, now=None):
+        """Retirar las sanciones vencidas (O(log n) por cada una)"""
+        now = now or time.time()
+        expired = 0
+        while self._heap and self._heap[0][0] <= now:
+            until, user_id = heapq.heappop(self._heap)
+            if self._active.get(user_id) == until:
+                del self._active[user_id]
+                expired += 1
+        if now - self._last_store_purge >= PURGE_INTERVAL:
+            self._last_store_purge = now
+            self._store.purge_bans(now, now - self.strike_window)
+        return expired
+
+    def ban_until(self, user_id, now=None):
+        """Fin de la sanción vigente del usuario, o None"""
+        now = now or time.time()
+        if self._heap and self._heap[0][0] <= now:
+            self.purge(now)
+        return self._active.get(int(user_id))
+
+    def ban(self, user_id, hours, now=None):
+        """Sancionar escalando la duración si el usuario reincide.
+
+        Devuelve (until, horas_efectivas, reincidencias).
+        """
+        now = now or time.time()
+        user_id = int(user_id)
+        strikes = 1
+        previous = self._store.get_ban(user_id)
+        if previous is not None:
+            _, previous_strikes, last_ban_at = previous
+            if now - last_ban_at < self.strike_window:
+                strikes = previous_strikes + 1
+
+        multiplier = min(2 ** (strikes - 1), self.max_multiplier)
+        effective_hours = hours * multiplier
+        until = max(now + effective_hours * 3600, self._active.get(user_id, 0))
+
+        self._store.ban_user(user_id, until, strikes, now)
+        self._active[user_id] = until
+        heapq.heappush(self._heap, (until, user_id))
+        return until, effective_hours, strikes
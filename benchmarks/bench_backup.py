@@ -0,0 +1,103 @@
+"""Tiempo que save_backup bloquea el event loop con 10k elementos pendientes.
+
+Compara la escritura original (json.dump con indent=2 en el hilo del loop)
+con la actual (copia de la base de datos SQLite en un hilo). Mientras tanto
+el loop consulta el store en cada tick, como harían los handlers: si la copia
+retuviera la conexión principal, esas consultas esperarían a que terminase.
+
+Uso: python benchmarks/bench_backup.py [n_items]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+_tmp_dir = tempfile.mkdtemp()
+os.environ["DB_PATH"] = os.path.join(_tmp_dir, "bench_state.db")
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+os.environ.setdefault("MODERATION_GROUP_ID", "-100")
+os.environ.setdefault("PUBLIC_CHANNEL", "@bench")
+
+import bot  # noqa: E402
+
+
+def fill_state(n):
+    """Mismo estado en los dicts del formato antiguo y en el store"""
+    now = time.time()
+    legacy = {
+        'pending_confessions': {}, 'pending_polls': {}, 'pending_voices': {},
+        'pending_questions': {}, 'banned_users': {}, 'user_last_confession': {},
+        'publication_queue': [],
+    }
+    for i in range(n):
+        legacy['pending_confessions'][i] = {"text": "confesión de prueba " * 10, "user_id": i}
+        legacy['pending_polls'][n + i] = {
+            "question": "¿Pregunta?", "options": ["a", "b", "c"], "is_anonymous": True,
+            "type": "regular", "allows_multiple_answers": False, "user_id": i,
+        }
+        legacy['user_last_confession'][i] = now
+        legacy['banned_users'][i] = now + 3600
+    for i in range(n // 10):
+        legacy['publication_queue'].append({"text": "en cola", "user_id": i, "_type": "text", "_id": 2 * n + i})
+    bot.store.import_legacy(legacy)
+    return legacy
+
+
+async def legacy_save_backup(legacy, path):
+    """Implementación original de BackupManager.save_backup"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(legacy, f, ensure_ascii=False, indent=2)
+
+
+async def max_loop_block(coro_factory, rounds=5):
+    """Mayor intervalo entre ticks de 1 ms (cada uno con una consulta al store)
+    mientras se ejecuta la corrutina"""
+    worst = 0.0
+    for _ in range(rounds):
+        gaps = []
+        done = asyncio.Event()
+
+        async def ticker():
+            last = time.perf_counter()
+            while not done.is_set():
+                await asyncio.sleep(0.001)
+                bot.store.has_item(0)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        task = asyncio.create_task(ticker())
+        await asyncio.sleep(0.01)
+        await coro_factory()
+        done.set()
+        await task
+        worst = max(worst, max(gaps))
+    return worst
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    legacy = fill_state(n)
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.json")
+        manager = bot.BackupManager(backup_file=os.path.join(tmp, "bot_backup.db"))
+
+        async def current_save():
+            bot.store.ban_user(0, time.time())  # forzar cambio
+            await manager.save_backup()
+
+        before = await max_loop_block(lambda: legacy_save_backup(legacy, legacy_path))
+        after = await max_loop_block(current_save)
+        skipped = await max_loop_block(manager.save_backup)
+
+        print(f"items pendientes: {2 * n}, en cola: {bot.store.queue_length()}")
+        print(f"antes  (JSON indent=2, en el loop): {before * 1000:8.1f} ms bloqueado, {os.path.getsize(legacy_path) / 1e6:.1f} MB")
+        print(f"ahora  (copia SQLite, en hilo):     {after * 1000:8.1f} ms bloqueado, {os.path.getsize(manager.backup_file) / 1e6:.1f} MB")
+        print(f"sin cambios (omitido):              {skipped * 1000:8.1f} ms bloqueado")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
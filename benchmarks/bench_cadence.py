@@ -0,0 +1,64 @@
+"""Cadencia adaptativa tal como la configura ``bot`` desde el entorno: coste de
+``interval``/``eta`` y comprobación del camino con el presupuesto por hora
+agotado (``MAX_POSTS_PER_HOUR`` publicaciones en la última hora, contando las
+aprobaciones directas).
+
+Uso: MAX_POSTS_PER_HOUR=6 python benchmarks/bench_cadence.py [backlog]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_state.db")
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+os.environ.setdefault("MODERATION_GROUP_ID", "-100")
+os.environ.setdefault("PUBLIC_CHANNEL", "@bench")
+os.environ.setdefault("ACTIVE_HOURS", "0-24")
+
+import bot  # noqa: E402
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    backlog = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    cadence = bot.cadence
+    now = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0).timestamp()
+    if not cadence.is_active(now):
+        now += cadence.until_active(now) + 60
+    budget = cadence.max_per_hour
+    print(f"Presupuesto: {budget}/h ({type(budget).__name__}), intervalo mínimo {cadence.min_interval:.0f}s")
+
+    pace = cadence.interval(backlog, now)
+    print(f"Backlog {backlog}: {pace:.0f}s entre publicaciones; "
+          f"interval {timed(lambda: cadence.interval(backlog, now), 10_000):.1f} µs/llamada")
+
+    # Agotar el presupuesto: la siguiente publicación espera a que salga la más antigua
+    first = now - 3000
+    for i in range(budget):
+        cadence.record(first + i * 600 / budget)
+    waited = cadence.interval(backlog, now)
+    expected = first + 3600 - now
+    assert abs(waited - max(pace, expected)) < 1e-6, (waited, expected)
+    assert cadence.posts_last_hour(now) == budget
+    print(f"Presupuesto agotado: espera {waited:.0f}s (la más antigua sale de la ventana en {expected:.0f}s)")
+    # Lo mismo que hacen PublicationScheduler._schedule y nudge al volver a armar el job
+    waited = cadence.interval(len(bot.publication_queue), now)
+    assert waited >= expected - 1e-6, waited
+
+    started = time.perf_counter()
+    eta = cadence.eta(backlog, now)
+    elapsed = (time.perf_counter() - started) * 1e3
+    print(f"Cola vacía en {bot.format_duration(eta) if eta is not None else '—'}; eta {elapsed:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Enrutado de 100k callbacks: cadena de startswith/split original frente a
+codec binario + tabla de handlers.
+
+Uso: python benchmarks/bench_callbacks.py [n_callbacks]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from callbacks import CallbackRouter, decode_callback, encode_callback  # noqa: E402
+
+
+async def noop(*args):
+    return None
+
+
+async def legacy_route(data):
+    """Orden y parseo de la cadena original de handle_moderation"""
+    if data.startswith("respond_question_"):
+        return await noop(int(data.split("_")[2]))
+    if data.startswith("sancionar_question_"):
+        return await noop(int(data.split("_")[2]))
+    if data.startswith("ban_question_"):
+        parts = data.split("_")
+        return await noop(int(parts[2]), int(parts[3]), int(parts[4]))
+    if data.startswith("cancel_question_"):
+        return await noop(int(data.split("_")[2]))
+    if data.startswith("sancionar_"):
+        parts = data.split("_")
+        return await noop(parts[1], int(parts[2]))
+    if data.startswith("ban_"):
+        parts = data.split("_")
+        return await noop(int(parts[1]), int(parts[2]), parts[3], int(parts[4]))
+    if data.startswith("cancel_"):
+        parts = data.split("_")
+        return await noop(int(parts[1]), parts[2] if len(parts) > 2 else "text")
+    if data.startswith("cola_"):
+        parts = data.split("_")
+        return await noop(parts[1], int(parts[2]))
+    if data.startswith("approve_") or data.startswith("reject_"):
+        parts = data.split("_")
+        return await noop(parts[0], parts[1], int(parts[2]))
+
+
+def build_router():
+    router = CallbackRouter()
+    for action, item_type in [
+        ("respond", "question"), ("sancionar", "question"), ("ban", "question"), ("cancel", "question"),
+        ("sancionar", None), ("ban", None), ("cancel", None), ("cola", None), ("approve", None), ("reject", None),
+    ]:
+        router.route(action, item_type)(noop)
+    return router
+
+
+def workload(n):
+    """Mezcla realista: la mayoría de pulsaciones son aprobar/cola/rechazar"""
+    rng = random.Random(42)
+    legacy, encoded = [], []
+    for _ in range(n):
+        item_id = rng.getrandbits(62)
+        user_id = rng.randrange(10**9, 10**10)
+        item_type = rng.choice(("text", "poll", "voice"))
+        action = rng.choices(("approve", "cola", "reject", "sancionar", "ban", "cancel"), (40, 30, 15, 5, 5, 5))[0]
+        if action == "ban":
+            legacy.append(f"ban_2_{item_id}_{item_type}_{user_id}")
+            encoded.append(encode_callback("ban", item_type, item_id, user_id, 2))
+        elif action == "cancel":
+            legacy.append(f"cancel_{item_id}_{item_type}")
+            encoded.append(encode_callback("cancel", item_type, item_id))
+        else:
+            legacy.append(f"{action}_{item_type}_{item_id}")
+            encoded.append(encode_callback(action, item_type, item_id))
+    return legacy, encoded
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    legacy, encoded = workload(n)
+    router = build_router()
+
+    t0 = time.perf_counter()
+    for data in legacy:
+        await legacy_route(data)
+    legacy_time = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for data in encoded:
+        await router.dispatch(None, decode_callback(data), None)
+    router_time = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for data in legacy:
+        await router.dispatch(None, decode_callback(data), None)
+    compat_time = time.perf_counter() - t0
+
+    print(f"{n:,} callbacks")
+    print(f"cadena startswith original:   {legacy_time * 1e6 / n:6.2f} µs/callback")
+    print(f"codec binario + router:       {router_time * 1e6 / n:6.2f} µs/callback")
+    print(f"formato antiguo + router:     {compat_time * 1e6 / n:6.2f} µs/callback")
+    print(f"longitud media callback_data: {sum(map(len, legacy)) / n:.1f} -> {sum(map(len, encoded)) / n:.1f} bytes")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+"""Índice de duplicados con 100k envíos: latencia de la consulta, memoria,
+aciertos con copias editadas y falsos positivos con textos nuevos.
+
+Las copias editadas cambian unas pocas palabras, la puntuación, las
+mayúsculas o las tildes del original, como hacen los usuarios al reenviar.
+
+Uso: python benchmarks/bench_duplicates.py [n_entradas] [n_consultas]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from duplicates import DuplicateIndex, fingerprint  # noqa: E402
+from storage import StateStore  # noqa: E402
+
+SYLLABLES = ("ma", "te", "ri", "so", "la", "pe", "cu", "di", "no", "ve", "ra", "to", "ca", "mi", "lo", "sa")
+
+
+def vocabulary(rng, size=3000):
+    return ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4))) for _ in range(size)]
+
+
+def random_text(rng, words):
+    return " ".join(rng.choice(words) for _ in range(rng.randint(12, 80)))
+
+
+def edited_copy(rng, text, words):
+    tokens = text.split()
+    for _ in range(max(1, len(tokens) // 15)):
+        position = rng.randrange(len(tokens))
+        action = rng.random()
+        if action < 0.4:
+            tokens[position] = rng.choice(words)
+        elif action < 0.7:
+            tokens.insert(position, rng.choice(words))
+        elif len(tokens) > 2:
+            del tokens[position]
+    edited = " ".join(tokens)
+    return edited.upper() + "!!" if rng.random() < 0.3 else edited.replace("a", "á") + "..."
+
+
+def timed(func, values):
+    latencies = []
+    results = []
+    for value in values:
+        started = time.perf_counter()
+        results.append(func(value))
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return results, latencies[len(latencies) // 2] * 1e6, latencies[int(len(latencies) * 0.99)] * 1e6
+
+
+def main():
+    n_entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    rng = random.Random(7)
+    words = vocabulary(rng)
+    texts = [random_text(rng, words) for _ in range(n_entries)]
+
+    store = StateStore(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    now = time.time()
+    started = time.perf_counter()
+    rows = []
+    for i, text in enumerate(texts):
+        fp = fingerprint(text)
+        rows.append((i, now - n_entries + i, fp.exact, fp.signature.tobytes() if fp.signature is not None else None))
+    store._executemany(
+        "INSERT INTO fingerprints (item_id, created_at, exact, signature) VALUES (?, ?, ?, ?)", rows
+    )
+    print(f"Huellas de {n_entries:,} textos: {time.perf_counter() - started:.1f}s")
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = DuplicateIndex(store, retention=2 * n_entries, max_entries=n_entries)
+    index.load(now)
+    load_time = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"Carga del índice: {load_time:.2f}s, {len(index):,} entradas, "
+          f"{memory / 1e6:.1f} MB ({memory / len(index):.0f} B/entrada)")
+
+    originals = rng.sample(range(n_entries), n_queries)
+    edited = [edited_copy(rng, texts[i], words) for i in originals]
+    exact = [texts[i] for i in originals]
+    fresh = [random_text(rng, words) for _ in range(n_queries)]
+
+    def check(text):
+        return index.find(fingerprint(text))
+
+    print(f"\n{'consulta':<20} {'p50 µs':>8} {'p99 µs':>8} {'detectados':>11}")
+    for name, queries, expected in (("exactos", exact, originals), ("copias editadas", edited, originals),
+                                    ("textos nuevos", fresh, None)):
+        results, p50, p99 = timed(check, queries)
+        if expected is None:
+            hits = sum(match is not None for match in results)
+            label = f"{hits / n_queries:.2%} falsos"
+        else:
+            hits = sum(match is not None and match.item_id == item_id for match, item_id in zip(results, expected))
+            label = f"{hits / n_queries:.1%}"
+        print(f"{name:<20} {p50:8.1f} {p99:8.1f} {label:>11}")
+
+    _, p50, p99 = timed(fingerprint, fresh)
+    print(f"{'solo la huella':<20} {p50:8.1f} {p99:8.1f}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
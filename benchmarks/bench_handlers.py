@@ -0,0 +1,362 @@
+"""Suite de rendimiento de los handlers con updates sintéticas y un Bot simulado.
+
+Ejecuta handle_confession, handle_poll, handle_voice, handle_question,
+handle_moderation y BackupManager.save_backup/load_backup con el estado
+precargado a varios tamaños (items pendientes y sanciones) y mide ops/s,
+latencia p50/p99 y memoria por llamada. Los resultados se guardan en JSON
+para comparar una ejecución con otra (``--compare``).
+
+Uso:
+    python benchmarks/bench_handlers.py [--sizes 1000,100000,1000000]
+        [--iterations 2000] [--output resultados.json] [--compare anterior.json]
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+_tmp_dir = tempfile.mkdtemp()
+os.environ["DB_PATH"] = os.path.join(_tmp_dir, "bench_state.db")
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+os.environ.setdefault("MODERATION_GROUP_ID", "-100")
+os.environ.setdefault("PUBLIC_CHANNEL", "@bench")
+
+import logging  # noqa: E402
+
+from telegram import CallbackQuery, Chat, Message, Update, User  # noqa: E402
+
+import bot  # noqa: E402
+from bans import BanRegistry  # noqa: E402
+from callbacks import encode_callback  # noqa: E402
+from cleanup import MessageCleaner  # noqa: E402
+from duplicates import DuplicateIndex  # noqa: E402
+from items import ITEM_CLASSES  # noqa: E402
+from mentions import MentionIndex  # noqa: E402
+from outbox import Outbox  # noqa: E402
+from publication import PublicationQueue  # noqa: E402
+from storage import StateStore  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+MODERATION_CHAT = Chat(int(os.environ["MODERATION_GROUP_ID"]), Chat.SUPERGROUP)
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+class StubMessage:
+    _ids = itertools.count(1)
+
+    def __init__(self):
+        self.message_id = next(self._ids)
+
+
+class StubBot:
+    """Responde al instante a cualquier método de la Bot API"""
+
+    defaults = None  # Lo consultan los atajos como Message.reply_text
+
+    def __init__(self):
+        self.calls = 0
+
+    def __getattr__(self, name):
+        async def call(*args, **kwargs):
+            self.calls += 1
+            return StubMessage()
+        return call
+
+
+class StubApplication:
+    def create_task(self, coroutine, update=None):
+        return asyncio.ensure_future(coroutine)
+
+
+class StubContext:
+    def __init__(self, stub_bot):
+        self.bot = stub_bot
+        self.user_data = {}
+        self.args = []
+        self.application = StubApplication()
+
+
+# --- Estado ----------------------------------------------------------------
+
+def reset_state(size, path):
+    """Store nuevo con ``size`` items pendientes (tipos mezclados) y ``size`` sanciones"""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    store = StateStore(path)
+    now = time.time()
+    payloads = {
+        "text": '{"text":"confesión de prueba para el benchmark"}',
+        "poll": '{"question":"¿Pregunta?","options":["a","b","c"],"is_anonymous":true,'
+                '"type":"regular","allows_multiple_answers":false}',
+        "voice": '{"file_id":"AwACAgQAAxkBAAIBenchmark","duration":12,"file_size":40000}',
+        "question": '{"text":"pregunta de prueba para el benchmark"}',
+    }
+    types = tuple(ITEM_CLASSES)
+    # Inserción directa en una transacción: add_item/ban_user confirman fila a fila
+    store._executemany(
+        "INSERT INTO items (id, type, status, user_id, created_at, updated_at, payload) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((i + 1, types[i & 3], "pending", 10**9 + i, now - i, now, payloads[types[i & 3]]) for i in range(size)),
+    )
+    store._executemany(
+        "INSERT INTO bans (user_id, until, strikes, last_ban_at) VALUES (?, ?, 1, ?)",
+        ((2 * 10**9 + i, now + 86400, now) for i in range(size)),
+    )
+
+    bot.store = store
+    bot.id_generator.seed(store.max_item_id())
+    bot.ban_registry = BanRegistry(store)
+    bot.ban_registry.load()
+    bot.message_cleaner = MessageCleaner(store)
+    bot.duplicate_index = DuplicateIndex(store)
+    bot.mention_index = MentionIndex(store)
+    bot.publication_queue = PublicationQueue(store)
+    bot.publication_queue.load()
+    bot.outbox = Outbox(store, bot.publication_queue)
+    return store
+
+
+# --- Updates sintéticas ----------------------------------------------------
+
+_user_ids = itertools.count(3 * 10**9)
+
+
+def private_message(stub_bot, **content):
+    user_id = next(_user_ids)
+    user = User(user_id, "bench", False)
+    message = Message(next(StubMessage._ids), datetime.now(timezone.utc), Chat(user_id, Chat.PRIVATE),
+                      from_user=user, **content)
+    message.set_bot(stub_bot)
+    return Update(message.message_id, message=message)
+
+
+# Textos distintos en cada llamada: los idénticos se descartan como duplicados
+_random = random.Random(1)
+SYLLABLES = ("ma", "te", "ri", "so", "la", "pe", "cu", "di", "no", "ve", "ra", "to", "ca", "mi", "lo", "sa")
+WORDS = ["".join(_random.choice(SYLLABLES) for _ in range(_random.randint(1, 4))) for _ in range(3000)]
+
+
+def synthetic_text(words=25):
+    return " ".join(_random.choice(WORDS) for _ in range(words))
+
+
+def text_update(stub_bot):
+    return private_message(stub_bot, text=synthetic_text())
+
+
+# Encuesta y voz con solo los campos que leen los handlers: los constructores de
+# telegram.Poll/Voice cambian de una versión de la Bot API a otra
+def poll_update(stub_bot):
+    poll = SimpleNamespace(
+        question=synthetic_text(8), options=[SimpleNamespace(text="sí"), SimpleNamespace(text="no")],
+        is_anonymous=True, type="regular", allows_multiple_answers=False,
+    )
+    return private_message(stub_bot, poll=poll)
+
+
+def voice_update(stub_bot):
+    return private_message(stub_bot, voice=SimpleNamespace(file_id="file", duration=12, file_size=40_000))
+
+
+def callback_update(stub_bot, item_id, item_type, action):
+    message = Message(next(StubMessage._ids), datetime.now(timezone.utc), MODERATION_CHAT, text="moderación")
+    message.set_bot(stub_bot)
+    query = CallbackQuery(str(item_id), User(1, "mod", False), "bench", message=message,
+                          data=encode_callback(action, item_type, item_id))
+    query.set_bot(stub_bot)
+    return Update(message.message_id, callback_query=query)
+
+
+# --- Medición ----------------------------------------------------------------
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def measure(name, size, prepare, run, iterations, settle=None):
+    """``prepare(i)`` se ejecuta antes de cada llamada, fuera del cronómetro; ``run(arg)`` dentro"""
+    latencies = []
+    gc.collect()
+    for i in range(iterations):
+        arg = prepare(i)
+        t0 = time.perf_counter()
+        await run(arg)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = sum(latencies)
+    if settle is not None:
+        await settle()
+
+    # Memoria en una pasada aparte: tracemalloc ralentiza cada asignación
+    mem_runs = max(1, min(iterations, 200))
+    gc.collect()
+    tracemalloc.start()
+    peak_total = 0
+    retained = 0
+    for i in range(mem_runs):
+        arg = prepare(iterations + i)
+        base = tracemalloc.get_traced_memory()[0]
+        retained -= base
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        await run(arg)
+        current, peak = tracemalloc.get_traced_memory()
+        peak_total += peak - base
+        retained += current
+    tracemalloc.stop()
+    if settle is not None:
+        await settle()
+
+    latencies.sort()
+    result = {
+        "benchmark": name,
+        "size": size,
+        "iterations": iterations,
+        "ops_per_sec": iterations / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "alloc_peak_kb_per_call": peak_total / mem_runs / 1024,
+        "retained_kb_per_call": retained / mem_runs / 1024,
+    }
+    print(f"{name:<18} {size:>9,}  {result['ops_per_sec']:9.1f} ops/s  p50 {result['p50_ms']:7.3f} ms  "
+          f"p99 {result['p99_ms']:7.3f} ms  pico {result['alloc_peak_kb_per_call']:7.1f} KB/llamada")
+    return result
+
+
+async def bench_size(size, iterations, backup_iterations, path):
+    print(f"\n--- {size:,} pendientes y {size:,} sanciones ---")
+    store = reset_state(size, path)
+    stub_bot = StubBot()
+    bot.side_effects = type(bot.side_effects)()
+    bot.side_effects.start()
+    results = []
+
+    def handler(fn):
+        async def run(update):
+            await fn(update, StubContext(stub_bot))
+        return run
+
+    results.append(await measure("handle_confession", size, lambda i: text_update(stub_bot),
+                                 handler(bot.handle_confession), iterations))
+    results.append(await measure("handle_poll", size, lambda i: poll_update(stub_bot),
+                                 handler(bot.handle_poll), iterations))
+    results.append(await measure("handle_voice", size, lambda i: voice_update(stub_bot),
+                                 handler(bot.handle_voice), iterations))
+
+    async def run_question(update):
+        context = StubContext(stub_bot)
+        context.user_data["waiting_for_question"] = True
+        await bot.handle_question(update, context)
+    results.append(await measure("handle_question", size, lambda i: text_update(stub_bot), run_question, iterations))
+
+    # Pulsaciones sobre los items más antiguos: aprobar, encolar o rechazar
+    pending = iter(store.pending_items(limit=iterations * 2 + 400))
+    actions = ("approve", "cola", "reject")
+
+    def prepare_callback(i):
+        item = next(pending)
+        action = actions[i % 3] if item.TYPE != "question" else "reject"
+        return callback_update(stub_bot, item.id, item.TYPE, action)
+
+    results.append(await measure("handle_moderation", size, prepare_callback,
+                                 handler(bot.handle_moderation), iterations, settle=bot.side_effects.join))
+
+    manager = bot.BackupManager(
+        backup_file=os.path.join(_tmp_dir, "bench_backup.db"),
+        legacy_backup_file=os.path.join(_tmp_dir, "legacy.json"),
+        legacy_journal_file=os.path.join(_tmp_dir, "legacy.jsonl"),
+    )
+
+    def force_change(i):
+        store.ban_user(1, time.time())
+
+    results.append(await measure("save_backup", size, force_change, lambda _: manager.save_backup(),
+                                 backup_iterations))
+
+    # load_backup migra un backup JSON del formato anterior con ``size`` items
+    legacy = {"pending_confessions": {
+        str(10**12 + i): {"text": "confesión antigua", "user_id": i, "timestamp": time.time()} for i in range(size)
+    }}
+    legacy_json = json.dumps(legacy)
+
+    def write_legacy(i):
+        with open(manager.legacy_backup_file, "w", encoding="utf-8") as f:
+            f.write(legacy_json)
+
+    results.append(await measure("load_backup", size, write_legacy, lambda _: manager.load_backup(),
+                                 backup_iterations))
+
+    await bot.side_effects.stop()
+    store.close()
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(__file__), text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous_path):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = {(r["benchmark"], r["size"]): r for r in json.load(f)["results"]}
+    print(f"\nComparación con {previous_path} (ops/s y p99, + = mejor)")
+    for result in results:
+        old = previous.get((result["benchmark"], result["size"]))
+        if old is None:
+            continue
+        ops = (result["ops_per_sec"] / old["ops_per_sec"] - 1) * 100
+        p99 = (old["p99_ms"] / result["p99_ms"] - 1) * 100 if result["p99_ms"] else 0
+        print(f"{result['benchmark']:<18} {result['size']:>9,}  ops/s {ops:+6.1f}%  p99 {p99:+6.1f}%")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--backup-iterations", type=int, default=3)
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    options = parser.parse_args()
+
+    results = []
+    path = os.path.join(_tmp_dir, "sized_state.db")
+    for size in (int(s) for s in options.sizes.split(",")):
+        results.extend(await bench_size(size, options.iterations, options.backup_iterations, path))
+
+    output = options.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, datetime.now(timezone.utc).strftime("handlers-%Y%m%dT%H%M%SZ.json"))
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }, f, indent=2)
+    print(f"\nResultados guardados en {output}")
+
+    if options.compare:
+        compare(results, options.compare)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+"""Memoria por item con 100k items pendientes: dicts por tipo + copias en la
+cola (formato original) frente a items con ``__slots__`` + cola de ids.
+
+Uso: python benchmarks/bench_items.py [n_items] [fracción_en_cola]
+"""
+import os
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from items import PollItem, QuestionItem, TextItem, VoiceItem  # noqa: E402
+
+TYPES = ("text", "poll", "voice", "question")
+
+
+def legacy(n, queued):
+    """pending_confessions/polls/voices/questions + deque de copias"""
+    pending = {"text": {}, "poll": {}, "voice": {}, "question": {}}
+    now = time.time()
+    for i in range(n):
+        kind = TYPES[i & 3]
+        user_id = 10**9 + i
+        if kind == "text":
+            data = {"text": f"confesión de prueba número {i}", "user_id": user_id, "timestamp": now}
+        elif kind == "poll":
+            data = {"question": f"¿Pregunta {i}?", "options": ["a", "b", "c"], "is_anonymous": True,
+                    "type": "regular", "allows_multiple_answers": False, "user_id": user_id}
+        elif kind == "voice":
+            data = {"file_id": f"AwACAgQAAxkBAAI{i:012d}", "duration": 12, "file_size": 40_000,
+                    "user_id": user_id, "timestamp": now}
+        else:
+            data = {"text": f"pregunta de prueba número {i}", "user_id": user_id, "timestamp": now}
+        pending[kind][i] = data
+
+    publication_queue = deque()
+    for i in range(queued):
+        kind = TYPES[i & 3]
+        item = pending[kind].pop(i).copy()
+        item["_type"] = kind
+        item["_id"] = i
+        publication_queue.append(item)
+    return pending, publication_queue
+
+
+def slotted(n, queued):
+    """Un único índice id -> item, índice por tipo y cola de ids"""
+    items = {}
+    by_type = {kind: set() for kind in TYPES}
+    now = time.time()
+    for i in range(n):
+        kind = TYPES[i & 3]
+        user_id = 10**9 + i
+        if kind == "text":
+            item = TextItem(i, user_id, now, text=f"confesión de prueba número {i}")
+        elif kind == "poll":
+            item = PollItem(i, user_id, now, question=f"¿Pregunta {i}?", options=["a", "b", "c"],
+                            is_anonymous=True, poll_type="regular", allows_multiple_answers=False)
+        elif kind == "voice":
+            item = VoiceItem(i, user_id, now, file_id=f"AwACAgQAAxkBAAI{i:012d}", duration=12, file_size=40_000)
+        else:
+            item = QuestionItem(i, user_id, now, text=f"pregunta de prueba número {i}")
+        items[i] = item
+        by_type[kind].add(i)
+
+    publication_queue = deque(range(queued))
+    for i in publication_queue:
+        items[i].status = "queued"
+    return items, by_type, publication_queue
+
+
+def measure(label, fn, n, queued):
+    tracemalloc.start()
+    state = fn(n, queued)  # noqa: F841
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<34} {current / 1e6:7.1f} MB  {current / n:6.0f} bytes/item")
+    return current
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    fraction = float(sys.argv[2]) if len(sys.argv) > 2 else 0.25
+    queued = int(n * fraction)
+    print(f"{n:,} items ({queued:,} en cola)")
+    before = measure("dicts por tipo + copias en deque", legacy, n, queued)
+    after = measure("items __slots__ + cola de ids", slotted, n, queued)
+    print(f"reducción: {(1 - after / before) * 100:.0f}%")
+
+    # Solo el contenedor de cada item (sin las cadenas que comparten ambos formatos)
+    pending, _ = legacy(1000, 0)
+    items, _, _ = slotted(1000, 0)
+    dict_size = sum(sys.getsizeof(d) for kind in pending.values() for d in kind.values()) / 1000
+    slot_size = sum(sys.getsizeof(item) for item in items.values()) / 1000
+    print(f"contenedor por item: dict {dict_size:.0f} bytes, __slots__ {slot_size:.0f} bytes")
@@ -0,0 +1,81 @@
+"""Índice de menciones con una semana de envíos sintéticos: latencia de
+``add``/``count``, memoria y error del count-min sketch frente a la cuenta
+exacta.
+
+Los nombres siguen una distribución de Zipf, como en la realidad: unos pocos
+muy mencionados y una cola larga de nombres que aparecen una vez.
+
+Uso: python benchmarks/bench_mentions.py [n_envios] [n_nombres]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from mentions import BUCKETS, WINDOW, MentionIndex  # noqa: E402
+from storage import StateStore  # noqa: E402
+
+
+def main():
+    n_submissions = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    n_names = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    rng = random.Random(11)
+    names = [f"nombre{i}" for i in range(n_names)]
+    weights = [1 / (rank + 1) for rank in range(n_names)]
+
+    now = time.time()
+    submissions = []
+    for i in range(n_submissions):
+        mentioned = sorted(set(rng.choices(names, weights, k=rng.randint(1, 3))))
+        submissions.append((i, mentioned, now - WINDOW + WINDOW * i / n_submissions))
+
+    store = StateStore(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    tracemalloc.start()
+    memory = tracemalloc.get_traced_memory()[0]
+    index = MentionIndex(store)
+    started = time.perf_counter()
+    for item_id, mentioned, created_at in submissions:
+        index.add(item_id, mentioned, created_at)
+    add_time = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0] - memory
+    tracemalloc.stop()
+    distinct = len({name for _, mentioned, _ in submissions for name in mentioned})
+    print(f"{n_submissions:,} envíos, {distinct:,} nombres distintos: "
+          f"add {add_time / n_submissions * 1e6:.1f} µs/envío (con SQLite), {memory / 1e6:.2f} MB en memoria")
+
+    # La ventana avanza por franjas: la cuenta exacta usa las mismas
+    span = WINDOW / BUCKETS
+    oldest = int(now // span) - BUCKETS + 1
+    exact = Counter(
+        name for _, mentioned, created_at in submissions if int(created_at // span) >= oldest for name in mentioned
+    )
+    queried = list(exact)
+    started = time.perf_counter()
+    estimates = {name: index.count(name, now) for name in queried}
+    count_time = time.perf_counter() - started
+    print(f"count: {count_time / len(queried) * 1e6:.1f} µs/consulta")
+
+    errors = [estimates[name] - exact[name] for name in queried]
+    assert min(errors) >= 0, "el sketch nunca debe quedarse corto"
+    exceeded = sum(error > 0 for error in errors)
+    print(f"error: {exceeded / len(errors):.1%} de los nombres sobrestimados, "
+          f"máximo +{max(errors)}, medio +{sum(errors) / len(errors):.3f}")
+
+    hot = index.hot(limit=10, now=now)
+    top = exact.most_common(10)
+    print(f"top 10 coincidentes con la cuenta exacta: {len({n for n, _ in hot} & {n for n, _ in top})}/10")
+
+    started = time.perf_counter()
+    reloaded = MentionIndex(store)
+    reloaded.load(now)
+    print(f"recarga desde SQLite: {time.perf_counter() - started:.2f}s")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Microbenchmark del limitador de envíos con 1M de usuarios distintos.
+
+Compara el dict ``user_last_confession`` original (crece con cada usuario
+que ha escrito alguna vez) con ``SlidingWindowLimiter`` (LRU/TTL).
+
+Uso: python benchmarks/bench_ratelimit.py [n_usuarios] [envíos_por_segundo]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ratelimit import SlidingWindowLimiter  # noqa: E402
+
+
+def legacy(n, rate, start):
+    """check_rate_limit + registro originales"""
+    user_last_confession = {}
+    for user_id in range(n):
+        now = start + user_id / rate
+        if user_id in user_last_confession and now - user_last_confession[user_id] < 60:
+            continue
+        user_last_confession[user_id] = now
+    return user_last_confession
+
+
+def sliding(n, rate, start):
+    limiter = SlidingWindowLimiter()
+    kinds = ("text", "poll", "voice", "question")
+    for user_id in range(n):
+        now = start + user_id / rate
+        kind = kinds[user_id & 3]
+        if limiter.retry_after(user_id, kind, now) > 0:
+            continue
+        limiter.hit(user_id, kind, now)
+    return limiter
+
+
+def measure(label, fn, n, rate):
+    # Tiempo y memoria en pasadas separadas: tracemalloc ralentiza cada asignación
+    t0 = time.perf_counter()
+    fn(n, rate, time.time())
+    elapsed = time.perf_counter() - t0
+
+    tracemalloc.start()
+    state = fn(n, rate, time.time())
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {n / elapsed / 1e3:8.0f} k ops/s  {elapsed * 1e6 / n:6.2f} µs/op  "
+          f"memoria final {current / 1e6:7.1f} MB  pico {peak / 1e6:7.1f} MB  entradas {len(state):>9,}")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 1000.0
+    print(f"{n:,} usuarios distintos, {rate:.0f} envíos/s (ventana de 60 s)")
+    measure("dict original", legacy, n, rate)
+    measure("SlidingWindowLimiter", sliding, n, rate)
@@ -0,0 +1,95 @@
+"""Rendimiento de las reglas de contenido (rules.py) en MB/s.
+
+Mide por separado la normalización, el autómata de Aho-Corasick, las regex
+predefinidas (teléfonos, emails, menciones) y ``RuleSet.evaluate`` completo,
+con las reglas de rules.json más ``n_terminos`` términos sintéticos. Como referencia compara con una única regex
+de alternativas (``\\b(?:t1|t2|...)\\b``), cuyo coste crece con el número de
+términos. La compilación del autómata se mide aparte: solo ocurre al arrancar
+y al recargar el fichero.
+
+Uso: python benchmarks/bench_rules.py [n_terminos] [megabytes]
+"""
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from duplicates import normalize  # noqa: E402
+from rules import RuleSet  # noqa: E402
+
+SYLLABLES = ("ma", "te", "ri", "so", "la", "pe", "cu", "di", "no", "ve", "ra", "to", "ca", "mi", "lo", "sa")
+TERM_SYLLABLES = ("xa", "zo", "ju", "fe", "bi", "go", "ke", "wu")  # Los términos no aparecen por azar
+RULES_FILE = os.path.join(os.path.dirname(__file__), "..", "rules.json")
+
+
+def word(rng, syllables=SYLLABLES):
+    return "".join(rng.choice(syllables) for _ in range(rng.randint(1, 4)))
+
+
+def term(rng):
+    words = 2 if rng.random() < 0.3 else 1
+    return " ".join(word(rng, TERM_SYLLABLES) for _ in range(words))
+
+
+def corpus(rng, megabytes, terms):
+    """Textos de 12-80 palabras; uno de cada diez lleva un término, una mención o un teléfono"""
+    texts = []
+    size = 0
+    while size < megabytes * 1e6:
+        tokens = [word(rng) for _ in range(rng.randint(12, 80))]
+        if rng.random() < 0.1:
+            tokens.insert(rng.randrange(len(tokens)), rng.choice((rng.choice(terms), "@" + word(rng), "612 345 678")))
+        text = " ".join(tokens).capitalize() + "."
+        texts.append(text)
+        size += len(text.encode())
+    return texts, size
+
+
+def throughput(func, texts, size):
+    started = time.perf_counter()
+    for text in texts:
+        func(text)
+    elapsed = time.perf_counter() - started
+    return size / elapsed / 1e6, elapsed / len(texts) * 1e6
+
+
+def main():
+    n_terms = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    megabytes = float(sys.argv[2]) if len(sys.argv) > 2 else 4
+    rng = random.Random(5)
+
+    with open(RULES_FILE, encoding="utf-8") as f:
+        config = json.load(f)
+    terms = sorted({term(rng) for _ in range(n_terms)})
+    config["rules"].append({"name": "sinteticos", "action": "tag", "terms": terms})
+
+    started = time.perf_counter()
+    rules = RuleSet(config)
+    print(f"Compilación: {len(rules)} reglas, {len(terms):,} términos sintéticos, "
+          f"{len(rules.automaton):,} estados en {time.perf_counter() - started:.2f}s")
+
+    texts, size = corpus(rng, megabytes, terms)
+    normalized = [f" {normalize(text)} " for text in texts]
+    alternation = re.compile(r"\b(?:" + "|".join(map(re.escape, terms)) + r")\b")
+    tagged = sum(rules.evaluate(text).action is not None for text in texts)
+    print(f"Corpus: {len(texts):,} textos, {size / 1e6:.1f} MB, {tagged / len(texts):.1%} con alguna regla\n")
+
+    print(f"{'fase':<26} {'MB/s':>8} {'µs/texto':>9}")
+    rows = (
+        ("normalize", texts, normalize),
+        ("aho-corasick", normalized, rules.automaton.search),
+        ("regex sin filtro previo", texts, lambda text: [regex.findall(text) for regex, _, _ in rules._regexes]),
+        ("evaluate completo", texts, rules.evaluate),
+        ("regex de alternativas", normalized, alternation.findall),
+    )
+    for name, inputs, func in rows:
+        mb_per_s, per_text = throughput(func, inputs, size)
+        print(f"{name:<26} {mb_per_s:8.2f} {per_text:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
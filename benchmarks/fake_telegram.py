@@ -0,0 +1,342 @@
+"""Servidor local que imita la Bot API de Telegram para pruebas de larga duración.
+
+El bot se conecta con ``TELEGRAM_API_URL=http://127.0.0.1:<puerto>/bot``. El
+servidor responde a todos los métodos con resultados verosímiles, registra
+cada llamada y genera tráfico:
+
+* envíos de usuarios en privado (textos, encuestas, voces y preguntas con
+  /preguntas), a ``--submissions-per-hour`` por hora simulada;
+* un "moderador" que pulsa los botones de cada mensaje con teclado que el bot
+  manda al grupo de moderación (aprobar, cola, rechazar, sancionar,
+  responder) tras ``--moderation-delay`` segundos simulados como mucho;
+* respuestas 429 con ``retry_after`` en una fracción ``--rate-limit-probability``
+  de los envíos.
+
+El tiempo simulado avanza ``--speedup`` veces más rápido que el real.
+``GET /_fake/stats`` devuelve los contadores y las horas de cada publicación
+en el canal; ``GET /ping`` sirve para el keep-alive.
+
+Uso:
+    python benchmarks/fake_telegram.py --port 8081 --moderation-chat -100... --channel -100...
+"""
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter, deque
+from urllib.parse import parse_qsl
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from starlette.requests import ClientDisconnect
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from callbacks import decode_callback  # noqa: E402
+
+BOT_USER = {"id": 100000, "is_bot": True, "first_name": "Confesiones", "username": "soak_bot"}
+MODERATORS = [{"id": 900000 + i, "is_bot": False, "first_name": f"Mod {i}"} for i in range(5)]
+
+# Peso de cada botón cuando el moderador elige entre los que tiene el mensaje
+ACTION_WEIGHTS = {
+    "approve": 2, "cola": 6, "reject": 2, "sancionar": 0.3,
+    "ban": 1, "cancel": 0.2, "respond": 1,
+}
+# Parámetros que PTB manda como JSON dentro del formulario
+JSON_PARAMS = ("reply_markup", "message_ids", "allowed_updates", "options", "commands")
+# Solo estos métodos reciben 429 inyectados
+RATE_LIMITED_PREFIXES = ("send", "edit", "delete", "answer", "copy", "forward")
+MAX_PENDING_UPDATES = 10_000
+
+
+class FakeTelegram:
+    def __init__(self, moderation_chat, channel, speedup=60.0, submissions_per_hour=40.0,
+                 moderation_delay=600.0, rate_limit_probability=0.0, max_retry_after=3,
+                 users=5000, seed=None):
+        self.moderation_chat = int(moderation_chat)
+        self.channel = int(channel)
+        self.speedup = speedup
+        self.submissions_per_hour = submissions_per_hour
+        self.moderation_delay = moderation_delay
+        self.rate_limit_probability = rate_limit_probability
+        self.max_retry_after = max_retry_after
+        self.users = users
+        self.random = random.Random(seed)
+
+        self._updates = deque()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_update = asyncio.Event()
+        self._keyboards = {}  # message_id -> mensaje con teclado en el grupo de moderación (hasta que se borra)
+        self._free_moderators = list(MODERATORS)
+
+        self.calls = Counter()
+        self.rate_limited = 0
+        self.generated = Counter()
+        self.channel_posts = []  # time.time() de cada publicación en el canal
+        self.started_at = time.time()
+
+    # --- Bot API ---------------------------------------------------------------
+
+    async def handle(self, method, params):
+        method = method.lower()
+        self.calls[method] += 1
+        if (self.rate_limit_probability and method.startswith(RATE_LIMITED_PREFIXES)
+                and self.random.random() < self.rate_limit_probability):
+            self.rate_limited += 1
+            retry_after = self.random.randint(1, self.max_retry_after)
+            return 429, {
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }
+
+        if method == "getupdates":
+            return 200, {"ok": True, "result": await self._get_updates(params)}
+        if method == "getme":
+            return 200, {"ok": True, "result": dict(BOT_USER, can_join_groups=True,
+                                                    can_read_all_group_messages=False,
+                                                    supports_inline_queries=False)}
+        if method == "getwebhookinfo":
+            return 200, {"ok": True, "result": {"url": "", "has_custom_certificate": False,
+                                                "pending_update_count": len(self._updates)}}
+        if method.startswith(("send", "copy", "forward")) or (
+                method.startswith("edit") and "inline_message_id" not in params):
+            return 200, {"ok": True, "result": self._message(method, params)}
+        if method == "deletemessage":
+            self._keyboards.pop(int(params.get("message_id", 0)), None)
+        elif method == "deletemessages":
+            for message_id in params.get("message_ids", []):
+                self._keyboards.pop(int(message_id), None)
+        return 200, {"ok": True, "result": True}
+
+    def _message(self, method, params):
+        chat_id = int(params["chat_id"])
+        if method.startswith("edit"):
+            message_id = int(params["message_id"])
+        else:
+            message_id = next(self._message_ids)
+        chat = {"id": chat_id, "type": "private", "first_name": "Usuario"}
+        if chat_id == self.channel:
+            chat = {"id": chat_id, "type": "channel", "title": "Canal"}
+        elif chat_id < 0:
+            chat = {"id": chat_id, "type": "supergroup", "title": "Moderación"}
+        message = {"message_id": message_id, "date": int(time.time()), "chat": chat, "from": BOT_USER}
+        for key in ("text", "caption", "reply_markup"):
+            if key in params:
+                message[key] = params[key]
+
+        if chat_id == self.channel and method.startswith("send"):
+            self.channel_posts.append(time.time())
+        elif chat_id == self.moderation_chat:
+            if method.startswith("edit"):
+                # Editar sin reply_markup quita el teclado; el resto del mensaje se conserva
+                message = dict(self._keyboards.pop(message_id, {}), **message)
+                if "reply_markup" not in params:
+                    message.pop("reply_markup", None)
+            if "reply_markup" in message:
+                self._keyboards[message_id] = message
+                self._schedule(self._moderation_delay(), self._press_button, message_id)
+        return message
+
+    async def _get_updates(self, params):
+        offset = int(params.get("offset", 0) or 0)
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+        if not self._updates:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), float(params.get("timeout", 0) or 0))
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get("limit", 100) or 100)
+        return list(itertools.islice(self._updates, limit))
+
+    # --- Tráfico generado --------------------------------------------------------
+
+    def _push(self, **update):
+        update["update_id"] = next(self._update_ids)
+        self._updates.append(update)
+        while len(self._updates) > MAX_PENDING_UPDATES:
+            self._updates.popleft()  # El bot no está leyendo: se pierden como en Telegram
+        self._new_update.set()
+
+    def _schedule(self, delay, func, *args, **kwargs):
+        asyncio.get_running_loop().call_later(delay, functools.partial(func, *args, **kwargs))
+
+    def _moderation_delay(self):
+        return self.random.uniform(0.1, 1.0) * self.moderation_delay / self.speedup
+
+    def _private_message(self, user_id, **content):
+        user = {"id": user_id, "is_bot": False, "first_name": "Usuario"}
+        self._push(message=dict(
+            message_id=next(self._message_ids), date=int(time.time()),
+            chat={"id": user_id, "type": "private", "first_name": "Usuario"}, **{"from": user}, **content,
+        ))
+
+    def _submit(self):
+        user_id = self.random.randint(1, self.users)
+        kind = self.random.choices(("text", "poll", "voice", "question"), (6, 1.5, 1.5, 1))[0]
+        self.generated[kind] += 1
+        if kind == "text":
+            words = self.random.randint(5, 80)
+            self._private_message(user_id, text=" ".join(self.random.choice(("hoy", "confieso", "que", "nunca",
+                                                                             "clase", "examen", "amigo"))
+                                                         for _ in range(words)))
+        elif kind == "poll":
+            options = [{"text": f"Opción {i}", "voter_count": 0, "persistent_id": str(i)}
+                       for i in range(self.random.randint(2, 5))]
+            self._private_message(user_id, poll={
+                "id": str(next(self._message_ids)), "question": "¿Qué opináis?", "options": options,
+                "total_voter_count": 0, "is_closed": False, "is_anonymous": True, "type": "regular",
+                "allows_multiple_answers": False, "allows_revoting": False, "members_only": False,
+            })
+        elif kind == "voice":
+            self._private_message(user_id, voice={
+                "file_id": f"voice-{user_id}", "file_unique_id": f"u{user_id}",
+                "duration": self.random.randint(3, 60), "file_size": 40_000,
+            })
+        else:
+            self._private_message(user_id, text="/preguntas",
+                                  entities=[{"type": "bot_command", "offset": 0, "length": 10}])
+            self._schedule(0.05, self._private_message, user_id, text="¿Cuándo son los exámenes?")
+
+    def _press_button(self, message_id):
+        message = self._keyboards.get(message_id)
+        if message is None:
+            return  # Ya borrado o editado sin teclado
+        buttons = []
+        for row in message["reply_markup"].get("inline_keyboard", []):
+            for button in row:
+                try:
+                    action = decode_callback(button.get("callback_data", "")).action
+                except ValueError:
+                    continue
+                buttons.append((button["callback_data"], ACTION_WEIGHTS.get(action, 0), action))
+        buttons = [button for button in buttons if button[1] > 0]
+        if not buttons:
+            return
+
+        data, _, action = self.random.choices(buttons, [weight for _, weight, _ in buttons])[0]
+        if action == "respond":
+            if not self._free_moderators:
+                self._schedule(self._moderation_delay(), self._press_button, message_id)
+                return
+            moderator = self._free_moderators.pop()
+        else:
+            moderator = self.random.choice(MODERATORS)
+
+        self._push(callback_query={
+            "id": str(next(self._update_ids)), "from": moderator, "chat_instance": "soak",
+            "data": data, "message": message,
+        })
+        if action == "respond":
+            self._schedule(self._moderation_delay(), self._answer_question, moderator)
+
+    def _answer_question(self, moderator):
+        self._push(message={
+            "message_id": next(self._message_ids), "date": int(time.time()),
+            "chat": {"id": self.moderation_chat, "type": "supergroup", "title": "Moderación"},
+            "from": moderator, "text": "Las fechas están en el campus virtual.",
+        })
+        self._free_moderators.append(moderator)
+
+    async def generate(self):
+        """Envíos de usuarios con llegadas de Poisson en tiempo simulado"""
+        rate = self.submissions_per_hour * self.speedup / 3600  # Envíos por segundo real
+        if rate <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.random.expovariate(rate))
+            self._submit()
+
+    def stats(self):
+        return {
+            "calls": dict(self.calls),
+            "rate_limited": self.rate_limited,
+            "generated": dict(self.generated),
+            "pending_updates": len(self._updates),
+            "open_keyboards": len(self._keyboards),
+            "channel_posts": self.channel_posts,
+        }
+
+
+async def parse_params(request):
+    params = dict(request.query_params)
+    body = await request.body()
+    if body:
+        if request.headers.get("content-type", "").startswith("application/json"):
+            params.update(json.loads(body))
+        else:
+            params.update(parse_qsl(body.decode("utf-8"), keep_blank_values=True))
+    for key in JSON_PARAMS:
+        if isinstance(params.get(key), str):
+            try:
+                params[key] = json.loads(params[key])
+            except ValueError:
+                pass
+    return params
+
+
+def create_app(fake):
+    app = FastAPI(title="Fake Telegram Bot API")
+
+    @app.api_route("/bot{token}/{method}", methods=["GET", "POST"])
+    async def bot_api(token: str, method: str, request: Request):
+        try:
+            params = await parse_params(request)
+        except ClientDisconnect:
+            return Response(status_code=499)  # El bot se detuvo a mitad de getUpdates
+        status, payload = await fake.handle(method, params)
+        return JSONResponse(payload, status_code=status)
+
+    @app.get("/_fake/stats")
+    def fake_stats():
+        return fake.stats()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def serve(fake, port):
+    config = uvicorn.Config(create_app(fake), host="127.0.0.1", port=port, log_level="warning")
+    await asyncio.gather(uvicorn.Server(config).serve(), fake.generate())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--moderation-chat", required=True)
+    parser.add_argument("--channel", required=True)
+    parser.add_argument("--speedup", type=float, default=60.0)
+    parser.add_argument("--submissions-per-hour", type=float, default=40.0)
+    parser.add_argument("--moderation-delay", type=float, default=600.0, help="Segundos simulados como máximo")
+    parser.add_argument("--rate-limit-probability", type=float, default=0.0)
+    parser.add_argument("--max-retry-after", type=int, default=3)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    fake = FakeTelegram(
+        args.moderation_chat, args.channel, speedup=args.speedup,
+        submissions_per_hour=args.submissions_per_hour, moderation_delay=args.moderation_delay,
+        rate_limit_probability=args.rate_limit_probability, max_retry_after=args.max_retry_after,
+        users=args.users, seed=args.seed,
+    )
+    try:
+        asyncio.run(serve(fake, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
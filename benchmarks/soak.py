@@ -0,0 +1,324 @@
+"""Prueba de larga duración del bot completo contra la Bot API falsa.
+
+Arranca ``fake_telegram.py`` en otro proceso (así su memoria no se mezcla con
+la del bot), importa ``bot`` apuntando a él con ``TELEGRAM_API_URL`` y ejecuta
+``run_bot`` y el keep-alive durante ``--hours`` horas simuladas. El tiempo se
+comprime ``--speedup`` veces: la cadencia de publicación, el backup, el
+keep-alive y los límites de envío de ``outbound`` se escalan; los
+``retry_after`` de los 429 y las ventanas de límite por usuario siguen en
+segundos reales. Las horas activas de la cadencia dependen del reloj real, así
+que en el soak todas las horas son activas.
+
+En cada periodo de ``--report-every`` segundos simulados se anota RSS, número
+de tareas e hilos, retraso del event loop (p99 y máximo), publicaciones en el
+canal (en total y desde la cola) y tamaño de las estructuras que podrían
+crecer sin límite. Al final se imprime un resumen, con el intervalo medido
+entre publicaciones de la cola (la cadencia lo adapta al backlog), y se guarda
+todo en JSON.
+
+Uso:
+    python benchmarks/soak.py [--hours 12] [--speedup 240] [--submissions-per-hour 40]
+        [--rate-limit-probability 0.01] [--output soak.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+import cadence  # noqa: E402  (no lee el entorno: se puede importar antes que bot)
+
+MODERATION_CHAT = "-1001000000001"
+CHANNEL = "-1001000000002"
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+LAG_INTERVAL = 0.05  # Segundos reales entre muestras del retraso del loop
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb():
+    """Memoria residente actual en MB (pico si no hay /proc)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def start_fake_server(args, port):
+    command = [
+        sys.executable, os.path.join(BENCH_DIR, "fake_telegram.py"),
+        "--port", str(port), "--moderation-chat", MODERATION_CHAT, "--channel", CHANNEL,
+        "--speedup", str(args.speedup), "--submissions-per-hour", str(args.submissions_per_hour),
+        "--moderation-delay", str(args.moderation_delay),
+        "--rate-limit-probability", str(args.rate_limit_probability),
+    ]
+    if args.seed is not None:
+        command += ["--seed", str(args.seed)]
+    process = subprocess.Popen(command)
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/ping", timeout=1).raise_for_status()
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("La Bot API falsa no arrancó")
+
+
+def configure_environment(args, port, workdir):
+    """Variables que ``bot`` lee al importarse, con los intervalos ya comprimidos"""
+    base = f"http://127.0.0.1:{port}"
+    os.environ.update({
+        "BOT_TOKEN": "123456:soak",
+        "MODERATION_GROUP_ID": MODERATION_CHAT,
+        "PUBLIC_CHANNEL": CHANNEL,
+        "TELEGRAM_API_URL": f"{base}/bot",
+        "PUBLICATION_INTERVAL": str(max(1, round(args.publication_interval / args.speedup))),
+        "MAX_POSTS_PER_HOUR": str(round(cadence.MAX_PER_HOUR * args.speedup)),
+        "DRAIN_TARGET": str(cadence.DRAIN_TARGET / args.speedup),
+        "ACTIVE_HOURS": "0-24",
+        "KEEPALIVE_INTERVAL": str(max(1, round(30 / args.speedup))),
+        "RENDER_EXTERNAL_URL": f"{base}/ping",
+        "DB_PATH": os.path.join(workdir, "soak_state.db"),
+        "NO_PROXY": "127.0.0.1,localhost",
+    })
+    os.environ.pop("WEBHOOK_URL", None)
+
+
+class LoopLagMonitor:
+    """Retraso con el que el event loop despierta a una tarea que duerme ``interval``"""
+
+    def __init__(self, interval=LAG_INTERVAL):
+        self.interval = interval
+        self.samples = []
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def drain(self):
+        samples, self.samples = self.samples, []
+        return samples
+
+
+async def soak(args, port):
+    import bot
+    import outbound
+
+    # bot configura el logging al importarse
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.ERROR)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    # Límites de envío proporcionales al tiempo comprimido
+    outbound.GLOBAL_RATE *= args.speedup
+    outbound.GROUP_RATE *= args.speedup
+    outbound.PRIVATE_RATE *= args.speedup
+    bot.backup_manager.backup_interval = bot.backup_manager.backup_interval / args.speedup
+    bot.keep_alive = bot.KeepAlive(bot.KEEPALIVE_URL, interval=int(os.environ["KEEPALIVE_INTERVAL"]))
+
+    # Horas de las publicaciones que salen de la cola (el resto son aprobaciones directas)
+    from outbox import PUBLISHED
+    queue_posts = []
+    publish_next = bot.outbox.publish_next
+
+    async def recorded_publish_next(*args, **kwargs):
+        attempt = await publish_next(*args, **kwargs)
+        if attempt is not None and attempt.result == PUBLISHED:
+            queue_posts.append(time.time())
+        return attempt
+
+    bot.outbox.publish_next = recorded_publish_next
+
+    lag = LoopLagMonitor()
+    tasks = [
+        asyncio.create_task(bot.run_bot()),
+        asyncio.create_task(bot.keep_alive.run()),
+        asyncio.create_task(lag.run()),
+    ]
+    client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=5)
+    window = args.report_every / args.speedup
+    cadence = bot.cadence
+    samples = []
+    previous_rate_limited = 0
+    started = time.monotonic()
+    print(f"Soak: {args.hours:g} h simuladas en {args.hours * 3600 / args.speedup:.0f} s reales "
+          f"(x{args.speedup:g}); publicación desde la cola cada {cadence.min_interval * args.speedup / 60:.0f}–"
+          f"{cadence.base_interval * args.speedup / 60:.0f} min simulados según el backlog")
+    print(f"{'hora':>6} {'RSS MB':>8} {'tareas':>7} {'hilos':>6} {'lag p99':>8} {'lag máx':>8} "
+          f"{'pub.':>5} {'p.cola':>6} {'cola':>6} {'pend.':>6} {'429':>5} {'user_data':>9}")
+
+    try:
+        end = started + args.hours * 3600 / args.speedup
+        next_report = started + window
+        while next_report <= end + 1e-6:
+            await asyncio.sleep(max(0.0, next_report - time.monotonic()))
+            for task in tasks:
+                if task.done() and task.exception() is not None:
+                    raise task.exception()
+
+            stats = (await client.get("/_fake/stats")).json()
+            window_start = time.time() - window
+            posts = [t for t in stats["channel_posts"] if t > window_start]
+            item_counts = {}
+            for _, status, count, _ in bot.store.item_stats():
+                item_counts[status] = item_counts.get(status, 0) + count
+            lags = lag.drain()
+            application = bot.bot_application
+            sample = {
+                "sim_hours": (time.monotonic() - started) * args.speedup / 3600,
+                "rss_mb": rss_mb(),
+                "tasks": len(asyncio.all_tasks()),
+                "threads": threading.active_count(),
+                "loop_lag_p99_ms": percentile(lags, 0.99) * 1000,
+                "loop_lag_max_ms": max(lags, default=0.0) * 1000,
+                "channel_posts": len(posts),
+                "queue_posts": sum(t > window_start for t in queue_posts),
+                "queued": item_counts.get("queued", 0),
+                "pending": item_counts.get("pending", 0),
+                "rate_limited": stats["rate_limited"] - previous_rate_limited,
+                "user_data": len(application.user_data) if application is not None else 0,
+                "chat_data": len(application.chat_data) if application is not None else 0,
+                "rate_limiter_entries": len(bot.rate_limiter),
+                "bans": len(bot.ban_registry),
+                "outbound_queue": bot.outbound_limiter.queue_depth,
+                "side_effects": bot.side_effects.depth,
+                "scheduled_deletions": bot.message_cleaner.pending,
+                "fake_calls": sum(stats["calls"].values()),
+            }
+            previous_rate_limited = stats["rate_limited"]
+            samples.append(sample)
+            print(f"{sample['sim_hours']:6.1f} {sample['rss_mb']:8.1f} {sample['tasks']:7} {sample['threads']:6} "
+                  f"{sample['loop_lag_p99_ms']:8.1f} {sample['loop_lag_max_ms']:8.1f} {sample['channel_posts']:5} "
+                  f"{sample['queue_posts']:6} {sample['queued']:6} {sample['pending']:6} {sample['rate_limited']:5} {sample['user_data']:9}")
+            next_report += window
+
+        final_stats = (await client.get("/_fake/stats")).json()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await shutdown(bot)
+        await client.aclose()
+
+    return samples, final_stats, queue_posts
+
+
+async def shutdown(bot):
+    application = bot.bot_application
+    if application is not None:
+        if application.updater.running:
+            await application.updater.stop()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+    await bot.side_effects.stop()
+    await bot.message_cleaner.stop()
+
+
+def summarize(samples, final_stats, queue_posts, args):
+    if not samples:
+        return {}
+    first, last = samples[0], samples[-1]
+    hours = max(last["sim_hours"] - first["sim_hours"], 1e-9)
+    posts = final_stats["channel_posts"]
+    gaps = [(b - a) * args.speedup / 60 for a, b in zip(posts, posts[1:])]  # Minutos simulados
+    queue_gaps = [(b - a) * args.speedup / 60 for a, b in zip(queue_posts, queue_posts[1:])]
+    simulated_hours = len(samples) * args.report_every / 3600
+    summary = {
+        "rss_start_mb": first["rss_mb"],
+        "rss_end_mb": last["rss_mb"],
+        "rss_growth_mb_per_hour": (last["rss_mb"] - first["rss_mb"]) / hours,
+        "tasks_min": min(s["tasks"] for s in samples),
+        "tasks_max": max(s["tasks"] for s in samples),
+        "threads_max": max(s["threads"] for s in samples),
+        "loop_lag_max_ms": max(s["loop_lag_max_ms"] for s in samples),
+        "posts_per_hour": sum(s["channel_posts"] for s in samples) / simulated_hours,
+        "queue_posts_per_hour": sum(s["queue_posts"] for s in samples) / simulated_hours,
+        "queue_gap_min_p50": percentile(queue_gaps, 0.5),
+        "queue_gap_min_max": max(queue_gaps, default=0.0),
+        "publish_gap_min_p50": percentile(gaps, 0.5),
+        "publish_gap_min_max": max(gaps, default=0.0),
+        "rate_limited": final_stats["rate_limited"],
+        "calls": final_stats["calls"],
+        "generated": final_stats["generated"],
+    }
+    print("\nResumen")
+    print(f"  RSS: {summary['rss_start_mb']:.1f} → {summary['rss_end_mb']:.1f} MB "
+          f"({summary['rss_growth_mb_per_hour']:+.2f} MB/h simulada)")
+    print(f"  Tareas: {summary['tasks_min']}–{summary['tasks_max']}; hilos máx. {summary['threads_max']}")
+    print(f"  Retraso máximo del loop: {summary['loop_lag_max_ms']:.1f} ms")
+    print(f"  Publicaciones: {summary['posts_per_hour']:.2f}/h, de ellas {summary['queue_posts_per_hour']:.2f}/h "
+          f"desde la cola y el resto aprobaciones directas")
+    print(f"  Entre publicaciones de la cola: p50 {summary['queue_gap_min_p50']:.0f} min, "
+          f"máx. {summary['queue_gap_min_max']:.0f} min")
+    print(f"  Entre publicaciones (todas): p50 {summary['publish_gap_min_p50']:.0f} min, máx. {summary['publish_gap_min_max']:.0f} min")
+    print(f"  429 inyectados: {summary['rate_limited']}; llamadas a la API: {sum(summary['calls'].values())}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=12, help="Horas simuladas")
+    parser.add_argument("--speedup", type=float, default=240, help="Segundos simulados por segundo real")
+    parser.add_argument("--report-every", type=float, default=3600, help="Segundos simulados entre muestras")
+    parser.add_argument("--publication-interval", type=float, default=3600, help="Segundos simulados")
+    parser.add_argument("--submissions-per-hour", type=float, default=40)
+    parser.add_argument("--moderation-delay", type=float, default=600, help="Segundos simulados como mucho")
+    parser.add_argument("--rate-limit-probability", type=float, default=0.01)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--output", help="Fichero JSON (por defecto benchmarks/results/soak-<fecha>.json)")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar el log del bot")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output or os.path.join(
+        RESULTS_DIR, f"soak-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}.json"
+    ))
+    workdir = tempfile.mkdtemp(prefix="soak-")
+    port = free_port()
+    configure_environment(args, port, workdir)
+    # Backups y ficheros heredados del bot quedan en el directorio temporal
+    os.chdir(workdir)
+    fake = start_fake_server(args, port)
+    try:
+        samples, final_stats, queue_posts = asyncio.run(soak(args, port))
+    finally:
+        fake.terminate()
+        fake.wait()
+
+    summary = summarize(samples, final_stats, queue_posts, args)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"args": vars(args), "summary": summary, "samples": samples}, f, indent=2)
+    print(f"\nResultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,9 @@ import os
 import logging
 import time
 import json
-from fastapi import FastAPI
+import secrets
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Poll
 from telegram.ext import (
     ApplicationBuilder,
@@ -15,82 +17,207 @@ from telegram.ext import (
 from dotenv import load_dotenv
 import uvicorn
 import asyncio
-import urllib.request
-from datetime import datetime
+import httpx
 from collections import deque
+from datetime import datetime, timedelta
+
+from bans import BanRegistry
+from bulk import BulkJob, parse_filters
+from cadence import (
+    ACTIVE_HOURS as ACTIVE_HOURS_DEFAULT, DRAIN_TARGET as DRAIN_TARGET_DEFAULT, MAX_PER_HOUR,
+    QUIET_INTERVAL as QUIET_INTERVAL_DEFAULT, CadenceController
+)
+from callbacks import CallbackRouter, decode_callback, encode_callback
+from cleanup import MessageCleaner
+from duplicates import RETENTION as DUPLICATE_RETENTION_DEFAULT, DuplicateIndex, fingerprint
+from effects import SideEffectQueue
+from ids import IdGenerator
+from mentions import WINDOW as MENTION_WINDOW_DEFAULT, MentionIndex, extract_mentions
+from metrics import BACKUP_DURATION, CONTENT_TYPE, REGISTRY, Counter, Gauge, timed_handler
+from items import ITEM_TYPES, PollItem, QuestionItem, TextItem, VoiceItem
+from publication import PublicationQueue
+from profiling import CaptureBusy, UpdateTimer, capture_allocations, capture_profile
+from outbox import DEAD, PUBLISHED, UNCERTAIN_CRASH, UNCERTAIN_TIMEOUT, Outbox, is_uncertain
+from outbound import PriorityRateLimiter, PRIORITY_MODERATION, PRIORITY_PUBLICATION
+from ratelimit import SlidingWindowLimiter, parse_limits
+from rules import NO_MATCH, RuleEngine
+from storage import STATUS_DEAD, STATUS_PENDING, STATUS_PROCESSING, STATUS_QUEUED, STATUS_SENDING, StateStore
 
 load_dotenv()
 TOKEN = os.getenv("BOT_TOKEN")
 MODERATION_GROUP_ID = os.getenv("MODERATION_GROUP_ID")
 PUBLIC_CHANNEL = os.getenv("PUBLIC_CHANNEL")
+# Segundos entre publicaciones automáticas desde la cola con poco backlog
+PUBLICATION_INTERVAL = int(os.getenv("PUBLICATION_INTERVAL", "3600"))
+# Cadencia adaptativa (ver cadence.py): tope de publicaciones por hora, horas
+# activas en hora local ("8-24", "20-2"), intervalo fuera de ellas (0: no
+# publicar) y horas activas en las que se quiere vaciar una cola larga
+MAX_POSTS_PER_HOUR = int(os.getenv("MAX_POSTS_PER_HOUR", MAX_PER_HOUR))
+ACTIVE_HOURS = os.getenv("ACTIVE_HOURS", ACTIVE_HOURS_DEFAULT)
+QUIET_INTERVAL = float(os.getenv("QUIET_INTERVAL", QUIET_INTERVAL_DEFAULT))
+DRAIN_TARGET = float(os.getenv("DRAIN_TARGET", DRAIN_TARGET_DEFAULT))
+# Modo webhook: si hay URL pública, Telegram envía las updates a FastAPI.
+# Sin ella se usa long polling como alternativa.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = "/webhook"
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+# Keep-alive para que Render.com no duerma la instancia
+KEEPALIVE_URL = os.getenv("RENDER_EXTERNAL_URL") or "https://oneandysr-github-io.onrender.com"
+KEEPALIVE_INTERVAL = int(os.getenv("KEEPALIVE_INTERVAL", "30"))  # Timeout de Render: 50s
+# Updates que tarden más (segundos) se registran en el log
+SLOW_UPDATE_THRESHOLD = float(os.getenv("SLOW_UPDATE_THRESHOLD", "1.0"))
+# Token para /debug/profile y /debug/allocations; sin él, los endpoints no existen
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+# Segundos que se recuerdan los envíos para detectar duplicados (7 días por defecto)
+DUPLICATE_RETENTION = float(os.getenv("DUPLICATE_RETENTION", DUPLICATE_RETENTION_DEFAULT))
+# Ventana en segundos de las menciones que se muestran a los moderadores (7 días)
+MENTION_WINDOW = float(os.getenv("MENTION_WINDOW", MENTION_WINDOW_DEFAULT))
+# Bot API alternativa (servidor propio o el falso de benchmarks/fake_telegram.py),
+# p. ej. http://127.0.0.1:8081/bot; sin ella se usa api.telegram.org
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+# Reglas de contenido (ver rules.py); se recargan al editar el fichero
+RULES_FILE = os.getenv("RULES_FILE", "rules.json")
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     level=logging.INFO
 )
 
-# Variables globales
-pending_confessions = {}
-pending_polls = {}
-pending_voices = {}
-pending_questions = {}  # Nueva variable para preguntas
-user_last_confession = {}
-banned_users = {}
-# Nueva cola para publicación automática
-publication_queue = deque()
+# Estado persistente (pendientes, cola, sanciones) en SQLite
+store = StateStore(os.getenv("DB_PATH", "bot_state.db"))
+# IDs de items: continúan a partir del mayor ID guardado
+id_generator = IdGenerator(store.max_item_id())
+# Índice en memoria de las sanciones vigentes
+ban_registry = BanRegistry(store)
+# Límite de envíos por usuario y tipo, p. ej. RATE_LIMITS="text=1/60,voice=2/300"
+rate_limiter = SlidingWindowLimiter(parse_limits(os.getenv("RATE_LIMITS")))
 # Estado de la publicación automática
 auto_publishing_active = True
+# Aplicación de PTB en ejecución (la usa el webhook de FastAPI)
+bot_application = None
+# Todas las llamadas a la Bot API pasan por este limitador
+outbound_limiter = PriorityRateLimiter(chat_priorities={
+    PUBLIC_CHANNEL: PRIORITY_PUBLICATION,
+    MODERATION_GROUP_ID: PRIORITY_MODERATION
+})
+# Avisos a usuarios y limpieza de mensajes, fuera del camino del moderador
+side_effects = SideEffectQueue()
+# Borrados de mensajes programados, agrupados en deleteMessages
+message_cleaner = MessageCleaner(store)
+# Duración de cada update y de sus handlers
+update_timer = UpdateTimer(SLOW_UPDATE_THRESHOLD)
+# Huellas de los textos y encuestas recientes (duplicados y casi duplicados)
+duplicate_index = DuplicateIndex(store, retention=DUPLICATE_RETENTION)
+# Orden de la cola de publicación (prioridad, hora programada, reparto por tipo)
+publication_queue = PublicationQueue(store)
+# Envío de la cola con reintentos y cola de fallidos
+outbox = Outbox(store, publication_queue)
+# Intervalo entre publicaciones según backlog, hora del día y presupuesto por hora
+cadence = CadenceController(PUBLICATION_INTERVAL, MAX_POSTS_PER_HOUR, ACTIVE_HOURS, QUIET_INTERVAL, DRAIN_TARGET)
+# Personas mencionadas en los envíos recientes
+mention_index = MentionIndex(store, window=MENTION_WINDOW)
+# Etiquetas, prioridad y rechazo automático según las normas del canal
+rule_engine = RuleEngine(RULES_FILE)
 
 class BackupManager:
-    def __init__(self, backup_file="bot_backup.json"):
+    """Copias de seguridad de la base de datos de estado.
+
+    El estado vive en SQLite (ver storage.py), así que al arrancar no hay nada
+    que reconstruir: este gestor guarda una copia consistente fuera del event
+    loop y migra una única vez el antiguo backup JSON + journal.
+    """
+
+    def __init__(self, backup_file="bot_backup.db", legacy_backup_file="bot_backup.json",
+                 legacy_journal_file="bot_journal.jsonl"):
         self.backup_file = backup_file
-        self.backup_interval = 60  # Backup cada 60s para Render.com
-    
+        self.legacy_backup_file = legacy_backup_file
+        self.legacy_journal_file = legacy_journal_file
+        self.backup_interval = 600  # Copia cada 10 min (solo si hubo cambios)
+        self._snapshot_changes = None  # store.changes en la última copia
+        self._lock = asyncio.Lock()
+
+    def _write_snapshot(self):
+        """Copiar la base de datos de forma atómica (fuera del event loop)"""
+        tmp_file = self.backup_file + ".tmp"
+        store.backup_to(tmp_file)
+        # Un fallo antes de este punto deja intacta la copia anterior
+        os.replace(tmp_file, self.backup_file)
+
     async def save_backup(self):
-        try:
-            backup_data = {
-                'pending_confessions': pending_confessions,
-                'pending_polls': pending_polls,
-                'pending_voices': pending_voices,
-                'pending_questions': pending_questions,  # Nueva línea
-                'banned_users': banned_users,
-                'user_last_confession': user_last_confession,
-                'publication_queue': list(publication_queue),
-                'backup_timestamp': datetime.now().isoformat()
-            }
-            
-            with open(self.backup_file, 'w', encoding='utf-8') as f:
-                json.dump(backup_data, f, ensure_ascii=False, indent=2)
-            
-            logging.info(f"💾 Backup guardado: {self.backup_file}")
-            
-        except Exception as e:
-            logging.error(f"❌ Error guardando backup: {e}")
-    
+        async with self._lock:
+            changes = store.changes
+            if changes == self._snapshot_changes and os.path.exists(self.backup_file):
+                logging.debug("💾 Backup omitido: sin cambios desde la última copia")
+                return
+
+            try:
+                with BACKUP_DURATION.time():
+                    await asyncio.to_thread(self._write_snapshot)
+                self._snapshot_changes = changes
+                logging.info(f"💾 Backup guardado: {self.backup_file}")
+            except Exception as e:
+                logging.error(f"❌ Error guardando backup: {e}")
+
+    def _read_legacy_state(self):
+        """Leer el backup JSON y reproducir encima el journal del formato anterior"""
+        state = {}
+        if os.path.exists(self.legacy_backup_file):
+            with open(self.legacy_backup_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        snapshot_seq = state.get('journal_seq', 0)
+
+        dict_names = ('pending_confessions', 'pending_polls', 'pending_voices',
+                      'pending_questions', 'banned_users', 'user_last_confession')
+        for name in dict_names:
+            state[name] = {int(k): v for k, v in state.get(name, {}).items()}
+        queue = deque(state.get('publication_queue', []))
+
+        for path in (self.legacy_journal_file + ".old", self.legacy_journal_file):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        seq, op, *args = json.loads(line)
+                    except ValueError:
+                        continue  # Línea a medio escribir tras una caída
+                    if seq <= snapshot_seq:
+                        continue
+                    if op == "put":
+                        state[args[0]][args[1]] = args[2]
+                    elif op == "del":
+                        # Los journals de la primera versión anotaban dos veces
+                        # cada borrado al encolar: repetir el pop no cambia nada
+                        state[args[0]].pop(args[1], None)
+                    elif op == "q+":
+                        queue.append(args[0])
+                    elif op == "q<":
+                        queue.appendleft(args[0])
+                    elif op == "q-" and queue:
+                        queue.popleft()
+
+        state['publication_queue'] = list(queue)
+        return state
+
     async def load_backup(self):
+        """Migrar a SQLite el backup JSON + journal de versiones anteriores"""
+        legacy_files = [
+            path for path in (self.legacy_backup_file, self.legacy_journal_file + ".old", self.legacy_journal_file)
+            if os.path.exists(path)
+        ]
+        if not legacy_files:
+            return False
+
         try:
-            if os.path.exists(self.backup_file):
-                with open(self.backup_file, 'r', encoding='utf-8') as f:
-                    backup_data = json.load(f)
-                
-                pending_confessions.update(backup_data.get('pending_confessions', {}))
-                pending_polls.update(backup_data.get('pending_polls', {}))
-                pending_voices.update(backup_data.get('pending_voices', {}))
-                pending_questions.update(backup_data.get('pending_questions', {}))  # Nueva línea
-                banned_users.update(backup_data.get('banned_users', {}))
-                user_last_confession.update(backup_data.get('user_last_confession', {}))
-                
-                # Cargar la cola de publicación si existe
-                queue_data = backup_data.get('publication_queue', [])
-                publication_queue.clear()
-                publication_queue.extend(queue_data)
-                
-                logging.info(f"📂 Backup cargado: {len(pending_confessions)} confesiones, {len(pending_polls)} encuestas, {len(pending_voices)} mensajes de voz, {len(pending_questions)} preguntas, {len(publication_queue)} en cola")
-                return True
-                
+            state = self._read_legacy_state()
+            store.import_legacy(state)
+            for path in legacy_files:
+                os.replace(path, path + ".migrated")
+            logging.info(f"📂 Backup migrado a {store.path}: {store.count_items('text')} confesiones, {store.count_items('poll')} encuestas, {store.count_items('voice')} mensajes de voz, {store.count_items('question')} preguntas, {store.queue_length()} en cola")
+            return True
         except Exception as e:
-            logging.error(f"❌ Error cargando backup: {e}")
-        
+            logging.error(f"❌ Error migrando backup: {e}")
+
         return False
     
     async def start_auto_backup(self):
@@ -100,26 +227,50 @@ class BackupManager:
 
 backup_manager = BackupManager()
 
+def _item_gauge(column):
+    def collect():
+        now = time.time()
+        for item_type, status, count, oldest in store.item_stats():
+            yield (item_type, status), count if column == "count" else now - oldest
+    return collect
+
+# Métricas calculadas en cada scrape de /metrics
+Gauge("bot_items", "Items por tipo y estado (pending/queued/processing/sending/dead)", ("type", "status"),
+      callback=_item_gauge("count"))
+Gauge("bot_oldest_item_age_seconds", "Antigüedad del item más antiguo por tipo y estado", ("type", "status"),
+      callback=_item_gauge("age"))
+Gauge("bot_outbound_queue_depth", "Llamadas a la Bot API esperando turno en el limitador",
+      callback=lambda: outbound_limiter.queue_depth)
+Gauge("bot_side_effects_depth", "Efectos (avisos, publicaciones) esperando worker",
+      callback=lambda: side_effects.depth)
+Gauge("bot_scheduled_deletions", "Mensajes pendientes de borrar",
+      callback=lambda: message_cleaner.pending)
+Gauge("bot_active_bans", "Sanciones vigentes", callback=lambda: len(ban_registry))
+Gauge("bot_duplicate_index_entries", "Envíos recientes en el índice de duplicados",
+      callback=lambda: len(duplicate_index))
+DUPLICATES = Counter("bot_duplicates_total", "Envíos repetidos detectados (collapsed/flagged)", ("result",))
+QUEUE_SENDS = Counter("bot_queue_sends_total", "Envíos desde la cola por resultado (published/retry/dead)", ("result",))
+RULE_MATCHES = Counter("bot_rule_matches_total", "Envíos que activaron cada regla de contenido", ("rule", "action"))
+
 def is_user_banned(user_id: int) -> tuple:
     current_time = time.time()
-    if user_id in banned_users and current_time < banned_users[user_id]:
-        remaining_time = int(banned_users[user_id] - current_time)
+    unban_time = ban_registry.ban_until(user_id)
+    if unban_time is not None and current_time < unban_time:
+        remaining_time = int(unban_time - current_time)
         hours = remaining_time // 3600
         minutes = (remaining_time % 3600) // 60
         return True, f"🚫 Estás baneado. Tiempo restante: {hours}h {minutes}m"
     return False, ""
 
-def check_rate_limit(user_id: int) -> tuple:
-    current_time = time.time()
-    if user_id in user_last_confession:
-        time_since_last = current_time - user_last_confession[user_id]
-        if time_since_last < 60:
-            remaining_time = int(60 - time_since_last)
-            return True, f"⏰ Por favor espera {remaining_time} segundos antes de enviar otra confesión."
+def check_rate_limit(user_id: int, kind: str = "text") -> tuple:
+    remaining_time = rate_limiter.retry_after(user_id, kind)
+    if remaining_time > 0:
+        return True, f"⏰ Por favor espera {int(remaining_time) + 1} segundos antes de enviar otra confesión."
     return False, ""
 
-def generate_id(*args) -> int:
-    return abs(hash("".join(str(arg) for arg in args))) % (10**8)
+def generate_id(now: float = None) -> int:
+    """ID único, ordenado por tiempo y estable entre reinicios (ver ids.py)"""
+    return id_generator.next_id(now)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
@@ -160,7 +311,7 @@ async def preguntas(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Verificar rate limit
-    rate_limited, message = check_rate_limit(user_id)
+    rate_limited, message = check_rate_limit(user_id, "question")
     if rate_limited:
         await update.message.reply_text(message)
         return
@@ -195,59 +346,51 @@ async def handle_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Verificar rate limit
-    rate_limited, message = check_rate_limit(user_id)
+    rate_limited, message = check_rate_limit(user_id, "question")
     if rate_limited:
         await update.message.reply_text(message)
         return
 
     current_time = time.time()
-    user_last_confession[user_id] = current_time
+    rate_limiter.hit(user_id, "question", current_time)
     
-    question_text = update.message.text
-    question_id = generate_id(user_id, question_text, current_time)
+    question = QuestionItem(generate_id(current_time), user_id, current_time, text=update.message.text)
     
     # Guardar la pregunta
-    pending_questions[question_id] = {
-        "text": question_text, 
-        "user_id": user_id,
-        "timestamp": current_time
-    }
+    store.add_item(question)
     
     # Enviar a moderación
-    await send_question_to_moderation(context, question_id, question_text, user_id)
+    await send_question_to_moderation(context, question)
     
     await update.message.reply_text("✅ Tu pregunta ha sido enviada a los moderadores. Te responderán cuando esté disponible.")
 
-async def send_question_to_moderation(context, question_id, question_text, user_id):
-    """Enviar pregunta al grupo de moderadores con botones de responder y sancionar"""
-    message_text = (
-        f"❓ Nueva pregunta\n\n"
-        f"{question_text}"
-    )
-    
-    keyboard = InlineKeyboardMarkup([[
-        InlineKeyboardButton("📝 Responder", callback_data=f"respond_question_{question_id}"),
-        InlineKeyboardButton("⚖️ Sancionar", callback_data=f"sancionar_question_{question_id}")
+def create_question_keyboard(question_id):
+    """Teclado de preguntas (Responder, Sancionar)"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("📝 Responder", callback_data=encode_callback("respond", "question", question_id)),
+        InlineKeyboardButton("⚖️ Sancionar", callback_data=encode_callback("sancionar", "question", question_id))
     ]])
-    
-    await context.bot.send_message(
-        chat_id=MODERATION_GROUP_ID,
-        text=message_text,
-        reply_markup=keyboard
+
+async def send_question_to_moderation(context, question):
+    """Enviar pregunta al grupo de moderadores con botones de responder y sancionar"""
+    message = await question.send_to_moderation(
+        context.bot, MODERATION_GROUP_ID, create_question_keyboard(question.id), mention_note(question)
     )
+    store.set_message_id(question.id, message.message_id)
 
 async def handle_question_response(query, question_id, context):
     """Manejar la respuesta a una pregunta"""
     try:
         # Verificar que la pregunta todavía existe
-        if question_id not in pending_questions:
+        question_data = store.get_item(question_id, "question")
+        if question_data is None:
             await query.answer("❌ Esta pregunta ya no existe", show_alert=True)
             return
         
         # Guardar información para eliminar mensajes después
         context.user_data['responding_to_question'] = question_id
         context.user_data['question_message_id'] = query.message.message_id
-        context.user_data['question_user_id'] = pending_questions[question_id]["user_id"]
+        context.user_data['question_user_id'] = question_data.user_id
         
         await query.answer()
         
@@ -264,22 +407,23 @@ async def handle_question_response(query, question_id, context):
 async def handle_question_sancion(query, question_id, context):
     """Manejar sanción para preguntas inapropiadas"""
     try:
-        if question_id not in pending_questions:
+        question_data = store.get_item(question_id, "question")
+        if question_data is None:
             await query.answer("❌ Esta pregunta ya no existe", show_alert=True)
             return
             
-        user_id = pending_questions[question_id]["user_id"]
+        user_id = question_data.user_id
         
         # Mostrar menú de sanciones (similar al de confesiones)
         keyboard = [
             [
-                InlineKeyboardButton("1 hora", callback_data=f"ban_question_1_{question_id}_{user_id}"),
-                InlineKeyboardButton("2 horas", callback_data=f"ban_question_2_{question_id}_{user_id}"),
-                InlineKeyboardButton("4 horas", callback_data=f"ban_question_4_{question_id}_{user_id}"),            
+                InlineKeyboardButton("1 hora", callback_data=encode_callback("ban", "question", question_id, user_id, 1)),
+                InlineKeyboardButton("2 horas", callback_data=encode_callback("ban", "question", question_id, user_id, 2)),
+                InlineKeyboardButton("4 horas", callback_data=encode_callback("ban", "question", question_id, user_id, 4)),            
             ],
             [
-                InlineKeyboardButton("24 horas", callback_data=f"ban_question_24_{question_id}_{user_id}"),
-                InlineKeyboardButton("↩️ Cancelar", callback_data=f"cancel_question_{question_id}")
+                InlineKeyboardButton("24 horas", callback_data=encode_callback("ban", "question", question_id, user_id, 24)),
+                InlineKeyboardButton("↩️ Cancelar", callback_data=encode_callback("cancel", "question", question_id))
             ]
         ]
         
@@ -320,11 +464,10 @@ async def handle_response_text(update: Update, context: ContextTypes.DEFAULT_TYP
     response_text = update.message.text
     
     # Buscar la pregunta
-    if question_id not in pending_questions:
+    question_data = store.get_item(question_id, "question")
+    if question_data is None:
         await update.message.reply_text("❌ La pregunta ya no existe o fue respondida anteriormente.")
         return
-        
-    question_data = pending_questions[question_id]
     
     try:
         # Enviar respuesta al usuario
@@ -334,66 +477,28 @@ async def handle_response_text(update: Update, context: ContextTypes.DEFAULT_TYP
         )
         
         # Eliminar la pregunta de pendientes
-        del pending_questions[question_id]
-        
-        # ✅ ELIMINAR TODOS LOS MENSAJES RELACIONADOS
-        messages_to_delete = []
-        
-        # Mensaje original de la pregunta
-        if question_message_id:
-            messages_to_delete.append(question_message_id)
+        store.delete_item(question_id)
         
-        # Mensaje "Por favor escribe..."
-        if response_prompt_message_id:
-            messages_to_delete.append(response_prompt_message_id)
-        
-        # Mensaje de respuesta del moderador
-        messages_to_delete.append(update.message.message_id)
-        
-        # Eliminar todos los mensajes
-        for msg_id in messages_to_delete:
-            try:
-                await context.bot.delete_message(
-                    chat_id=MODERATION_GROUP_ID,
-                    message_id=msg_id
-                )
-            except Exception as e:
-                logging.error(f"Error eliminando mensaje {msg_id}: {e}")
+        # ✅ ELIMINAR TODOS LOS MENSAJES RELACIONADOS (pregunta, "Por favor
+        # escribe..." y la respuesta del moderador) en una sola llamada
+        message_cleaner.schedule(
+            MODERATION_GROUP_ID,
+            [question_message_id, response_prompt_message_id, update.message.message_id]
+        )
         
         # ✅ ENVIAR Y ELIMINAR MENSAJE DE CONFIRMACIÓN TEMPORAL
         confirmation_msg = await context.bot.send_message(
             chat_id=MODERATION_GROUP_ID,
             text="✅ Pregunta respondida exitosamente."
         )
-        
-        # Eliminar el mensaje de confirmación después de 3 segundos
-        async def delete_confirmation():
-            await asyncio.sleep(3)
-            try:
-                await context.bot.delete_message(
-                    chat_id=MODERATION_GROUP_ID,
-                    message_id=confirmation_msg.message_id
-                )
-            except Exception as e:
-                logging.error(f"Error eliminando mensaje de confirmación: {e}")
-        
-        asyncio.create_task(delete_confirmation())
+        schedule_message_delete(confirmation_msg.message_id, delay=3)
         
     except Exception as e:
         logging.error(f"Error enviando respuesta: {e}")
         
         # ✅ ELIMINAR MENSAJE DE ERROR DESPUÉS DE 5 SEGUNDOS
         error_msg = await update.message.reply_text("❌ Error al enviar la respuesta.")
-        async def delete_error():
-            await asyncio.sleep(5)
-            try:
-                await context.bot.delete_message(
-                    chat_id=MODERATION_GROUP_ID,
-                    message_id=error_msg.message_id
-                )
-            except Exception as delete_e:
-                logging.error(f"Error eliminando mensaje de error: {delete_e}")
-        asyncio.create_task(delete_error())
+        schedule_message_delete(error_msg.message_id, delay=5)
 
 async def backup_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando para hacer backup manual"""
@@ -418,36 +523,28 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Verificar rate limit
-    rate_limited, message = check_rate_limit(user_id)
+    rate_limited, message = check_rate_limit(user_id, "voice")
     if rate_limited:
         await update.message.reply_text(message)
         return
 
     current_time = time.time()
-    user_last_confession[user_id] = current_time
+    rate_limiter.hit(user_id, "voice", current_time)
     
     voice = update.message.voice
     
     # Guardar información del mensaje de voz
-    voice_id = generate_id(user_id, voice.file_id, current_time)
-    
-    pending_voices[voice_id] = {
-        "file_id": voice.file_id,
-        "duration": voice.duration,
-        "file_size": voice.file_size,
-        "user_id": user_id,
-        "timestamp": current_time
-    }
-    
-    await send_to_moderation(
-        context, 
-        voice_id, 
-        None, 
-        user_id, 
-        is_poll=False,
-        is_voice=True,
-        voice_data=pending_voices[voice_id]
+    item = VoiceItem(
+        generate_id(current_time),
+        user_id,
+        current_time,
+        file_id=voice.file_id,
+        duration=voice.duration,
+        file_size=voice.file_size
     )
+    store.add_item(item)
+    
+    await send_to_moderation(context, item)
     
     await update.message.reply_text("✋ Tu mensaje de voz ha sido enviado a moderación.")
 
@@ -486,30 +583,24 @@ async def handle_confession(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Verificar rate limit
-    rate_limited, message = check_rate_limit(user_id)
+    rate_limited, message = check_rate_limit(user_id, "text")
     if rate_limited:
         await update.message.reply_text(message)
         return
 
     current_time = time.time()
-    user_last_confession[user_id] = current_time
+    rate_limiter.hit(user_id, "text", current_time)
     
-    confession = update.message.text
-    confession_id = generate_id(user_id, confession, current_time)
-    
-    pending_confessions[confession_id] = {
-        "text": confession, 
-        "user_id": user_id
-    }
+    item = TextItem(generate_id(current_time), user_id, current_time, text=update.message.text)
+    verdict = screen_item(item)
+    if verdict.rejected:
+        await update.message.reply_text(item.REJECTED_TEXT)
+        return
+    store.add_item(item)
     
-    await send_to_moderation(
-        context, 
-        confession_id, 
-        confession, 
-        user_id, 
-        is_poll=False,
-        is_voice=False
-    )
+    if not await send_to_moderation(context, item, verdict):
+        await update.message.reply_text(DUPLICATE_REPLY)
+        return
     
     await update.message.reply_text("✋ Tu confesión ha sido enviada a moderación.")
 
@@ -526,73 +617,117 @@ async def handle_poll(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Verificar rate limit
-    rate_limited, message = check_rate_limit(user_id)
+    rate_limited, message = check_rate_limit(user_id, "poll")
     if rate_limited:
         await update.message.reply_text(message)
         return
 
     current_time = time.time()
-    user_last_confession[user_id] = current_time
+    rate_limiter.hit(user_id, "poll", current_time)
     
     poll = update.message.poll
-    poll_id = generate_id(user_id, poll.question, poll.options[0].text, current_time)
-
-    pending_polls[poll_id] = {
-        "question": poll.question,
-        "options": [option.text for option in poll.options],
-        "is_anonymous": poll.is_anonymous,
-        "type": poll.type,
-        "allows_multiple_answers": poll.allows_multiple_answers,
-        "user_id": user_id
-    }
-    
-    await send_to_moderation(
-        context, 
-        poll_id, 
-        None, 
-        user_id, 
-        is_poll=True, 
-        is_voice=False,
-        poll_data=pending_polls[poll_id]
+    item = PollItem(
+        generate_id(current_time),
+        user_id,
+        current_time,
+        question=poll.question,
+        options=[option.text for option in poll.options],
+        is_anonymous=poll.is_anonymous,
+        poll_type=poll.type,
+        allows_multiple_answers=poll.allows_multiple_answers
     )
+    verdict = screen_item(item)
+    if verdict.rejected:
+        await update.message.reply_text(item.REJECTED_TEXT)
+        return
+    store.add_item(item)
+    
+    if not await send_to_moderation(context, item, verdict):
+        await update.message.reply_text(DUPLICATE_REPLY)
+        return
     
     await update.message.reply_text("✋ Tu encuesta ha sido enviada a moderación.")
 
-async def send_to_moderation(context, item_id, confession_text, user_id, is_poll=False, is_voice=False, poll_data=None, voice_data=None):
-    # QUITAR IDs DE LOS MENSAJES
-    if is_poll:
-        options_text = "\n".join([f"• {option}" for option in poll_data["options"]])
-        message_text = (
-            f"📊 Nueva encuesta\n\n"
-            f"Pregunta: {poll_data['question']}\n\nOpciones:\n{options_text}\n\n"
-            f"Tipo: {poll_data['type']}\nAnónima: {'Sí' if poll_data['is_anonymous'] else 'No'}\n"
-            f"Múltiples respuestas: {'Sí' if poll_data['allows_multiple_answers'] else 'No'}"
-        )
-        item_type_prefix = "poll"
-    elif is_voice:
-        message_text = (
-            f"🎤 Nuevo mensaje de voz\n\n"
-            f"Duración: {voice_data['duration']} segundos"
-        )
-        item_type_prefix = "voice"
-    else:
-        # QUITAR ID DE CONFESIONES
-        message_text = f"📝 Nueva confesión\n\n{confession_text}"
-        item_type_prefix = "text"
+DUPLICATE_REPLY = "♻️ Ya hay un envío idéntico esperando moderación o publicación."
+STATUS_LABELS = {
+    STATUS_PENDING: "pendiente", STATUS_QUEUED: "en cola", STATUS_SENDING: "publicándose", STATUS_DEAD: "fallido"
+}
 
-    if is_voice:
-        await context.bot.send_voice(
-            chat_id=MODERATION_GROUP_ID,
-            voice=voice_data['file_id'],
-            caption=message_text,
-            reply_markup=create_moderation_keyboard(item_id, item_type_prefix)
-        )
+def duplicate_note(item, duplicate, previous):
+    """Aviso para los moderadores sobre un envío repetido"""
+    if previous is None:
+        state = "ya moderado"
     else:
-        await context.bot.send_message(
-            chat_id=MODERATION_GROUP_ID,
-            text=message_text,
-            reply_markup=create_moderation_keyboard(item_id, item_type_prefix)
-        )
+        state = STATUS_LABELS.get(previous.status, previous.status)
+        if previous.user_id == item.user_id:
+            state += ", mismo usuario"
+    if duplicate.exact:
+        return f"♻️ Duplicado exacto de {duplicate.item_id} ({state})"
+    return f"♻️ Posible duplicado ({duplicate.similarity:.0%}) de {duplicate.item_id} ({state})"
+
+def screen_item(item):
+    """Aplicar las reglas de contenido (ver rules.py) a un texto o encuesta"""
+    verdict = rule_engine.evaluate(item.fingerprint_text())
+    for rule, action in {(hit.rule, hit.action) for hit in verdict.hits}:
+        RULE_MATCHES.inc(rule, action)
+    if verdict.rejected:
+        logging.info(f"⛔ {item.LABEL} de {item.user_id} rechazada por las reglas: {verdict.note()}")
+    return verdict
+
+MENTION_NOTE_LIMIT = 3  # Nombres mostrados como mucho en un mensaje de moderación
+
+def mention_note(item):
+    """Contar las personas que menciona el item y avisar de las ya mencionadas antes"""
+    names = extract_mentions(item.mention_text())
+    if not names:
+        return None
+    mention_index.add(item.id, names, item.created_at)
+    counts = sorted(((mention_index.count(name), name) for name in names), reverse=True)
+    days = f"{MENTION_WINDOW / 86400:g}"
+    lines = [
+        f"👤 {name}: mencionado {count} veces en {days} días"
+        for count, name in counts[:MENTION_NOTE_LIMIT] if count > 1
+    ]
+    return "\n".join(lines) or None
+
+async def send_to_moderation(context, item, verdict=NO_MATCH):
+    """Enviar un item al grupo de moderación con su teclado.
+
+    Un texto o encuesta idéntico a otro aún pendiente o en cola se descarta
+    (devuelve False) en lugar de ocupar otro mensaje de moderación; si se
+    parece a uno reciente, el mensaje lo indica. Las reglas activadas
+    (``verdict``) se añaden al mensaje, y si alguna pide prioridad el mensaje
+    adelanta a los demás en el limitador de salida.
+    """
+    notes = [verdict.note()] if verdict.hits else []
+    text = item.fingerprint_text()
+    if text:
+        fp = fingerprint(text)
+        duplicate = duplicate_index.find(fp)
+        if duplicate is not None:
+            previous = store.get_item(duplicate.item_id, status=None)
+            if duplicate.exact and previous is not None:
+                store.delete_item(item.id)
+                DUPLICATES.inc("collapsed")
+                logging.info(f"♻️ {item.LABEL} {item.id} descartada: idéntica a {duplicate.item_id}")
+                return False
+            DUPLICATES.inc("flagged")
+            notes.append(duplicate_note(item, duplicate, previous))
+        duplicate_index.add(item.id, fp, item.created_at)
+    note = mention_note(item)
+    if note:
+        notes.append(note)
+
+    message = await item.send_to_moderation(
+        context.bot,
+        MODERATION_GROUP_ID,
+        create_moderation_keyboard(item.id, item.TYPE),
+        "\n".join(notes) or None,
+        {"priority": PRIORITY_PUBLICATION} if verdict.prioritised else None
+    )
+    # Para poder borrarlo al moderar en bloque
+    store.set_message_id(item.id, message.message_id)
+    return True
 
 def create_moderation_keyboard(item_id, item_type_prefix=""):
     """Crear teclado de moderación (Aprobar, Cola, Rechazar, Sancionar)"""
@@ -600,12 +735,12 @@ def create_moderation_keyboard(item_id, item_type_prefix=""):
     prefix = item_type_prefix if item_type_prefix else "text"
     return InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("✅ Aprobar", callback_data=f"approve_{prefix}_{item_id}"),
-            InlineKeyboardButton("✅ Cola", callback_data=f"cola_{prefix}_{item_id}")
+            InlineKeyboardButton("✅ Aprobar", callback_data=encode_callback("approve", prefix, item_id)),
+            InlineKeyboardButton("✅ Cola", callback_data=encode_callback("cola", prefix, item_id))
         ],
         [
-            InlineKeyboardButton("❌ Rechazar", callback_data=f"reject_{prefix}_{item_id}"),
-            InlineKeyboardButton("⚖️ Sancionar", callback_data=f"sancionar_{prefix}_{item_id}")
+            InlineKeyboardButton("❌ Rechazar", callback_data=encode_callback("reject", prefix, item_id)),
+            InlineKeyboardButton("⚖️ Sancionar", callback_data=encode_callback("sancionar", prefix, item_id))
         ]
     ])
 
@@ -616,13 +751,13 @@ async def handle_sancion_menu(query, item_id, item_type, user_id):
     
     keyboard = [
         [
-            InlineKeyboardButton("1 hora", callback_data=f"ban_1_{item_id}_{callback_prefix}_{user_id}"),
-            InlineKeyboardButton("2 horas", callback_data=f"ban_2_{item_id}_{callback_prefix}_{user_id}"),
-            InlineKeyboardButton("4 horas", callback_data=f"ban_4_{item_id}_{callback_prefix}_{user_id}"),            
+            InlineKeyboardButton("1 hora", callback_data=encode_callback("ban", callback_prefix, item_id, user_id, 1)),
+            InlineKeyboardButton("2 horas", callback_data=encode_callback("ban", callback_prefix, item_id, user_id, 2)),
+            InlineKeyboardButton("4 horas", callback_data=encode_callback("ban", callback_prefix, item_id, user_id, 4)),            
         ],
         [
-            InlineKeyboardButton("24 horas", callback_data=f"ban_24_{item_id}_{callback_prefix}_{user_id}"),
-            InlineKeyboardButton("↩️ Cancelar", callback_data=f"cancel_{item_id}_{callback_prefix}")
+            InlineKeyboardButton("24 horas", callback_data=encode_callback("ban", callback_prefix, item_id, user_id, 24)),
+            InlineKeyboardButton("↩️ Cancelar", callback_data=encode_callback("cancel", callback_prefix, item_id))
         ]
     ]
     
@@ -639,97 +774,90 @@ async def handle_sancion_menu(query, item_id, item_type, user_id):
         )
 
 async def aplicar_sancion(user_id: int, horas: int, context: ContextTypes.DEFAULT_TYPE):
-    current_time = time.time()
-    unban_time = current_time + (horas * 3600)
-    banned_users[user_id] = unban_time
+    """Sancionar al usuario; la duración se duplica en cada reincidencia reciente"""
+    unban_time, horas, strikes = ban_registry.ban(user_id, horas)
+    if strikes > 1:
+        logging.info(f"⚖️ Reincidencia {strikes} del usuario {user_id}: sanción de {horas} hora(s)")
     
+    await side_effects.submit(
+        f"aviso de sanción a {user_id}", notify_user, context.bot, user_id,
+        f"🚫 Has sido sancionado por {horas} hora(s) por enviar contenido inapropiado."
+    )
+    
+    return unban_time, horas
+
+async def notify_user(bot, user_id, text):
+    """Mensaje privado a un usuario (se ejecuta en la cola de efectos)"""
+    await bot.send_message(chat_id=user_id, text=text)
+
+async def schedule_followups(bot, item, text, message_id=None):
+    """Encolar el aviso al autor y programar el borrado del mensaje de moderación"""
+    if text:
+        await side_effects.submit(f"aviso a {item.user_id}", notify_user, bot, item.user_id, text)
+    message_id = message_id or item.message_id
+    if message_id:
+        schedule_message_delete(message_id)
+
+def schedule_message_delete(message_id, delay=0.0):
+    """Programar el borrado de un mensaje del grupo de moderación (ver cleanup.py)"""
+    message_cleaner.schedule(MODERATION_GROUP_ID, [message_id], delay)
+
+async def publish_claimed(item, bot):
+    """Publicar un item ya reservado con ``claim_item`` y retirarlo de pendientes"""
+    await item.publish(bot, PUBLIC_CHANNEL)
+    cadence.record()
+    store.delete_item(item.id)
+
+async def approve_item(item, context):
+    """Publicar el item en el canal y retirarlo de pendientes.
+
+    Devuelve False si otro moderador ya lo está publicando o lo procesó.
+    """
+    if not store.claim_item(item.id):
+        return False
     try:
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=f"🚫 Has sido sancionado por {horas} hora(s) por enviar contenido inapropiado."
-        )
+        await publish_claimed(item, context.bot)
     except Exception:
-        pass
-    
-    return unban_time
-
-async def approve_item(item_id, item_type, context):
-    """Aprobar item según su tipo"""
-    if item_type == "poll":
-        poll_data = pending_polls[item_id]
-        await context.bot.send_poll(
-            chat_id=PUBLIC_CHANNEL,
-            question=poll_data["question"],
-            options=poll_data["options"],
-            is_anonymous=poll_data["is_anonymous"],
-            type=poll_data["type"],
-            allows_multiple_answers=poll_data["allows_multiple_answers"]
-        )
-        del pending_polls[item_id]
-        return poll_data["user_id"], "encuesta"
-    
-    elif item_type == "voice":
-        voice_data = pending_voices[item_id]
-        # Asegurarnos de que el file_id existe
-        if "file_id" not in voice_data:
-            logging.error(f"Voice data missing file_id: {voice_data}")
-            raise ValueError("Voice data is missing file_id")
-        
-        await context.bot.send_voice(
-            chat_id=PUBLIC_CHANNEL,
-            voice=voice_data["file_id"],
-            caption="🎤 Confesión anónima en mensaje de voz"
-        )
-        del pending_voices[item_id]
-        return voice_data["user_id"], "mensaje de voz"
-    
-    else:  # Texto
-        confession_data = pending_confessions[item_id]
-        await context.bot.send_message(
-            chat_id=PUBLIC_CHANNEL,
-            text=f"📢 Confesión anónima:\n\n{confession_data['text']}"
-        )
-        del pending_confessions[item_id]
-        return confession_data["user_id"], "confesión"
-
-async def add_to_queue(item_id, item_type, context):
-    """Agregar item a la cola de publicación automática"""
-    if item_type == "poll":
-        item_data = pending_polls[item_id].copy()
-        item_data["_type"] = "poll"
-        item_data["_id"] = item_id
-        publication_queue.append(item_data)
-        del pending_polls[item_id]
-        return item_data["user_id"], "encuesta"
-    
-    elif item_type == "voice":
-        item_data = pending_voices[item_id].copy()
-        item_data["_type"] = "voice"
-        item_data["_id"] = item_id
-        publication_queue.append(item_data)
-        del pending_voices[item_id]
-        return item_data["user_id"], "mensaje de voz"
-    
-    else:  # Texto
-        item_data = pending_confessions[item_id].copy()
-        item_data["_type"] = "text"
-        item_data["_id"] = item_id
-        publication_queue.append(item_data)
-        del pending_confessions[item_id]
-        return item_data["user_id"], "confesión"
-
-async def reject_item(item_id, item_type):
-    """Rechazar item según su tipo"""
-    if item_type == "poll":
-        user_id = pending_polls[item_id]["user_id"]
-        del pending_polls[item_id]
-    elif item_type == "voice":
-        user_id = pending_voices[item_id]["user_id"]
-        del pending_voices[item_id]
-    else:  # texto
-        user_id = pending_confessions[item_id]["user_id"]
-        del pending_confessions[item_id]
-    return user_id
+        store.release_item(item.id)
+        raise
+    return True
+
+async def publish_approved(bot, item, message_id):
+    """Efecto de un botón Aprobar: publicar el item reservado, avisar y limpiar"""
+    await publish_claimed(item, bot)
+    await schedule_followups(bot, item, item.APPROVED_TEXT, message_id)
+
+async def submit_publication(bot, item, message_id):
+    """Encolar la publicación de un item reservado; si falla vuelve a pendientes.
+
+    Si Telegram no respondió a tiempo la publicación pudo llegar al canal: no se
+    reintenta y el item pasa a /fallidos para que un moderador lo compruebe.
+    """
+    async def on_failure(error):
+        if is_uncertain(error):
+            store.bury_send(item.id, UNCERTAIN_TIMEOUT, status=STATUS_PROCESSING)
+            text = (f"⚠️ No se sabe si se publicó {item.LABEL} {item.id}: Telegram no respondió a tiempo.\n"
+                    f"Comprueba el canal y revísalo con /fallidos.")
+        else:
+            store.release_item(item.id)
+            text = f"❌ Error publicando ({item.LABEL}): {error}\nEl elemento vuelve a estar pendiente."
+        await bot.send_message(chat_id=MODERATION_GROUP_ID, text=text)
+
+    await side_effects.submit(
+        f"publicación de {item.id}", publish_approved, bot, item, message_id,
+        on_failure=on_failure, is_final=is_uncertain
+    )
+
+async def add_to_queue(item, context):
+    """Agregar item a la cola de publicación automática (ver publication.py)"""
+    if not publication_queue.add(item.id, item.TYPE):
+        return False
+    publication_scheduler.nudge()
+    return True
+
+async def reject_item(item):
+    """Rechazar item; False si ya no estaba pendiente"""
+    return store.delete_item(item.id) is not None
 
 async def publish_from_queue(context: ContextTypes.DEFAULT_TYPE):
     """Publicar el siguiente elemento de la cola"""
@@ -738,388 +866,595 @@ async def publish_from_queue(context: ContextTypes.DEFAULT_TYPE):
     if not auto_publishing_active:
         return
         
-    if publication_queue:
-        item_data = publication_queue.popleft()
-        item_type = item_data["_type"]
-        user_id = item_data["user_id"]
-        
-        try:
-            if item_type == "poll":
-                await context.bot.send_poll(
-                    chat_id=PUBLIC_CHANNEL,
-                    question=item_data["question"],
-                    options=item_data["options"],
-                    is_anonymous=item_data["is_anonymous"],
-                    type=item_data["type"],
-                    allows_multiple_answers=item_data["allows_multiple_answers"]
-                )                
-            elif item_type == "voice":
-                await context.bot.send_voice(
-                    chat_id=PUBLIC_CHANNEL,
-                    voice=item_data["file_id"],
-                    caption="🎤 Confesión anónima en mensaje de voz"
-                )                
-            else:  # Texto
-                await context.bot.send_message(
-                    chat_id=PUBLIC_CHANNEL,
-                    text=f"📢 Confesión anónima:\n\n{item_data['text']}"
-                )
-                logging.info(f"📝 Confesión publicada desde cola (ID: {item_data['_id']})")
-        except Exception as e:
-            logging.error(f"Error publicando desde cola: {e}")
-            # Reinsertar el elemento al principio de la cola si falla
-            publication_queue.appendleft(item_data)    
-    # Programar la siguiente publicación
-    asyncio.create_task(schedule_next_publication(context))
-
-async def schedule_next_publication(context: ContextTypes.DEFAULT_TYPE):
-    """Programar la siguiente publicación automática"""
-    while True:
+    async def publish(item):
+        await item.publish(context.bot, PUBLIC_CHANNEL)
+        cadence.record()
+
+    # Un item que falla espera su reintento (o pasa a fallidos) sin bloquear la cola
+    attempt = await outbox.publish_next(publish)
+    if attempt is None:
+        return
+    QUEUE_SENDS.inc(attempt.result)
+    if attempt.result == PUBLISHED:
+        logging.info(f"📝 Publicado desde cola: {attempt.item.LABEL} (ID: {attempt.item.id})")
+    elif attempt.result == DEAD:
+        await side_effects.submit(
+            f"aviso de fallo de {attempt.item.id}", notify_dead_letter, context.bot, attempt.item
+        )
+
+async def notify_dead_letter(bot, item):
+    await bot.send_message(
+        chat_id=MODERATION_GROUP_ID,
+        text=f"⚠️ No se pudo publicar {item.LABEL} {item.id}; ha pasado a fallidos.\n"
+             f"Revísalo con /fallidos y decide: /reintentar {item.id} o /descartar {item.id}"
+    )
+
+class PublicationScheduler:
+    """Único dueño de la cadencia de publicación: un solo job en la JobQueue.
+
+    Cada ejecución publica un item y programa la siguiente con el intervalo que
+    elige ``cadence`` para el backlog y la hora de ese momento; si la cola crece
+    de golpe (``nudge``) la próxima publicación se adelanta.
+    """
+
+    JOB_NAME = "publication"
+
+    def __init__(self, controller):
+        self.cadence = controller
+        self.job_queue = None
+        self.job = None
+        self.interval = None  # Último intervalo elegido
+        self.scheduled_at = None  # Cuándo se eligió
+
+    def start(self, job_queue):
+        if job_queue is None:
+            raise ValueError("❌ JobQueue no disponible: instala python-telegram-bot[job-queue]")
+        if self.job_queue is not None:
+            return  # Nunca más de un temporizador
+        self.job_queue = job_queue
+        if auto_publishing_active:
+            self._schedule()
+
+    def _schedule(self, delay=None):
+        if self.job is not None:
+            self.job.schedule_removal()
+        now = time.time()
+        if delay is None:
+            self.interval = self.cadence.interval(len(publication_queue), now)
+            self.scheduled_at = now
+            delay = self.interval
+        self.job = self.job_queue.run_once(self._run, when=delay, name=self.JOB_NAME)
+
+    async def _run(self, context: ContextTypes.DEFAULT_TYPE):
+        self.job = None
         try:
-            await asyncio.sleep(3600)  # 30 minutos
             await publish_from_queue(context)
-        except Exception as e:
-            logging.error(f"❌ Error en schedule_next_publication: {e}")
-            await asyncio.sleep(60)  # Esperar 1 minuto antes de reintentar
+        finally:
+            if auto_publishing_active:
+                self._schedule()
 
-async def handle_moderation(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
+    def nudge(self):
+        """Adelantar la próxima publicación si con el backlog actual toca antes"""
+        if self.job is None or self.scheduled_at is None:
+            return
+        now = time.time()
+        interval = self.cadence.interval(len(publication_queue), now)
+        due = self.scheduled_at + interval
+        if due < self.job.next_t.timestamp() - 1:
+            self.interval = interval
+            self._schedule(max(0.0, due - now))
+
+    def pause(self):
+        global auto_publishing_active
+        auto_publishing_active = False
+        if self.job is not None:
+            self.job.schedule_removal()
+            self.job = None
+
+    def resume(self):
+        global auto_publishing_active
+        auto_publishing_active = True
+        if self.job_queue is not None and self.job is None:
+            self._schedule()
+
+    def eta(self):
+        """Segundos estimados hasta vaciar la cola al ritmo actual (None si no se sabe)"""
+        if not auto_publishing_active:
+            return None
+        return self.cadence.eta(len(publication_queue))
+
+    @property
+    def next_run(self):
+        """Próxima ejecución programada (datetime) o None"""
+        if self.job is None or not auto_publishing_active:
+            return None
+        return self.job.next_t
+
+publication_scheduler = PublicationScheduler(cadence)
+
+def format_duration(seconds):
+    """"2d 3h", "3h 20m", "15m" a partir de segundos"""
+    minutes = int(seconds) // 60
+    days, minutes = divmod(minutes, 1440)
+    hours, minutes = divmod(minutes, 60)
+    if days:
+        return f"{days}d {hours}h"
+    if hours:
+        return f"{hours}h {minutes}m"
+    return f"{minutes}m"
+
+async def cola_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Estado de la publicación automática"""
+    if str(update.message.chat.id) != str(MODERATION_GROUP_ID):
+        await update.message.reply_text("❌ Este comando solo está disponible en el grupo de moderación")
+        return
 
-    # NUEVO: Manejar respuestas a preguntas
-    if query.data.startswith("respond_question_"):
-        try:
-            question_id = int(query.data.split("_")[2])
-            await handle_question_response(query, question_id, context)
-        except (IndexError, ValueError) as e:
-            logging.error(f"Error procesando respuesta a pregunta: {e}")
-            await query.message.reply_text("❌ Error al procesar la solicitud de respuesta.")
+    next_run = publication_scheduler.next_run
+    if next_run is not None:
+        next_text = next_run.astimezone().strftime("%d/%m %H:%M:%S")
+    else:
+        next_text = "—"
+
+    interval = publication_scheduler.interval
+    eta = publication_scheduler.eta()
+    start, end = cadence.active_hours
+    await update.message.reply_text(
+        f"🗓️ Publicación automática: {'▶️ activa' if auto_publishing_active else '⏸️ pausada'}\n"
+        f"📦 Elementos en cola: {len(publication_queue)}\n"
+        f"⏱️ Intervalo actual: {format_duration(interval) if interval is not None else '—'} "
+        f"(máx. {cadence.max_per_hour:g}/h, horas activas {start}-{end})\n"
+        f"🕒 Próxima publicación: {next_text}\n"
+        f"⏳ Cola vacía en: {format_duration(eta) if eta is not None else '—'}\n"
+        f"⚠️ Fallidos: {store.count_items(status=STATUS_DEAD)} (/fallidos)\n\n"
+        f"📋 /cola_lista [página] · /subir <#n|id> · /cancelar <#n|id> · /programar <#n|id> <HH:MM>"
+    )
+
+QUEUE_PAGE_SIZE = 10
+QUEUE_ICONS = {"text": "📝", "poll": "📊", "voice": "🎤"}
+
+def resolve_queue_item(argument):
+    """Id de un item en cola a partir de su posición en /cola_lista ("#3") o de su id ("3").
+
+    Las dos formas son explícitas: los ids migrados del formato antiguo son
+    números pequeños y se confundirían con posiciones.
+    """
+    by_position = argument.startswith("#")
+    try:
+        number = int(argument[1:] if by_position else argument)
+    except ValueError:
+        return None
+    if not by_position:
+        return number if number in publication_queue else None
+    if number < 1:
+        return None
+    position = publication_queue.page(number - 1, 1)
+    return position[0][0] if position else None
+
+def parse_publish_time(arguments, now=None):
+    """Hora de "HH:MM" (hoy, o mañana si ya pasó) o "dd/mm HH:MM" en hora local"""
+    now = datetime.fromtimestamp(now or time.time())
+    try:
+        if len(arguments) == 2:
+            target = datetime.strptime(" ".join(arguments), "%d/%m %H:%M").replace(year=now.year)
+        else:
+            clock = datetime.strptime(arguments[0], "%H:%M")
+            target = now.replace(hour=clock.hour, minute=clock.minute, second=0, microsecond=0)
+            if target <= now:
+                target += timedelta(days=1)
+    except (ValueError, IndexError):
+        return None
+    return target.timestamp()
+
+def queue_line(label, item):
+    preview = item.fingerprint_text() or item.moderation_text()
+    preview = " ".join(preview.split())
+    if len(preview) > 60:
+        preview = preview[:57] + "..."
+    return f"{label} {QUEUE_ICONS.get(item.TYPE, '•')} {preview}\n    id {item.id}"
+
+async def cola_lista_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Página de la cola de publicación en el orden en que saldrá"""
+    if str(update.message.chat.id) != str(MODERATION_GROUP_ID):
+        await update.message.reply_text("❌ Este comando solo está disponible en el grupo de moderación")
         return
 
-    # NUEVO: Manejar sanciones para preguntas
-    if query.data.startswith("sancionar_question_"):
-        try:
-            question_id = int(query.data.split("_")[2])
-            await handle_question_sancion(query, question_id, context)
-        except (IndexError, ValueError) as e:
-            logging.error(f"Error procesando sanción de pregunta: {e}")
-            await query.answer("❌ Error al procesar la sanción", show_alert=True)
+    try:
+        page = max(1, int(context.args[0])) if context.args else 1
+    except ValueError:
+        page = 1
+    offset = (page - 1) * QUEUE_PAGE_SIZE
+    lines = []
+    for position, (item_id, _) in enumerate(publication_queue.page(offset, QUEUE_PAGE_SIZE), offset + 1):
+        item = store.get_item(item_id, status=STATUS_QUEUED)
+        if item is not None:
+            lines.append(queue_line(f"#{position}", item))
+    if page == 1:
+        for publish_at, item_id, _ in publication_queue.scheduled(QUEUE_PAGE_SIZE):
+            item = store.get_item(item_id, status=STATUS_QUEUED)
+            if item is not None:
+                when = datetime.fromtimestamp(publish_at).strftime("%d/%m %H:%M")
+                lines.append(queue_line(f"🕒 {when}", item))
+    if not lines:
+        await update.message.reply_text("📭 No hay elementos en esta página de la cola.")
         return
+    pages = max(1, -(-len(publication_queue) // QUEUE_PAGE_SIZE))
+    await update.message.reply_text(
+        f"📋 Cola de publicación (página {page}/{pages}, {len(publication_queue)} elementos):\n\n"
+        + "\n".join(lines)
+    )
 
-    # NUEVO: Manejar bans específicos para preguntas
-    if query.data.startswith("ban_question_"):
-        try:
-            parts = query.data.split("_")
-            horas = int(parts[2])
-            question_id = int(parts[3])
-            user_id = int(parts[4])
-            
-            # Aplicar sanción
-            unban_time = await aplicar_sancion(user_id, horas, context)
-            
-            # Notificar al usuario
-            try:
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=f"🚫 Has sido sancionado por {horas} hora(s) por enviar una pregunta inapropiada."
-                )
-            except Exception as e:
-                logging.error(f"Error notificando usuario sobre sanción: {e}")
-            
-            # Eliminar la pregunta de pendientes
-            if question_id in pending_questions:
-                del pending_questions[question_id]
-            
-            # ✅ ELIMINAR MENSAJE DE MODERACIÓN
-            await query.message.delete()
-            
-            # ✅ ENVIAR Y ELIMINAR CONFIRMACIÓN TEMPORAL
-            confirmation_msg = await context.bot.send_message(
-                chat_id=MODERATION_GROUP_ID,
-                text=f"✅ Usuario sancionado por {horas} hora(s)."
-            )
-            
-            async def delete_sancion_confirmation():
-                await asyncio.sleep(3)
-                try:
-                    await context.bot.delete_message(
-                        chat_id=MODERATION_GROUP_ID,
-                        message_id=confirmation_msg.message_id
-                    )
-                except Exception as e:
-                    logging.error(f"Error eliminando confirmación de sanción: {e}")
-            
-            asyncio.create_task(delete_sancion_confirmation())
-            
-        except (IndexError, ValueError) as e:
-            logging.error(f"Error aplicando ban a pregunta: {e}")
-            await query.answer("❌ Error aplicando la sanción", show_alert=True)
+async def subir_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Mover un item al principio de la cola"""
+    if str(update.message.chat.id) != str(MODERATION_GROUP_ID):
+        await update.message.reply_text("❌ Este comando solo está disponible en el grupo de moderación")
         return
 
-    # NUEVO: Manejar cancelación de sanción para preguntas
-    if query.data.startswith("cancel_question_"):
-        try:
-            question_id = int(query.data.split("_")[2])
-            
-            # Restaurar teclado original
-            if question_id in pending_questions:
-                question_data = pending_questions[question_id]
-                message_text = f"❓ Nueva pregunta\n\n{question_data['text']}"
-                
-                keyboard = InlineKeyboardMarkup([[
-                    InlineKeyboardButton("📝 Responder", callback_data=f"respond_question_{question_id}"),
-                    InlineKeyboardButton("⚖️ Sancionar", callback_data=f"sancionar_question_{question_id}")
-                ]])
-                
-                await query.edit_message_text(
-                    text=message_text,
-                    reply_markup=keyboard
-                )
-            else:
-                await query.message.delete()
-                
-        except (IndexError, ValueError) as e:
-            logging.error(f"Error cancelando sanción de pregunta: {e}")
-            await query.message.delete()
+    item_id = resolve_queue_item(context.args[0]) if context.args else None
+    if item_id is None or not publication_queue.move_to_front(item_id):
+        await update.message.reply_text("❌ Uso: /subir <#posición o id> de un elemento de la cola")
         return
+    await update.message.reply_text(f"⬆️ El elemento {item_id} será el próximo en publicarse.")
 
-    # Manejar sanciones
-    if query.data.startswith("sancionar_"):
-        try:
-            parts = query.data.split("_")
-            if len(parts) == 3:  # Es texto: "sancionar_text_12345"
-                item_type = parts[1]  # "text"
-                item_id = int(parts[2])
-            else:  # Es poll o voice: "sancionar_poll_12345" o "sancionar_voice_12345"
-                item_type = parts[1]
-                item_id = int(parts[2])
-            
-            if item_type == "poll":
-                if item_id not in pending_polls:
-                    await query.message.delete()
-                    return
-                user_id = pending_polls[item_id]["user_id"]
-            elif item_type == "voice":
-                if item_id not in pending_voices:
-                    await query.message.delete()
-                    return
-                user_id = pending_voices[item_id]["user_id"]
-            else:  # texto
-                if item_id not in pending_confessions:
-                    await query.message.delete()
-                    return
-                user_id = pending_confessions[item_id]["user_id"]
-            
-            await handle_sancion_menu(query, item_id, item_type, user_id)
-            return
-            
-        except (IndexError, ValueError) as e:
-            logging.error(f"Error procesando sanción: {e}")
-            await query.message.delete()
-            return
+async def cancelar_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Sacar un item de la cola sin publicarlo"""
+    if str(update.message.chat.id) != str(MODERATION_GROUP_ID):
+        await update.message.reply_text("❌ Este comando solo está disponible en el grupo de moderación")
+        return
 
-    # Manejar bans
-    if query.data.startswith("ban_"):
-        try:
-            parts = query.data.split("_")
-            horas = int(parts[1])
-            item_id = int(parts[2])
-            item_type = parts[3]
-            user_id = int(parts[4])
-            
-            unban_time = await aplicar_sancion(user_id, horas, context)
-            
-            # Eliminar el item pendiente
-            if item_type == "poll":
-                if item_id in pending_polls:
-                    del pending_polls[item_id]
-            elif item_type == "voice":
-                if item_id in pending_voices:
-                    del pending_voices[item_id]
-            else:  # texto
-                if item_id in pending_confessions:
-                    del pending_confessions[item_id]
-            
-            # Eliminar mensaje de moderación
-            await query.message.delete()
-            
-        except (IndexError, ValueError) as e:
-            logging.error(f"Error aplicando ban: {e}")
-            await query.message.delete()
+    item_id = resolve_queue_item(context.args[0]) if context.args else None
+    item = publication_queue.cancel(item_id) if item_id is not None else None
+    if item is None:
+        if item_id is not None and store.has_item(item_id, status=STATUS_SENDING):
+            await update.message.reply_text(f"⏳ El elemento {item_id} se está publicando ahora y ya no se puede cancelar.")
+        else:
+            await update.message.reply_text("❌ Uso: /cancelar <#posición o id> de un elemento de la cola")
         return
+    logging.info(f"🗑️ {item.LABEL} {item.id} retirada de la cola")
+    await update.message.reply_text(f"🗑️ {item.LABEL.capitalize()} {item.id} retirada de la cola.")
 
-    # Manejar cancelación
-    if query.data.startswith("cancel_"):
-        try:
-            parts = query.data.split("_")
-            item_id = int(parts[1])
-            item_type_prefix = parts[2] if len(parts) > 2 else "text"
-            
-            # Verificar si el item todavía existe
-            item_exists = False
-            if item_type_prefix == "poll" and item_id in pending_polls:
-                item_exists = True
-            elif item_type_prefix == "voice" and item_id in pending_voices:
-                item_exists = True
-            elif item_type_prefix == "text" and item_id in pending_confessions:
-                item_exists = True
-            
-            if not item_exists:
-                await query.message.delete()
-                return
+async def programar_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Fijar la hora mínima de publicación de un item en cola"""
+    if str(update.message.chat.id) != str(MODERATION_GROUP_ID):
+        await update.message.reply_text("❌ Este comando solo está disponible en el grupo de moderación")
+        return
 
-            if query.message.caption:
-                await query.edit_message_caption(
-                    caption=query.message.caption,
-                    reply_markup=create_moderation_keyboard(item_id, item_type_prefix)
-                )
-            else:
-                await query.edit_message_text(
-                    text=query.message.text,
-                    reply_markup=create_moderation_keyboard(item_id, item_type_prefix)
-                )                    
-        except (IndexError, ValueError) as e:
-            logging.error(f"Error cancelando sanción: {e}")
-            await query.message.delete()
+    args = context.args or []
+    item_id = resolve_queue_item(args[0]) if args else None
+    publish_at = parse_publish_time(args[1:]) if len(args) > 1 else None
+    if item_id is None or publish_at is None or not publication_queue.schedule(item_id, publish_at):
+        await update.message.reply_text("❌ Uso: /programar <#posición o id> <HH:MM | dd/mm HH:MM>")
         return
+    when = datetime.fromtimestamp(publish_at).strftime("%d/%m %H:%M")
+    await update.message.reply_text(f"🕒 El elemento {item_id} se publicará a partir del {when}.")
 
-    # NUEVO: Manejar envío a la cola (Esto es lo que falta)
-    if query.data.startswith("cola_"):
-        try:
-            parts = query.data.split("_")
-            item_type = parts[1]  # "text", "poll" o "voice"
-            item_id = int(parts[2])
-            
-            # Verificar si el item existe antes de procesar
-            exists = False
-            if item_type == "poll" and item_id in pending_polls: exists = True
-            elif item_type == "voice" and item_id in pending_voices: exists = True
-            elif item_type == "text" and item_id in pending_confessions: exists = True
-            
-            if not exists:
-                await query.answer("⚠️ Este elemento ya no está disponible.", show_alert=True)
-                await query.message.delete()
-                return
+async def fallidos_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Items cuya publicación desde la cola falló sin remedio"""
+    if str(update.message.chat.id) != str(MODERATION_GROUP_ID):
+        await update.message.reply_text("❌ Este comando solo está disponible en el grupo de moderación")
+        return
 
-            # Ejecutar la función add_to_queue
-            user_id, item_type_str = await add_to_queue(item_id, item_type, context)
-            
-            # Notificar al usuario
-            try:
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=f"🕒 Tu {item_type_str} ha sido aprobada y añadida a la cola de publicación automática."
-                )
-            except Exception as e:
-                logging.error(f"Error notificando usuario sobre cola: {e}")
+    try:
+        page = max(1, int(context.args[0])) if context.args else 1
+    except ValueError:
+        page = 1
+    offset = (page - 1) * QUEUE_PAGE_SIZE
+    lines = []
+    for position, (item, attempts, error, failed_at) in enumerate(
+        outbox.dead_items(offset, QUEUE_PAGE_SIZE), offset + 1
+    ):
+        when = datetime.fromtimestamp(failed_at).strftime("%d/%m %H:%M")
+        lines.append(f"{queue_line(f'{position}.', item)}\n    {when}, {attempts} intento(s): {error}")
+    if not lines:
+        await update.message.reply_text("✅ No hay publicaciones fallidas en esta página.")
+        return
+    total = store.count_items(status=STATUS_DEAD)
+    pages = max(1, -(-total // QUEUE_PAGE_SIZE))
+    await update.message.reply_text(
+        f"⚠️ Publicaciones fallidas (página {page}/{pages}, {total} elementos):\n\n"
+        + "\n".join(lines)
+        + "\n\n🔁 /reintentar <id> · 🗑️ /descartar <id>"
+    )
 
-            # Feedback visual al moderador y eliminar mensaje
-            await query.answer("✅ Añadido a la cola correctamente")
-            await query.message.delete()
-            
-        except (IndexError, ValueError) as e:
-            logging.error(f"Error procesando cola: {e}")
-            await query.answer("❌ Error al procesar la solicitud")
+def parse_item_id(args):
+    try:
+        return int(args[0]) if args else None
+    except ValueError:
+        return None
+
+async def reintentar_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Devolver a la cola un item fallido"""
+    if str(update.message.chat.id) != str(MODERATION_GROUP_ID):
+        await update.message.reply_text("❌ Este comando solo está disponible en el grupo de moderación")
         return
 
-    # Procesamiento normal (aprobaciones/rechazos)
-    if query.data.startswith("approve_") or query.data.startswith("reject_"):
-        try:
-            parts = query.data.split("_")
-            action = parts[0]
-            item_type = parts[1]  # "text", "poll" o "voice"
-            item_id = int(parts[2])
-            
-            if item_type == "poll":
-                if item_id not in pending_polls:
-                    await query.message.delete()
-                    return
-                
-                if action == "approve":
-                    user_id, item_type_str = await approve_item(item_id, "poll", context)
-                    try:
-                        await context.bot.send_message(
-                            chat_id=user_id,
-                            text="🎉 Tu encuesta ha sido aprobada y publicada."
-                        )
-                    except Exception as e:
-                        logging.error(f"Error notifying user about poll: {e}")
-                    # ✅ ELIMINAR MENSAJE DE MODERACIÓN AL APROBAR
-                    await query.message.delete()
-                else:
-                    user_id = await reject_item(item_id, "poll")
-                    try:
-                        await context.bot.send_message(
-                            chat_id=user_id,
-                            text="❌ Tu encuesta no cumple con nuestras normas."
-                        )
-                    except Exception as e:
-                        logging.error(f"Error notifying user about poll rejection: {e}")
-                    # ✅ ELIMINAR MENSAJE DE MODERACIÓN AL RECHAZAR
-                    await query.message.delete()
-            
-            elif item_type == "voice":
-                if item_id not in pending_voices:
-                    await query.message.delete()
-                    return
-                
-                if action == "approve":
-                    user_id, item_type_str = await approve_item(item_id, "voice", context)
-                    try:
-                        await context.bot.send_message(
-                            chat_id=user_id,
-                            text="🎉 Tu mensaje de voz ha sido aprobado y publicado."
-                        )
-                    except Exception as e:
-                        logging.error(f"Error notifying user about voice: {e}")
-                    # ✅ ELIMINAR MENSAJE DE MODERACIÓN AL APROBAR
-                    await query.message.delete()
-                else:
-                    user_id = await reject_item(item_id, "voice")
-                    try:
-                        await context.bot.send_message(
-                            chat_id=user_id,
-                            text="❌ Tu mensaje de voz no cumple con nuestras normas."
-                        )
-                    except Exception as e:
-                        logging.error(f"Error notifying user about voice rejection: {e}")
-                    # ✅ ELIMINAR MENSAJE DE MODERACIÓN AL RECHAZAR
-                    await query.message.delete()
-            
-            else:  # Texto
-                if item_id not in pending_confessions:
-                    await query.message.delete()
-                    return
-                
-                if action == "approve":
-                    user_id, item_type_str = await approve_item(item_id, "text", context)
-                    try:
-                        await context.bot.send_message(
-                            chat_id=user_id,
-                            text="🎉 Tu confesión ha sido aprobada y publicada."
-                        )
-                    except Exception as e:
-                        logging.error(f"Error notifying user about confession: {e}")
-                    # ✅ ELIMINAR MENSAJE DE MODERACIÓN AL APROBAR
-                    await query.message.delete()
-                else:
-                    user_id = await reject_item(item_id, "text")
-                    try:
-                        await context.bot.send_message(
-                            chat_id=user_id,
-                            text="❌ Tu confesión no cumple con nuestras normas."
-                        )
-                    except Exception as e:
-                        logging.error(f"Error notifying user about confession rejection: {e}")
-                    # ✅ ELIMINAR MENSAJE DE MODERACIÓN AL RECHAZAR
-                    await query.message.delete()
-            
-        except (IndexError, ValueError) as e:
-            logging.error(f"Error procesando moderación: {e}")
-            await query.message.delete()
+    item_id = parse_item_id(context.args)
+    if item_id is None or not outbox.requeue(item_id):
+        await update.message.reply_text("❌ Uso: /reintentar <id> de un elemento de /fallidos")
+        return
+    publication_scheduler.nudge()
+    await update.message.reply_text(f"🔁 El elemento {item_id} vuelve al final de la cola.")
+
+async def descartar_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Borrar un item fallido sin publicarlo"""
+    if str(update.message.chat.id) != str(MODERATION_GROUP_ID):
+        await update.message.reply_text("❌ Este comando solo está disponible en el grupo de moderación")
+        return
+
+    item_id = parse_item_id(context.args)
+    item = outbox.discard(item_id) if item_id is not None else None
+    if item is None:
+        await update.message.reply_text("❌ Uso: /descartar <id> de un elemento de /fallidos")
+        return
+    logging.info(f"🗑️ {item.LABEL} {item.id} descartada de fallidos")
+    await update.message.reply_text(f"🗑️ {item.LABEL.capitalize()} {item.id} descartada.")
+
+async def menciones_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Personas más mencionadas en los envíos recientes"""
+    if str(update.message.chat.id) != str(MODERATION_GROUP_ID):
+        await update.message.reply_text("❌ Este comando solo está disponible en el grupo de moderación")
+        return
+
+    days = f"{MENTION_WINDOW / 86400:g}"
+    hot = mention_index.hot()
+    if not hot:
+        await update.message.reply_text(f"👤 Nadie ha sido mencionado en más de un envío en {days} días.")
+        return
+    lines = [f"{position}. {name}: {count} envíos" for position, (name, count) in enumerate(hot, 1)]
+    await update.message.reply_text(f"👤 Más mencionados ({days} días):\n\n" + "\n".join(lines))
+
+async def pausar_cola_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Pausar la publicación automática"""
+    if str(update.message.chat.id) != str(MODERATION_GROUP_ID):
+        await update.message.reply_text("❌ Este comando solo está disponible en el grupo de moderación")
+        return
+
+    publication_scheduler.pause()
+    await update.message.reply_text("⏸️ Publicación automática pausada.")
+
+async def reanudar_cola_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Reanudar la publicación automática"""
+    if str(update.message.chat.id) != str(MODERATION_GROUP_ID):
+        await update.message.reply_text("❌ Este comando solo está disponible en el grupo de moderación")
+        return
+
+    publication_scheduler.resume()
+    await update.message.reply_text("▶️ Publicación automática reanudada.")
+
+async def bulk_approve(item, context):
+    if not await approve_item(item, context):
+        return False
+    await schedule_followups(context.bot, item, item.APPROVED_TEXT)
+
+async def bulk_queue(item, context):
+    if not await add_to_queue(item, context):
+        return False
+    await schedule_followups(context.bot, item, item.QUEUED_TEXT)
+
+async def bulk_reject(item, context):
+    if not await reject_item(item):
+        return False
+    await schedule_followups(context.bot, item, item.REJECTED_TEXT)
+
+# comando -> (acción, descripción, tipos admitidos, ¿tipo obligatorio?)
+BULK_COMMANDS = {
+    "aprobar_todo": (bulk_approve, "Publicando", ("text", "poll", "voice"), False),
+    "cola_todo": (bulk_queue, "Encolando", ("text", "poll", "voice"), False),
+    "rechazar_tipo": (bulk_reject, "Rechazando", ITEM_TYPES, True),
+}
+
+async def bulk_moderation_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/aprobar_todo, /cola_todo y /rechazar_tipo con filtros de tipo y antigüedad"""
+    if str(update.message.chat.id) != str(MODERATION_GROUP_ID):
+        await update.message.reply_text("❌ Este comando solo está disponible en el grupo de moderación")
+        return
+
+    # CommandHandler no distingue mayúsculas: /Aprobar_todo también llega aquí
+    command = update.message.text.split()[0].lstrip("/").split("@")[0].lower()
+    action, verb, allowed_types, type_required = BULK_COMMANDS[command]
+    usage = (
+        f"Uso: /{command} {'<tipo>' if type_required else '[tipo]'} [antigüedad]\n"
+        f"Tipos: {', '.join(allowed_types)}. Antigüedad mínima: 30m, 2h, 1d..."
+    )
+    try:
+        item_type, min_age = parse_filters(context.args, ITEM_TYPES)
+    except ValueError:
+        await update.message.reply_text(usage)
+        return
+    if (type_required and item_type is None) or (item_type is not None and item_type not in allowed_types):
+        await update.message.reply_text(usage)
+        return
+
+    created_before = time.time() - min_age if min_age else None
+    if item_type is None:
+        items = [
+            item for item in store.pending_items(created_before=created_before)
+            if item.TYPE in allowed_types
+        ]
+    else:
+        items = store.pending_items(item_type, created_before)
+    if not items:
+        await update.message.reply_text("📭 No hay elementos pendientes con esos filtros.")
+        return
+
+    def progress_text(job, finished=False):
+        header = "✅ Terminado" if finished else f"⏳ {verb}..."
+        return (
+            f"{header}: {job.processed}/{job.total}\n"
+            f"Hechos: {job.done} · Ya procesados: {job.skipped} · Errores: {job.failed}"
+        )
+
+    job = BulkJob(items, lambda item: action(item, context))
+    status_message = await update.message.reply_text(progress_text(job))
+
+    async def on_progress(job):
+        await status_message.edit_text(progress_text(job, finished=job.processed == job.total))
+
+    async def run_job():
+        await job.run(on_progress)
+        logging.info(f"📦 /{command}: {job.done} hechos, {job.skipped} omitidos, {job.failed} errores")
+
+    # En segundo plano: el resto de updates se siguen atendiendo mientras tanto
+    context.application.create_task(run_job(), update=update)
+
+# Router de los botones de moderación: un handler por (acción, tipo)
+moderation_router = CallbackRouter()
+
+async def handle_moderation(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    # Botones que no se entienden o sin handler para su (acción, tipo), como
+    # approve_question_1: se descartan en vez de quedarse en el grupo sin efecto.
+    # Se comprueba antes de despachar para no tragarse los ValueError de los handlers
+    try:
+        data = decode_callback(query.data)
+        if moderation_router.resolve(data) is None:
+            raise ValueError(f"Sin handler para la acción {data.action!r} ({data.item_type})")
+    except ValueError as e:
+        logging.error(f"Error procesando moderación: {e}")
+        await query.message.delete()
+        return
+
+    await moderation_router.dispatch(query, data, context)
+
+# Tipos que se publican en el canal: las preguntas no tienen Aprobar, Rechazar ni Cola
+PUBLISHED_TYPES = (TextItem.TYPE, PollItem.TYPE, VoiceItem.TYPE)
+
+@moderation_router.route("respond", "question")
+async def on_respond_question(query, data, context):
+    await handle_question_response(query, data.item_id, context)
+
+@moderation_router.route("sancionar", "question")
+async def on_sancionar_question(query, data, context):
+    await handle_question_sancion(query, data.item_id, context)
+
+@moderation_router.route("ban", "question")
+async def on_ban_question(query, data, context):
+    question_id = data.item_id
+    user_id = data.user_id
+
+    # Aplicar sanción (puede escalar por reincidencia)
+    unban_time, horas = await aplicar_sancion(user_id, data.hours, context)
+    
+    # Notificar al usuario
+    await side_effects.submit(
+        f"aviso de sanción a {user_id}", notify_user, context.bot, user_id,
+        f"🚫 Has sido sancionado por {horas} hora(s) por enviar una pregunta inapropiada."
+    )
+    
+    # Eliminar la pregunta de pendientes
+    store.delete_item(question_id)
+    
+    # ✅ ELIMINAR MENSAJE DE MODERACIÓN
+    schedule_message_delete(query.message.message_id)
+    
+    # ✅ ENVIAR Y ELIMINAR CONFIRMACIÓN TEMPORAL
+    await side_effects.submit(
+        "confirmación de sanción", send_ban_confirmation, context.bot, horas
+    )
+
+async def send_ban_confirmation(bot, horas):
+    confirmation_msg = await bot.send_message(
+        chat_id=MODERATION_GROUP_ID,
+        text=f"✅ Usuario sancionado por {horas} hora(s)."
+    )
+    
+    schedule_message_delete(confirmation_msg.message_id, delay=3)
+
+@moderation_router.route("cancel", "question")
+async def on_cancel_question(query, data, context):
+    question_id = data.item_id
+
+    # Restaurar teclado original
+    question_data = store.get_item(question_id, "question")
+    if question_data is not None:
+        await query.edit_message_text(
+            text=question_data.moderation_text(),
+            reply_markup=create_question_keyboard(question_id)
+        )
+    else:
+        await query.message.delete()
+
+@moderation_router.route("sancionar")
+async def on_sancionar(query, data, context):
+    item_data = store.get_item(data.item_id, data.item_type)
+    if item_data is None:
+        await query.message.delete()
+        return
+
+    await handle_sancion_menu(query, data.item_id, data.item_type, item_data.user_id)
+
+@moderation_router.route("ban")
+async def on_ban(query, data, context):
+    unban_time, horas = await aplicar_sancion(data.user_id, data.hours, context)
+    
+    # Eliminar el item pendiente
+    if store.has_item(data.item_id, data.item_type):
+        store.delete_item(data.item_id)
+    
+    # Eliminar mensaje de moderación
+    schedule_message_delete(query.message.message_id)
+
+@moderation_router.route("cancel")
+async def on_cancel(query, data, context):
+    item_id = data.item_id
+    item_type_prefix = data.item_type
+
+    # Verificar si el item todavía existe
+    if not store.has_item(item_id, item_type_prefix):
+        await query.message.delete()
+        return
+
+    if query.message.caption:
+        await query.edit_message_caption(
+            caption=query.message.caption,
+            reply_markup=create_moderation_keyboard(item_id, item_type_prefix)
+        )
+    else:
+        await query.edit_message_text(
+            text=query.message.text,
+            reply_markup=create_moderation_keyboard(item_id, item_type_prefix)
+        )
+
+@moderation_router.route("cola", *PUBLISHED_TYPES)
+async def on_cola(query, data, context):
+    item_id = data.item_id
+    item_type = data.item_type  # "text", "poll" o "voice"
+
+    # Solo la transición de estado es inmediata; aviso y limpieza van a la cola de efectos
+    item = store.get_item(item_id, item_type)
+    if item is None or not await add_to_queue(item, context):
+        schedule_message_delete(query.message.message_id)
+        return
+
+    await schedule_followups(context.bot, item, item.QUEUED_TEXT, query.message.message_id)
+
+@moderation_router.route("approve", *PUBLISHED_TYPES)
+@moderation_router.route("reject", *PUBLISHED_TYPES)
+async def on_approve_reject(query, data, context):
+    """Procesamiento normal (aprobaciones/rechazos)"""
+    action = data.action
+    item_type = data.item_type  # "text", "poll" o "voice"
+    item_id = data.item_id
+    message_id = query.message.message_id
+
+    # Solo la transición de estado es inmediata; publicación, aviso y
+    # limpieza van a la cola de efectos
+    item = store.get_item(item_id, item_type)
+    if item is None:
+        schedule_message_delete(message_id)
+        return
+
+    if action == "approve":
+        if store.claim_item(item_id):
+            await submit_publication(context.bot, item, message_id)
+    elif await reject_item(item):
+        await schedule_followups(context.bot, item, item.REJECTED_TEXT, message_id)
 
 async def run_bot():
     """Iniciar y ejecutar el bot con manejo de errores"""
+    global bot_application
+
     try:
         # Validar variables de entorno
         if not TOKEN:
@@ -1135,13 +1470,44 @@ async def run_bot():
         
         # Cargar backup al iniciar
         await backup_manager.load_backup()
+        id_generator.seed(store.max_item_id())
+        ban_registry.load()
+        uncertain = outbox.recover()
+        if uncertain:
+            logging.warning(f"⚠️ {uncertain} envío(s) de la cola sin confirmar tras la caída: pasan a /fallidos")
+        publication_queue.load()
+        duplicate_index.load()
+        mention_index.load()
+        rule_engine.load()
+        # Un item reservado pudo llegar al canal antes de la caída y su mensaje de
+        # moderación sigue en el grupo: devolverlo a pendientes permitiría
+        # aprobarlo otra vez y publicarlo dos veces
+        unconfirmed = store.bury_sends(UNCERTAIN_CRASH, status=STATUS_PROCESSING)
+        if unconfirmed:
+            logging.warning(f"⚠️ {unconfirmed} publicación(es) aprobada(s) sin confirmar tras la caída: pasan a /fallidos")
         
-        app = ApplicationBuilder().token(TOKEN).build()
+        builder = ApplicationBuilder().token(TOKEN).rate_limiter(outbound_limiter)
+        if TELEGRAM_API_URL:
+            builder = builder.base_url(TELEGRAM_API_URL)
+            logging.info(f"🧪 Bot API: {TELEGRAM_API_URL}")
+        app = builder.build()
         
         app.add_handler(CommandHandler("start", start))
         app.add_handler(CommandHandler("confesion", confesion))
         app.add_handler(CommandHandler("preguntas", preguntas))  # Nuevo comando
         app.add_handler(CommandHandler("backup", backup_cmd))
+        app.add_handler(CommandHandler("cola", cola_cmd))
+        app.add_handler(CommandHandler("cola_lista", cola_lista_cmd))
+        app.add_handler(CommandHandler("subir", subir_cmd))
+        app.add_handler(CommandHandler("cancelar", cancelar_cmd))
+        app.add_handler(CommandHandler("programar", programar_cmd))
+        app.add_handler(CommandHandler("fallidos", fallidos_cmd))
+        app.add_handler(CommandHandler("reintentar", reintentar_cmd))
+        app.add_handler(CommandHandler("descartar", descartar_cmd))
+        app.add_handler(CommandHandler("menciones", menciones_cmd))
+        app.add_handler(CommandHandler("pausar_cola", pausar_cola_cmd))
+        app.add_handler(CommandHandler("reanudar_cola", reanudar_cola_cmd))
+        app.add_handler(CommandHandler(list(BULK_COMMANDS), bulk_moderation_cmd))
         
         # NUEVO: Handler para respuestas de moderadores (solo en grupo de moderación)
         app.add_handler(MessageHandler(
@@ -1155,16 +1521,40 @@ async def run_bot():
         app.add_handler(MessageHandler(~filters.TEXT & ~filters.POLL & ~filters.VOICE & ~filters.COMMAND, handle_non_text))
         
         app.add_handler(CallbackQueryHandler(handle_moderation))
+
+        # Latencia y errores por handler (métrica bot_handler_duration_seconds)
+        for group_handlers in app.handlers.values():
+            for handler in group_handlers:
+                handler.callback = timed_handler(handler.callback, observer=update_timer.record)
+        # Hooks previo y posterior: duración total de cada update y aviso si es lenta
+        update_timer.install(app)
+
+        side_effects.start()
+
+        # La JobQueue arranca con la aplicación
+        publication_scheduler.start(app.job_queue)
         
         await app.initialize()
         await app.start()
-        await app.updater.start_polling()
+        message_cleaner.start(app.bot)
+        bot_application = app
+
+        if WEBHOOK_URL:
+            await app.bot.set_webhook(
+                url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES
+            )
+            logging.info(f"🔗 Modo webhook: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+        else:
+            # start_polling elimina cualquier webhook registrado previamente
+            await app.updater.start_polling()
+            logging.info("🔄 Modo polling")
         
         logging.info("✅ Bot iniciado correctamente")
         
         # Iniciar tareas en segundo plano
         asyncio.create_task(backup_manager.start_auto_backup())
-        asyncio.create_task(schedule_next_publication(app))
         
         # Mantener el bot ejecutándose
         await asyncio.Event().wait()
@@ -1173,10 +1563,32 @@ async def run_bot():
         logging.error(f"❌ Error crítico en run_bot: {e}")
         raise
 
-def run_fastapi():
-    """Servidor FastAPI con health checks para Render.com"""
+def create_fastapi_app():
+    """Servidor FastAPI con health checks para Render.com y el webhook de Telegram"""
     app = FastAPI(title="Telegram Confession Bot")
 
+    @app.middleware("http")
+    async def track_inbound_traffic(request: Request, call_next):
+        # Los pings propios no cuentan como tráfico real
+        if request.headers.get("user-agent") != KeepAlive.USER_AGENT:
+            keep_alive.mark_activity()
+        return await call_next(request)
+
+    @app.post(WEBHOOK_PATH)
+    async def telegram_webhook(
+        request: Request,
+        x_telegram_bot_api_secret_token: str = Header(default="")
+    ):
+        if not secrets.compare_digest(x_telegram_bot_api_secret_token, WEBHOOK_SECRET):
+            raise HTTPException(status_code=403, detail="Invalid secret token")
+        if bot_application is None:
+            # Telegram reintentará la entrega más tarde
+            raise HTTPException(status_code=503, detail="Bot not ready")
+
+        update = Update.de_json(await request.json(), bot_application.bot)
+        await bot_application.update_queue.put(update)
+        return {"ok": True}
+
     @app.get("/")
     def read_root():
         return {
@@ -1185,47 +1597,156 @@ def run_fastapi():
             "version": "1.0.0"
         }
     
+    # Los endpoints que leen el estado son async: se ejecutan en el event loop
+    # del bot, como los handlers. Si fueran def, FastAPI los ejecutaría en su
+    # pool de hilos mientras el loop modifica las métricas y las sanciones
     @app.get("/health")
-    def health_check():
+    async def health_check():
         return {
             "status": "healthy",
-            "pending_confessions": len(pending_confessions),
-            "pending_polls": len(pending_polls),
-            "pending_voices": len(pending_voices),
-            "pending_questions": len(pending_questions),
-            "publication_queue": len(publication_queue),
-            "banned_users": len(banned_users)
+            "pending_confessions": store.count_items("text"),
+            "pending_polls": store.count_items("poll"),
+            "pending_voices": store.count_items("voice"),
+            "pending_questions": store.count_items("question"),
+            "publication_queue": store.queue_length(),
+            "banned_users": len(ban_registry),
+            "outbound_queue": outbound_limiter.queue_depth,
+            "side_effects": side_effects.status(),
+            "outbox": outbox.status(),
+            "scheduled_deletions": message_cleaner.pending,
+            "keepalive": keep_alive.status()
         }
     
+    @app.get("/metrics")
+    async def get_metrics():
+        return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+    def check_profiling_token(token):
+        if not PROFILING_TOKEN:
+            raise HTTPException(status_code=404, detail="Not Found")
+        if not secrets.compare_digest(token, PROFILING_TOKEN):
+            raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+    @app.get("/debug/profile", response_class=PlainTextResponse)
+    async def debug_profile(
+        seconds: float = 10,
+        sort: str = "cumulative",
+        limit: int = 40,
+        x_profiling_token: str = Header(default="")
+    ):
+        check_profiling_token(x_profiling_token)
+        if sort not in ("cumulative", "tottime", "calls", "ncalls"):
+            raise HTTPException(status_code=400, detail="sort: cumulative, tottime, calls o ncalls")
+        try:
+            return await capture_profile(seconds, sort, limit)
+        except CaptureBusy as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+    @app.get("/debug/allocations", response_class=PlainTextResponse)
+    async def debug_allocations(
+        seconds: float = 10,
+        limit: int = 25,
+        x_profiling_token: str = Header(default="")
+    ):
+        check_profiling_token(x_profiling_token)
+        try:
+            return await capture_allocations(seconds, limit)
+        except CaptureBusy as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
     @app.get("/stats")
-    def get_stats():
+    async def get_stats():
+        next_run = publication_scheduler.next_run
         return {
-            "confessions": len(pending_confessions),
-            "polls": len(pending_polls),
-            "voices": len(pending_voices),
-            "questions": len(pending_questions),
-            "queue": len(publication_queue),
-            "bans": len(banned_users)
+            "confessions": store.count_items("text"),
+            "polls": store.count_items("poll"),
+            "voices": store.count_items("voice"),
+            "questions": store.count_items("question"),
+            "queue": store.queue_length(),
+            "failed_publications": store.count_items(status=STATUS_DEAD),
+            "bans": len(ban_registry),
+            "publication": {
+                "active": auto_publishing_active,
+                "interval_seconds": publication_scheduler.interval,
+                "next_run": next_run.isoformat() if next_run is not None else None,
+                "queue_eta_seconds": publication_scheduler.eta(),
+                "posts_last_hour": cadence.posts_last_hour(),
+            }
         }
     
-    uvicorn.run(app, host="0.0.0.0", port=10000, log_level="info")
+    return app
+
+async def run_fastapi():
+    """Servir FastAPI en el mismo event loop que el bot"""
+    config = uvicorn.Config(create_fastapi_app(), host="0.0.0.0", port=10000, log_level="info")
+    await uvicorn.Server(config).serve()
+
+class KeepAlive:
+    """Ping periódico no bloqueante a la URL pública del servicio.
+
+    Usa un cliente HTTP asíncrono con conexión reutilizada y no hace ping si
+    hubo tráfico entrante real (p. ej. el webhook) dentro del intervalo.
+    """
+
+    USER_AGENT = "confession-bot-keepalive"
+
+    def __init__(self, url, interval=KEEPALIVE_INTERVAL, timeout=5):
+        self.url = url
+        self.interval = interval
+        self.timeout = timeout
+        self.last_activity = 0.0  # time.monotonic() de la última petición entrante
+        self.last_ping_at = None
+        self.last_latency = None
+        self.last_error = None
+        self.pings = 0
+        self.skipped = 0
+
+    def mark_activity(self):
+        self.last_activity = time.monotonic()
+
+    async def run(self):
+        async with httpx.AsyncClient(
+            timeout=self.timeout,
+            headers={"User-Agent": self.USER_AGENT},
+            limits=httpx.Limits(max_connections=1, max_keepalive_connections=1)
+        ) as client:
+            while True:
+                await asyncio.sleep(self.interval)
+                if time.monotonic() - self.last_activity < self.interval:
+                    # El tráfico real ya mantiene la instancia despierta
+                    self.skipped += 1
+                    continue
+
+                started = time.perf_counter()
+                try:
+                    response = await client.get(self.url)
+                    response.raise_for_status()
+                    self.last_latency = time.perf_counter() - started
+                    self.last_error = None
+                    logging.info(f"✅ Ping exitoso ({self.last_latency * 1000:.0f} ms) - servidor activo")
+                except Exception as e:
+                    self.last_error = str(e)
+                    logging.warning(f"⚠️ Ping falló: {e}")
+                self.pings += 1
+                self.last_ping_at = time.time()
 
-async def self_ping():
-    """Ping cada 30s para evitar timeout de 50s en Render.com"""
-    url = os.getenv("RENDER_EXTERNAL_URL") or "https://oneandysr-github-io.onrender.com"
-    while True:
-        try:
-            urllib.request.urlopen(url, timeout=5)
-            logging.info("✅ Ping exitoso - servidor activo")
-        except Exception as e:
-            logging.warning(f"⚠️ Ping falló: {e}")
-        await asyncio.sleep(30)  # Ping cada 30s (timeout de Render: 50s)
+    def status(self):
+        return {
+            "interval": self.interval,
+            "last_ping_at": self.last_ping_at,
+            "last_latency_ms": round(self.last_latency * 1000, 1) if self.last_latency is not None else None,
+            "last_error": self.last_error,
+            "pings": self.pings,
+            "skipped": self.skipped
+        }
+
+keep_alive = KeepAlive(KEEPALIVE_URL)
 
 async def main():
     await asyncio.gather(
         run_bot(),
-        asyncio.to_thread(run_fastapi),
-        self_ping()
+        run_fastapi(),
+        keep_alive.run()
     )
 
 if __name__ == "__main__":
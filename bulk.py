@@ -0,0 +1,104 @@
+"""Acciones de moderación en bloque (aprobar, encolar o rechazar muchos items).
+
+``BulkJob`` aplica la misma acción a una lista de items con un número fijo de
+workers concurrentes; el ritmo real lo marca el limitador de la Bot API
+(outbound.py), así que la concurrencia solo sirve para solapar las esperas de
+red. El progreso se notifica como mucho cada ``progress_interval`` segundos y
+una vez al terminar, para poder editar un único mensaje de estado.
+"""
+import asyncio
+import logging
+import time
+
+DEFAULT_CONCURRENCY = 8
+PROGRESS_INTERVAL = 5  # Segundos mínimos entre ediciones del mensaje de estado
+
+_AGE_UNITS = {"m": 60, "h": 3600, "d": 86400}
+
+
+def parse_age(text):
+    """Convertir ``"30m"``, ``"2h"`` o ``"1d"`` en segundos (ValueError si no)"""
+    text = text.strip().lower()
+    unit = _AGE_UNITS.get(text[-1:])
+    if unit is None:
+        raise ValueError(f"Antigüedad no válida: {text!r}")
+    return float(text[:-1]) * unit
+
+
+def parse_filters(args, item_types):
+    """Interpretar los argumentos de un comando en bloque.
+
+    Cada argumento es un tipo de item o una antigüedad mínima (``2h``).
+    Devuelve (tipo o None, antigüedad en segundos o None).
+    """
+    item_type = None
+    min_age = None
+    for arg in args or ():
+        if arg in item_types:
+            item_type = arg
+        else:
+            min_age = parse_age(arg)
+    return item_type, min_age
+
+
+class BulkJob:
+    """Ejecutar ``action(item)`` sobre muchos items en paralelo.
+
+    ``action`` devuelve False si el item ya no estaba disponible (otro
+    moderador lo procesó antes); una excepción cuenta como fallo.
+    """
+
+    def __init__(self, items, action, concurrency=DEFAULT_CONCURRENCY, progress_interval=PROGRESS_INTERVAL):
+        self.items = items
+        self.action = action
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+        self._last_report = 0.0
+        self._reporting = False
+
+    @property
+    def total(self):
+        return len(self.items)
+
+    @property
+    def processed(self):
+        return self.done + self.skipped + self.failed
+
+    async def _report(self, on_progress, final=False):
+        if on_progress is None:
+            return
+        now = time.monotonic()
+        if not final and (self._reporting or now - self._last_report < self.progress_interval):
+            return
+        self._reporting = True
+        self._last_report = now
+        try:
+            await on_progress(self)
+        except Exception as e:
+            logging.warning(f"⚠️ Error actualizando el progreso: {e}")
+        finally:
+            self._reporting = False
+
+    async def _worker(self, pending, on_progress):
+        for item in pending:
+            try:
+                if await self.action(item) is False:
+                    self.skipped += 1
+                else:
+                    self.done += 1
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"❌ Error procesando el item {item.id} en bloque: {e}")
+            await self._report(on_progress)
+
+    async def run(self, on_progress=None):
+        self._last_report = time.monotonic()
+        # Todos los workers consumen del mismo iterador: cada item se procesa una vez
+        pending = iter(self.items)
+        workers = min(self.concurrency, self.total)
+        await asyncio.gather(*(self._worker(pending, on_progress) for _ in range(workers)))
+        await self._report(on_progress, final=True)
+        return self
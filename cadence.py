@@ -0,0 +1,156 @@
+"""Cadencia adaptativa de la publicación automática.
+
+En lugar de un intervalo fijo, cada publicación programa la siguiente según:
+
+* el backlog: en horas activas el intervalo es ``drain_target / backlog``, de
+  modo que una cola larga se vacía en unas ``drain_target`` horas de actividad,
+  acotado entre ``min_interval`` y ``base_interval`` (con poca cola se publica
+  al ritmo de siempre);
+* las horas activas (hora local; ``TZ`` del proceso): fuera de ellas se
+  publica cada ``quiet_interval`` como mucho, o nada si es 0, y la primera
+  publicación del día cae al empezar las horas activas;
+* un presupuesto de ``max_per_hour`` publicaciones por hora en el canal, que
+  cuenta también las aprobaciones directas (``record``).
+
+``eta`` simula esa misma cadencia para estimar cuánto tardará en vaciarse la
+cola; los tramos con el mismo intervalo (cola larga al mínimo, cola corta al
+intervalo base, horas tranquilas) se recorren de un salto, así que el coste
+depende de los días que tarde la cola en vaciarse y no de su longitud (como
+mucho ``MAX_STEPS`` tramos; más allá no hay estimación).
+"""
+import math
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+BASE_INTERVAL = 3600
+MAX_PER_HOUR = 6
+ACTIVE_HOURS = "8-24"
+QUIET_INTERVAL = 3 * 3600
+DRAIN_TARGET = 12 * 3600
+MAX_STEPS = 1_000  # Tramos simulados como mucho en ``eta`` (unos meses de cola)
+
+
+def parse_hours(value):
+    """"8-24" -> (8, 24); admite franjas que cruzan la medianoche ("20-2")"""
+    start, _, end = (value or ACTIVE_HOURS).partition("-")
+    start, end = int(start), int(end or 24)
+    if not (0 <= start < 24 and 0 <= end <= 24):
+        raise ValueError(f"Horas activas no válidas: {value!r}")
+    return start, end
+
+
+class CadenceController:
+    """Intervalo hasta la próxima publicación de la cola"""
+
+    def __init__(self, base_interval=BASE_INTERVAL, max_per_hour=MAX_PER_HOUR, active_hours=ACTIVE_HOURS,
+                 quiet_interval=QUIET_INTERVAL, drain_target=DRAIN_TARGET):
+        self.base_interval = base_interval
+        self.max_per_hour = int(max_per_hour)  # Índice en ``_recent``: tiene que ser entero
+        if self.max_per_hour < 1:
+            raise ValueError(f"Publicaciones por hora no válidas: {max_per_hour!r}")
+        self.min_interval = 3600 / self.max_per_hour
+        self.active_hours = parse_hours(active_hours)
+        self.quiet_interval = quiet_interval
+        self.drain_target = drain_target
+        self._recent = deque()  # Horas de las publicaciones de la última hora
+
+    def record(self, now=None):
+        """Anotar una publicación en el canal (cuenta para el presupuesto por hora)"""
+        now = now or time.time()
+        self._recent.append(now)
+        self._trim(now)
+
+    def posts_last_hour(self, now=None):
+        return len(self._trim(now or time.time()))
+
+    def is_active(self, now):
+        start, end = self.active_hours
+        moment = datetime.fromtimestamp(now)
+        hour = moment.hour + moment.minute / 60
+        if start < end:
+            return start <= hour < end
+        return hour >= start or hour < end  # Franja que cruza la medianoche
+
+    def until_active(self, now):
+        """Segundos hasta el próximo inicio de las horas activas"""
+        moment = datetime.fromtimestamp(now)
+        start = moment.replace(hour=self.active_hours[0], minute=0, second=0, microsecond=0)
+        if start <= moment:
+            start += timedelta(days=1)
+        return start.timestamp() - now
+
+    def until_inactive(self, now):
+        """Segundos hasta el final de las horas activas en curso (inf si no acaban)"""
+        start, end = self.active_hours
+        if end % 24 == start:
+            return math.inf  # Todo el día
+        moment = datetime.fromtimestamp(now)
+        finish = moment.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(hours=end)
+        if finish <= moment:
+            finish += timedelta(days=1)
+        return finish.timestamp() - now
+
+    def interval(self, backlog, now=None):
+        """Segundos hasta la próxima publicación con ``backlog`` items en cola"""
+        now = now or time.time()
+        interval = self._pace(backlog, now)
+        recent = self._trim(now)
+        if len(recent) >= self.max_per_hour:
+            # Presupuesto agotado: esperar a que salga de la ventana la más antigua
+            interval = max(interval, recent[len(recent) - self.max_per_hour] + 3600 - now)
+        return interval
+
+    def eta(self, backlog, now=None):
+        """Segundos estimados hasta vaciar la cola (None si tardaría demasiado en simularse)"""
+        now = now or time.time()
+        if backlog <= 0:
+            return 0.0
+        moment = now + self.interval(backlog, now)
+        remaining = backlog - 1
+        for _ in range(MAX_STEPS):
+            if remaining <= 0:
+                return moment - now
+            pace = self._pace(remaining, moment)
+            steps = self._steady(remaining, moment, pace)
+            moment += pace * steps
+            remaining -= steps
+        return None
+
+    def _steady(self, backlog, now, pace):
+        """Publicaciones seguidas desde ``now`` que mantienen el intervalo ``pace``"""
+        if self.is_active(now):
+            if pace == self.base_interval:
+                steps = backlog  # Con menos cola el intervalo no pasa del base
+            elif pace == self.min_interval:
+                # Al mínimo mientras drain_target / backlog no lo supere
+                steps = math.floor(backlog - self.drain_target / self.min_interval) + 1
+            else:
+                return 1
+            until_inactive = self.until_inactive(now)
+            if until_inactive != math.inf:
+                # Sin salir de las horas activas
+                steps = min(steps, math.ceil(until_inactive / pace))
+        elif self.quiet_interval and pace == self.quiet_interval:
+            # Fuera de horas: cada quiet_interval mientras no empiecen las horas activas
+            steps = math.floor(self.until_active(now) / pace)
+        else:
+            return 1
+        return max(1, min(backlog, steps))
+
+    def _trim(self, now):
+        recent = self._recent
+        while recent and recent[0] <= now - 3600:
+            recent.popleft()
+        return recent
+
+    def _pace(self, backlog, now):
+        if not self.is_active(now):
+            until_active = self.until_active(now)
+            if not self.quiet_interval or backlog <= 0:
+                return until_active
+            return min(self.quiet_interval, until_active)
+        if backlog <= 0:
+            return self.base_interval
+        interval = min(self.base_interval, self.drain_target / backlog)
+        return max(self.min_interval, interval)
@@ -0,0 +1,137 @@
+"""Codificación de ``callback_data`` y enrutado de los botones de moderación.
+
+Cada botón lleva un registro binario versionado (acción, tipo, id del item,
+id del usuario y horas de sanción) empaquetado con ``struct`` y codificado en
+base64url: 28 caracteres fijos, lejos del límite de 64 bytes de Telegram.
+El router despacha con una única búsqueda en diccionario por (acción, tipo).
+
+Los botones de mensajes enviados antes de este formato (``approve_text_123``,
+``ban_2_123_poll_456``...) se siguen entendiendo a través de ``parse_legacy``.
+"""
+import base64
+import binascii
+import struct
+from typing import NamedTuple
+
+VERSION = 1
+
+ACTIONS = ("approve", "cola", "reject", "sancionar", "ban", "cancel", "respond")
+ITEM_TYPES = ("text", "poll", "voice", "question")
+
+_ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+_TYPE_CODES = {item_type: code for code, item_type in enumerate(ITEM_TYPES)}
+
+# versión, acción, tipo, id del item, id del usuario, horas
+_FORMAT = struct.Struct(">BBBqqH")
+ENCODED_LENGTH = 28  # base64 de 21 bytes, sin relleno
+
+
+class CallbackData(NamedTuple):
+    action: str
+    item_type: str
+    item_id: int
+    user_id: int = 0
+    hours: int = 0
+
+
+def encode_callback(action, item_type, item_id, user_id=0, hours=0):
+    """Empaquetar un botón en un ``callback_data`` compacto"""
+    packed = _FORMAT.pack(
+        VERSION, _ACTION_CODES[action], _TYPE_CODES[item_type or "text"],
+        int(item_id), int(user_id), int(hours),
+    )
+    return base64.urlsafe_b64encode(packed).decode("ascii")
+
+
+def decode_callback(data):
+    """Convertir ``callback_data`` en ``CallbackData`` (formato actual o antiguo).
+
+    Lanza ValueError si no se reconoce.
+    """
+    # Los botones antiguos empiezan por una palabra en minúsculas, que en
+    # base64 nunca corresponde a un byte de versión menor que 4 (carácter "A")
+    if len(data) == ENCODED_LENGTH and data[0] == "A":
+        try:
+            version, action, item_type, item_id, user_id, hours = _FORMAT.unpack(
+                base64.urlsafe_b64decode(data)
+            )
+            callback = CallbackData(ACTIONS[action], ITEM_TYPES[item_type], item_id, user_id, hours)
+        except (binascii.Error, struct.error, IndexError) as e:
+            raise ValueError(f"callback_data inválido: {data!r}") from e
+        if version != VERSION:
+            # Otra versión puede tener los mismos 28 caracteres con otro significado
+            raise ValueError(f"Versión de callback_data desconocida ({version}): {data!r}")
+        return callback
+    return parse_legacy(data)
+
+
+def _legacy_question(action, parts):
+    # respond_question_<id>, sancionar_question_<id>, cancel_question_<id>,
+    # ban_question_<horas>_<id>_<user_id>
+    if action == "ban":
+        return CallbackData("ban", "question", int(parts[3]), int(parts[4]), int(parts[2]))
+    return CallbackData(action, "question", int(parts[2]))
+
+
+def _legacy_item(action, parts):
+    # approve_<tipo>_<id>, cola_<tipo>_<id>, reject_<tipo>_<id>, sancionar_<tipo>_<id>
+    return CallbackData(action, parts[1], int(parts[2]))
+
+
+def _legacy_ban(action, parts):
+    # ban_<horas>_<id>_<tipo>_<user_id>
+    return CallbackData("ban", parts[3], int(parts[2]), int(parts[4]), int(parts[1]))
+
+
+def _legacy_cancel(action, parts):
+    # cancel_<id>_<tipo>
+    return CallbackData("cancel", parts[2] if len(parts) > 2 else "text", int(parts[1]))
+
+
+_LEGACY_PARSERS = {
+    "approve": _legacy_item,
+    "cola": _legacy_item,
+    "reject": _legacy_item,
+    "sancionar": _legacy_item,
+    "ban": _legacy_ban,
+    "cancel": _legacy_cancel,
+}
+
+
+def parse_legacy(data):
+    """Interpretar el formato de texto anterior de ``callback_data``"""
+    parts = data.split("_")
+    action = parts[0]
+    try:
+        if len(parts) > 1 and parts[1] == "question":
+            return _legacy_question(action, parts)
+        parser = _LEGACY_PARSERS[action]
+        return parser(action, parts)
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(f"callback_data no reconocido: {data!r}") from e
+
+
+class CallbackRouter:
+    """Tabla (acción, tipo) -> handler; sin tipos, el handler sirve para cualquiera"""
+
+    def __init__(self):
+        self._handlers = {}
+
+    def route(self, action, *item_types):
+        """Decorador para registrar un handler ``async def h(query, data, context)``
+        para ``action`` con los tipos indicados (o con todos si no se indica ninguno)"""
+        def register(handler):
+            for item_type in item_types or (None,):
+                self._handlers[(action, item_type)] = handler
+            return handler
+        return register
+
+    def resolve(self, data):
+        handlers = self._handlers
+        return handlers.get((data.action, data.item_type)) or handlers.get((data.action, None))
+
+    async def dispatch(self, query, data, context):
+        handler = self.resolve(data)
+        if handler is None:
+            raise ValueError(f"Sin handler para la acción {data.action!r} ({data.item_type})")
+        return await handler(query, data, context)
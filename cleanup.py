@@ -0,0 +1,115 @@
+"""Borrado programado y agrupado de mensajes transitorios.
+
+Confirmaciones temporales, mensajes de moderación ya resueltos y las
+preguntas respondidas se borran desde un único servicio: un min-heap ordenado
+por fecha de borrado y una sola tarea que, cuando vencen, agrupa los ids por
+chat en llamadas ``deleteMessages`` de hasta 100 mensajes. Los borrados
+pendientes se guardan en el ``StateStore`` y se recuperan al arrancar.
+"""
+import asyncio
+import heapq
+import logging
+import time
+from collections import defaultdict
+
+from telegram.error import BadRequest, Forbidden
+
+MAX_BATCH = 100  # Límite de deleteMessages
+COALESCE_DELAY = 1.0  # Espera mínima para agrupar borrados "inmediatos"
+RETRY_DELAY = 30  # Segundos antes de reintentar tras un error de red
+
+
+class MessageCleaner:
+    """Cola de borrados con una única tarea propietaria"""
+
+    def __init__(self, store, batch_size=MAX_BATCH, coalesce_delay=COALESCE_DELAY, retry_delay=RETRY_DELAY):
+        self._store = store
+        self.batch_size = batch_size
+        self.coalesce_delay = coalesce_delay
+        self.retry_delay = retry_delay
+        self._heap = []  # (delete_at, chat_id, message_id)
+        self._bot = None
+        self._wakeup = None
+        self._task = None
+        self.deleted = 0
+        self.calls = 0
+
+    def start(self, bot):
+        """Cargar los borrados guardados y arrancar la tarea"""
+        if self._task is not None:
+            return
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        self._heap = [tuple(row) for row in self._store.scheduled_deletions()]
+        heapq.heapify(self._heap)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def pending(self):
+        """Mensajes esperando a ser borrados"""
+        return len(self._heap)
+
+    def schedule(self, chat_id, message_ids, delay=0.0):
+        """Programar el borrado de ``message_ids`` dentro de ``delay`` segundos"""
+        message_ids = [message_id for message_id in message_ids if message_id]
+        if not message_ids:
+            return
+        chat_id = str(chat_id)
+        delete_at = time.time() + max(delay, self.coalesce_delay)
+        self._store.add_deletions(chat_id, message_ids, delete_at)
+        for message_id in message_ids:
+            heapq.heappush(self._heap, (delete_at, chat_id, message_id))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            if self._heap and self._heap[0][0] <= now:
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap))
+                await self._delete(due)
+                continue
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _delete(self, due):
+        by_chat = defaultdict(list)
+        for _, chat_id, message_id in due:
+            by_chat[chat_id].append(message_id)
+
+        for chat_id, message_ids in by_chat.items():
+            for start in range(0, len(message_ids), self.batch_size):
+                batch = message_ids[start:start + self.batch_size]
+                try:
+                    # Telegram omite los mensajes que ya no existen
+                    await self._bot.delete_messages(chat_id=chat_id, message_ids=batch)
+                    self.deleted += len(batch)
+                except (BadRequest, Forbidden) as e:
+                    # Demasiado antiguos o sin permisos: reintentar no sirve
+                    logging.warning(f"⚠️ No se pudieron borrar {len(batch)} mensaje(s) de {chat_id}: {e}")
+                except Exception as e:
+                    logging.error(f"❌ Error borrando mensajes de {chat_id}, reintento en {self.retry_delay}s: {e}")
+                    retry_at = time.time() + self.retry_delay
+                    self._store.add_deletions(chat_id, batch, retry_at)
+                    for message_id in batch:
+                        heapq.heappush(self._heap, (retry_at, chat_id, message_id))
+                    continue
+                finally:
+                    self.calls += 1
+                self._store.remove_deletions(chat_id, batch)
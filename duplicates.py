@@ -0,0 +1,204 @@
+"""Detección de envíos duplicados y casi duplicados.
+
+Cada texto (confesión o pregunta y opciones de una encuesta) se normaliza
+(minúsculas, sin tildes ni signos, espacios colapsados) y se resume en:
+
+* un hash exacto de 64 bits del texto normalizado;
+* una firma MinHash de ``SIGNATURE_SIZE`` valores calculada con una sola
+  función hash sobre los 5-gramas de caracteres (one permutation hashing,
+  densificada para textos cortos), repartida en bandas LSH.
+
+Un envío nuevo se compara solo con los textos que comparten alguna banda, así
+que la consulta cuesta lo mismo con 100 que con 100.000 entradas. El índice
+guarda los envíos de los últimos ``retention`` segundos (pendientes, en cola y
+ya moderados) con un máximo de ``max_entries``; las huellas se persisten en
+el ``StateStore`` para sobrevivir a los reinicios.
+"""
+import hashlib
+import re
+import time
+import unicodedata
+import zlib
+from array import array
+from collections import deque
+from typing import NamedTuple, Optional
+
+SIGNATURE_SIZE = 24
+BANDS = 6  # 6 bandas de 4 valores: similitud 0,8 -> 96% de probabilidad de ser candidato
+ROWS = SIGNATURE_SIZE // BANDS
+SHINGLE = 5
+NEAR_THRESHOLD = 0.7  # Similitud de Jaccard estimada a partir de la cual se avisa
+MIN_SHINGLES = 8  # Textos más cortos solo se comparan de forma exacta
+RETENTION = 7 * 86400
+MAX_ENTRIES = 50_000  # ~1 KB por entrada
+
+_EMPTY = 0xFFFFFFFF
+_NON_WORD = re.compile(r"[\W_]+")
+_REPEATS = re.compile(r"(.)\1{2,}")
+
+
+class Fingerprint(NamedTuple):
+    exact: int
+    signature: Optional[array]  # None si el texto es demasiado corto
+
+
+class Match(NamedTuple):
+    item_id: int
+    similarity: float  # 1.0 si es exacto
+    exact: bool
+
+
+def normalize(text):
+    """Texto comparable: sin tildes, mayúsculas, signos ni letras repetidas"""
+    if not text.isascii():  # Sin tildes ni símbolos compuestos no hay nada que descomponer
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(char for char in text if not unicodedata.combining(char))
+    text = text.casefold()
+    text = _REPEATS.sub(r"\1\1", text)
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def exact_hash(normalized):
+    return int.from_bytes(hashlib.blake2b(normalized.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+def signature(normalized):
+    """Firma MinHash de ``SIGNATURE_SIZE`` valores, o None si el texto es muy corto"""
+    shingles = {normalized[i:i + SHINGLE] for i in range(len(normalized) - SHINGLE + 1)}
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    bins = [_EMPTY] * SIGNATURE_SIZE
+    for shingle in shingles:
+        value, index = divmod(zlib.crc32(shingle.encode()), SIGNATURE_SIZE)
+        if value < bins[index]:
+            bins[index] = value
+    # Densificación: un hueco toma el valor del siguiente hueco lleno, desplazado
+    for index in range(SIGNATURE_SIZE):
+        if bins[index] == _EMPTY:
+            for offset in range(1, SIGNATURE_SIZE):
+                source = bins[(index + offset) % SIGNATURE_SIZE]
+                if source != _EMPTY:
+                    bins[index] = (source + offset * 0x9E3779B1) & 0x7FFFFFFF
+                    break
+    return array("I", bins)
+
+
+def fingerprint(text):
+    """Huella de un texto para ``DuplicateIndex.find``/``add``"""
+    normalized = normalize(text)
+    return Fingerprint(exact_hash(normalized), signature(normalized))
+
+
+def similarity(first, second):
+    """Similitud de Jaccard estimada entre dos firmas"""
+    return sum(a == b for a, b in zip(first, second)) / SIGNATURE_SIZE
+
+
+def _band_keys(sig):
+    return [hash((band, tuple(sig[band * ROWS:(band + 1) * ROWS]))) for band in range(BANDS)]
+
+
+class DuplicateIndex:
+    """Índice de huellas de los envíos recientes"""
+
+    def __init__(self, store, retention=RETENTION, threshold=NEAR_THRESHOLD, max_entries=MAX_ENTRIES):
+        self._store = store
+        self.retention = retention
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._order = deque()  # (created_at, item_id) en orden de llegada
+        self._entries = {}  # item_id -> (hash exacto, firma o None)
+        self._exact = {}  # hash exacto -> item_id más reciente
+        self._bands = [{} for _ in range(BANDS)]  # clave de banda -> item_id o set de item_id
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, now=None):
+        """Reconstruir el índice con las huellas guardadas dentro de la retención"""
+        now = now or time.time()
+        self._store.purge_fingerprints(now - self.retention)
+        for item_id, created_at, exact, sig in self._store.fingerprints():
+            self._insert(item_id, created_at, exact, array("I", sig) if sig is not None else None)
+        self._trim(now)
+        return len(self._entries)
+
+    def find(self, fp):
+        """Envío anterior igual o parecido (``Match``), o None"""
+        exact, sig = fp
+        item_id = self._exact.get(exact)
+        if item_id is not None:
+            return Match(item_id, 1.0, True)
+        if sig is None:
+            return None
+
+        candidates = set()
+        for band, key in zip(self._bands, _band_keys(sig)):
+            bucket = band.get(key)
+            if bucket is None:
+                continue
+            if isinstance(bucket, set):
+                candidates.update(bucket)
+            else:
+                candidates.add(bucket)
+
+        best = None
+        for candidate in candidates:
+            # Las firmas se comparan enteras: compartir una banda no basta
+            other = self._entries[candidate][1]
+            score = similarity(sig, other)
+            if score >= self.threshold and (best is None or score > best.similarity):
+                best = Match(candidate, score, False)
+        return best
+
+    def add(self, item_id, fp, created_at=None):
+        """Indexar un envío (y guardar su huella)"""
+        created_at = created_at or time.time()
+        exact, sig = fp
+        self._insert(item_id, created_at, exact, sig)
+        self._store.add_fingerprint(item_id, created_at, exact, sig.tobytes() if sig is not None else None)
+        self._trim(created_at)
+
+    def _insert(self, item_id, created_at, exact, sig):
+        if item_id in self._entries:
+            return
+        self._entries[item_id] = (exact, sig)
+        self._exact[exact] = item_id
+        self._order.append((created_at, item_id))
+        if sig is None:
+            return
+        for band, key in zip(self._bands, _band_keys(sig)):
+            bucket = band.get(key)
+            if bucket is None:
+                band[key] = item_id  # La mayoría de las bandas tienen un solo item
+            elif isinstance(bucket, set):
+                bucket.add(item_id)
+            else:
+                band[key] = {bucket, item_id}
+
+    def _remove(self, item_id):
+        exact, sig = self._entries.pop(item_id)
+        if self._exact.get(exact) == item_id:
+            del self._exact[exact]
+        if sig is None:
+            return
+        for band, key in zip(self._bands, _band_keys(sig)):
+            bucket = band.get(key)
+            if bucket == item_id:
+                del band[key]
+            elif isinstance(bucket, set):
+                bucket.discard(item_id)
+                if len(bucket) == 1:
+                    band[key] = bucket.pop()
+
+    def _trim(self, now):
+        cutoff = now - self.retention
+        order = self._order
+        expired = False
+        while order and (order[0][0] < cutoff or len(order) > self.max_entries):
+            _, item_id = order.popleft()
+            self._remove(item_id)
+            expired = True
+        if expired:
+            # Todo lo anterior a la entrada más antigua que se conserva
+            self._store.purge_fingerprints(order[0][0] if order else now)
@@ -0,0 +1,134 @@
+"""Cola de efectos secundarios de la moderación.
+
+Los handlers de los botones solo hacen la transición de estado en el store y
+encolan aquí el resto (publicar en el canal, avisar al autor, borrar el mensaje
+de moderación). Un número fijo de workers consume la cola; los fallos
+transitorios se reintentan con espera exponencial sin ocupar un worker, y los
+permanentes (usuario que bloqueó el bot, mensaje ya borrado) se descartan al
+primer intento, igual que los que el propio efecto marca como definitivos con
+``is_final`` (una publicación que pudo llegar al canal no se repite). La cola está acotada: si se llena, ``submit`` espera (salvo
+los efectos encolados desde otro efecto, que nunca bloquean a un worker).
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+
+from telegram.error import BadRequest, Forbidden
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAXSIZE = 1000
+MAX_ATTEMPTS = 4
+BASE_DELAY = 2  # Segundos antes del primer reintento; se duplica en cada uno
+
+# Reintentar no cambia el resultado (ValueError: datos del item no válidos)
+PERMANENT_ERRORS = (Forbidden, BadRequest, ValueError)
+
+
+class Effect(NamedTuple):
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    args: tuple
+    on_failure: Optional[Callable[[Exception], Awaitable[Any]]] = None
+    is_final: Optional[Callable[[Exception], bool]] = None
+    attempt: int = 1
+
+
+class SideEffectQueue:
+    """Pool de workers con reintentos para efectos que no deben bloquear al moderador"""
+
+    def __init__(self, workers=DEFAULT_WORKERS, maxsize=DEFAULT_MAXSIZE,
+                 max_attempts=MAX_ATTEMPTS, base_delay=BASE_DELAY):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self._queue = None
+        self._tasks = []
+        self._retries = set()  # TimerHandle de los reintentos programados
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for handle in self._retries:
+            handle.cancel()
+        self._retries.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def join(self):
+        """Esperar a que la cola quede vacía (sin contar reintentos programados)"""
+        await self._queue.join()
+
+    @property
+    def depth(self):
+        """Efectos esperando worker"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def status(self):
+        return {
+            "depth": self.depth,
+            "scheduled_retries": len(self._retries),
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed
+        }
+
+    async def submit(self, name, func, *args, on_failure=None, is_final=None):
+        """Encolar ``await func(*args)``; ``on_failure(exc)`` si falla definitivamente.
+
+        ``is_final(exc)`` permite dar por definitivos otros errores además de
+        ``PERMANENT_ERRORS``.
+        """
+        effect = Effect(name, func, args, on_failure, is_final)
+        if asyncio.current_task() in self._tasks:
+            # Desde un efecto: esperar a la cola llena podría bloquear a todos los workers
+            self._put_nowait(effect)
+        else:
+            await self._queue.put(effect)
+
+    def _put_nowait(self, effect):
+        try:
+            self._queue.put_nowait(effect)
+        except asyncio.QueueFull:
+            asyncio.get_running_loop().create_task(self._queue.put(effect))
+
+    def _schedule_retry(self, effect, delay):
+        def requeue():
+            self._retries.discard(handle)
+            self._put_nowait(effect)
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._retries.add(handle)
+
+    async def _worker(self):
+        while True:
+            effect = await self._queue.get()
+            try:
+                await effect.func(*effect.args)
+                self.completed += 1
+            except Exception as e:
+                final = isinstance(e, PERMANENT_ERRORS) or (effect.is_final is not None and effect.is_final(e))
+                if not final and effect.attempt < self.max_attempts:
+                    delay = self.base_delay * 2 ** (effect.attempt - 1)
+                    logging.warning(f"⚠️ {effect.name} falló ({e}); reintento {effect.attempt} en {delay}s")
+                    self.retried += 1
+                    self._schedule_retry(effect._replace(attempt=effect.attempt + 1), delay)
+                else:
+                    self.failed += 1
+                    logging.error(f"❌ {effect.name} descartado tras {effect.attempt} intento(s): {e}")
+                    if effect.on_failure is not None:
+                        try:
+                            await effect.on_failure(e)
+                        except Exception as failure_error:
+                            logging.error(f"❌ Error tras fallar {effect.name}: {failure_error}")
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,42 @@
+"""Generador de IDs de items: 63 bits, monotónicos y ordenados por tiempo.
+
+Estructura (estilo Snowflake, un solo proceso):
+    [41 bits: milisegundos desde EPOCH_MS][22 bits: secuencia]
+
+Caben en un INTEGER de SQLite y en un ``q`` de ``struct``: el registro de
+``callback_data`` (ver callbacks.py) ocupa 28 caracteres fijos, muy por debajo
+de los 64 bytes de Telegram. Al arrancar se parte del mayor ID guardado,
+así que los IDs no se repiten entre reinicios aunque el reloj retroceda.
+"""
+import time
+
+EPOCH_MS = 1_704_067_200_000  # 2024-01-01 00:00:00 UTC
+SEQUENCE_BITS = 22
+MAX_ID = (1 << 63) - 1
+
+
+class IdGenerator:
+    """IDs únicos y crecientes; ``last_id`` es el mayor ID ya emitido"""
+
+    def __init__(self, last_id=0):
+        self._last = last_id
+
+    def seed(self, last_id):
+        """Asegurar que los próximos IDs superan ``last_id``"""
+        self._last = max(self._last, last_id or 0)
+
+    def next_id(self, now=None):
+        now = now or time.time()
+        candidate = (int(now * 1000) - EPOCH_MS) << SEQUENCE_BITS
+        if candidate <= self._last:
+            # Mismo milisegundo o reloj atrasado: continuar la secuencia
+            candidate = self._last + 1
+        if candidate > MAX_ID:
+            raise OverflowError("ID fuera del rango de 63 bits")
+        self._last = candidate
+        return candidate
+
+
+def id_timestamp(item_id):
+    """Instante (segundos epoch) en que se generó un ID"""
+    return ((item_id >> SEQUENCE_BITS) + EPOCH_MS) / 1000
@@ -0,0 +1,180 @@
+"""Modelo de los items enviados por los usuarios.
+
+Cada tipo (confesión de texto, encuesta, voz, pregunta) es una clase con
+``__slots__``: sin ``__dict__`` por instancia y con los campos declarados en un
+solo sitio. El comportamiento que antes se repetía en cadenas
+``if item_type == ...`` (texto del mensaje de moderación, publicación en el
+canal, mensajes al usuario) vive en el propio tipo, y ``ITEM_CLASSES`` permite
+construir el item correcto a partir de su tipo.
+"""
+from abc import ABC, abstractmethod
+
+
+class Item(ABC):
+    """Campos comunes a todos los items; ``FIELDS`` son los propios del tipo"""
+
+    __slots__ = ("id", "user_id", "created_at", "status", "message_id")
+
+    TYPE = None
+    LABEL = None  # Nombre en los mensajes al usuario ("Tu confesión...")
+    APPROVED_TEXT = None
+    QUEUED_TEXT = None
+    REJECTED_TEXT = None
+    FIELDS = ()
+    PAYLOAD_KEYS = {}  # campo -> clave en el payload guardado, si difieren
+
+    def __init__(self, item_id, user_id, created_at, status=None, **fields):
+        self.id = item_id
+        self.user_id = user_id
+        self.created_at = created_at
+        self.status = status
+        self.message_id = None  # Mensaje en el grupo de moderación
+        for name in self.FIELDS:
+            setattr(self, name, fields.get(name))
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.id} ({self.status})>"
+
+    @classmethod
+    def from_payload(cls, item_id, user_id, created_at, payload, status=None):
+        keys = cls.PAYLOAD_KEYS
+        fields = {name: payload.get(keys.get(name, name)) for name in cls.FIELDS}
+        return cls(item_id, user_id, created_at, status, **fields)
+
+    def payload(self):
+        """Campos propios del tipo, tal como se guardan en el store"""
+        keys = self.PAYLOAD_KEYS
+        return {keys.get(name, name): getattr(self, name) for name in self.FIELDS}
+
+    @abstractmethod
+    def moderation_text(self):
+        """Texto del mensaje en el grupo de moderación"""
+
+    def fingerprint_text(self):
+        """Texto que revisan los duplicados y las reglas (None: el tipo no se revisa)"""
+        return None
+
+    def mention_text(self):
+        """Texto del que se extraen las personas mencionadas (ver mentions.py)"""
+        return self.fingerprint_text()
+
+    def _moderation_text(self, note=None):
+        text = self.moderation_text()
+        return f"{text}\n\n{note}" if note else text
+
+    async def send_to_moderation(self, bot, chat_id, reply_markup, note=None, rate_limit_args=None):
+        """``note``: aviso para los moderadores añadido al final del mensaje;
+        ``rate_limit_args``: prioridad en el limitador de salida (ver outbound.py)"""
+        return await bot.send_message(
+            chat_id=chat_id, text=self._moderation_text(note), reply_markup=reply_markup,
+            rate_limit_args=rate_limit_args
+        )
+
+    async def publish(self, bot, chat_id):
+        raise ValueError(f"Los items de tipo {self.TYPE!r} no se publican")
+
+
+class TextItem(Item):
+    __slots__ = ("text",)
+
+    TYPE = "text"
+    LABEL = "confesión"
+    APPROVED_TEXT = "🎉 Tu confesión ha sido aprobada y publicada."
+    QUEUED_TEXT = "🕒 Tu confesión ha sido aprobada y añadida a la cola de publicación automática."
+    REJECTED_TEXT = "❌ Tu confesión no cumple con nuestras normas."
+    FIELDS = ("text",)
+
+    def moderation_text(self):
+        return f"📝 Nueva confesión\n\n{self.text}"
+
+    def fingerprint_text(self):
+        return self.text
+
+    async def publish(self, bot, chat_id):
+        return await bot.send_message(chat_id=chat_id, text=f"📢 Confesión anónima:\n\n{self.text}")
+
+
+class PollItem(Item):
+    __slots__ = ("question", "options", "is_anonymous", "poll_type", "allows_multiple_answers")
+
+    TYPE = "poll"
+    LABEL = "encuesta"
+    APPROVED_TEXT = "🎉 Tu encuesta ha sido aprobada y publicada."
+    QUEUED_TEXT = "🕒 Tu encuesta ha sido aprobada y añadida a la cola de publicación automática."
+    REJECTED_TEXT = "❌ Tu encuesta no cumple con nuestras normas."
+    FIELDS = ("question", "options", "is_anonymous", "poll_type", "allows_multiple_answers")
+    PAYLOAD_KEYS = {"poll_type": "type"}
+
+    def moderation_text(self):
+        options_text = "\n".join([f"• {option}" for option in self.options])
+        return (
+            f"📊 Nueva encuesta\n\n"
+            f"Pregunta: {self.question}\n\nOpciones:\n{options_text}\n\n"
+            f"Tipo: {self.poll_type}\nAnónima: {'Sí' if self.is_anonymous else 'No'}\n"
+            f"Múltiples respuestas: {'Sí' if self.allows_multiple_answers else 'No'}"
+        )
+
+    def fingerprint_text(self):
+        return "\n".join([self.question or "", *(self.options or [])])
+
+    async def publish(self, bot, chat_id):
+        return await bot.send_poll(
+            chat_id=chat_id,
+            question=self.question,
+            options=self.options,
+            is_anonymous=self.is_anonymous,
+            type=self.poll_type,
+            allows_multiple_answers=self.allows_multiple_answers
+        )
+
+
+class VoiceItem(Item):
+    __slots__ = ("file_id", "duration", "file_size")
+
+    TYPE = "voice"
+    LABEL = "mensaje de voz"
+    APPROVED_TEXT = "🎉 Tu mensaje de voz ha sido aprobado y publicado."
+    QUEUED_TEXT = "🕒 Tu mensaje de voz ha sido aprobado y añadido a la cola de publicación automática."
+    REJECTED_TEXT = "❌ Tu mensaje de voz no cumple con nuestras normas."
+    FIELDS = ("file_id", "duration", "file_size")
+
+    def moderation_text(self):
+        return f"🎤 Nuevo mensaje de voz\n\nDuración: {self.duration} segundos"
+
+    async def send_to_moderation(self, bot, chat_id, reply_markup, note=None, rate_limit_args=None):
+        return await bot.send_voice(
+            chat_id=chat_id, voice=self.file_id, caption=self._moderation_text(note), reply_markup=reply_markup,
+            rate_limit_args=rate_limit_args
+        )
+
+    async def publish(self, bot, chat_id):
+        if not self.file_id:
+            raise ValueError("Voice data is missing file_id")
+        return await bot.send_voice(
+            chat_id=chat_id,
+            voice=self.file_id,
+            caption="🎤 Confesión anónima en mensaje de voz"
+        )
+
+
+class QuestionItem(Item):
+    __slots__ = ("text",)
+
+    TYPE = "question"
+    LABEL = "pregunta"
+    FIELDS = ("text",)
+
+    def moderation_text(self):
+        return f"❓ Nueva pregunta\n\n{self.text}"
+
+    def mention_text(self):
+        return self.text
+
+
+ITEM_CLASSES = {cls.TYPE: cls for cls in (TextItem, PollItem, VoiceItem, QuestionItem)}
+ITEM_TYPES = tuple(ITEM_CLASSES)
+
+
+def make_item(item_type, item_id, user_id, created_at, payload, status=None):
+    """Construir el item del tipo indicado a partir de su payload"""
+    return ITEM_CLASSES[item_type].from_payload(item_id, user_id, created_at, payload, status)
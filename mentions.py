@@ -0,0 +1,172 @@
+"""Menciones de personas en los envíos recientes.
+
+Una de las normas es no mencionar repetidamente a la misma persona, y eso solo
+se ve comparando envíos entre sí. De cada confesión, encuesta o pregunta se
+extraen las @menciones y los nombres propios (palabras en mayúscula que no
+abren frase, p. ej. "ayer vi a María José"), normalizados como en
+duplicates.py, y se cuentan una vez por envío en una ventana deslizante.
+
+Las cuentas viven en un count-min sketch por franja de tiempo más un sketch
+agregado con la suma de la ventana: consultar cuántas veces se ha mencionado
+un nombre cuesta ``DEPTH`` lecturas, y la memoria es fija (~2 MB) sin importar
+cuántos nombres distintos aparezcan. Cada franja se actualiza de forma
+conservadora, así que la estimación nunca se queda corta (tampoco al caducar
+franjas) y solo se pasa si muchos nombres colisionan. Un montón con los ``top_size`` nombres
+más mencionados alimenta /menciones. Las menciones se guardan en el
+``StateStore`` para reconstruir la ventana al reiniciar.
+"""
+import hashlib
+import heapq
+import re
+import time
+from array import array
+
+from duplicates import normalize
+
+WINDOW = 7 * 86400
+BUCKETS = 14  # Franjas de 12 horas: la ventana avanza de media jornada en media jornada
+WIDTH = 8192
+DEPTH = 4
+TOP_SIZE = 50
+MAX_PER_TEXT = 10  # Nombres contados como mucho por envío
+
+_HANDLE = re.compile(r"(?<![\w@])@([A-Za-z]\w{3,31})")
+_WORD = "[A-ZÁÉÍÓÚÑÜ][a-záéíóúñüàèìòùç]+"  # Capitalizada, no en mayúsculas: "María", no "ODIO"
+_NAME = re.compile(rf"(?<![\w@]){_WORD}(?:\s+(?:de\s+(?:la\s+|los\s+)?)?{_WORD})*")
+_SENTENCE_END = ".!?¿¡:;\"«(-—"
+# Palabras en mayúscula a mitad de frase que no son personas
+IGNORED_NAMES = frozenset({
+    "dios", "navidad", "semana santa", "internet", "instagram", "whatsapp", "tiktok", "telegram",
+    "twitter", "youtube", "google", "netflix", "spotify", "erasmus", "tfg", "tfm",
+})
+
+
+def extract_mentions(text):
+    """@menciones y nombres propios de ``text``, normalizados y sin repetir"""
+    if not text:
+        return []
+    found = {f"@{match.group(1).lower()}" for match in _HANDLE.finditer(text)}
+    for match in _NAME.finditer(text):
+        before = text[:match.start()].rstrip()[-1:]
+        if not before or before in _SENTENCE_END:
+            continue  # Primera palabra de una frase: mayúscula por ortografía
+        name = normalize(match.group(0))
+        if name and name not in IGNORED_NAMES:
+            found.add(name)
+    return sorted(found)[:MAX_PER_TEXT]
+
+
+def _cells(name):
+    """Posición de ``name`` en cada fila del sketch (doble hashing)"""
+    digest = hashlib.blake2b(name.encode(), digest_size=8).digest()
+    first = int.from_bytes(digest[:4], "little")
+    second = int.from_bytes(digest[4:], "little") | 1
+    return [row * WIDTH + (first + row * second) % WIDTH for row in range(DEPTH)]
+
+
+class MentionIndex:
+    """Cuentas aproximadas de menciones en los últimos ``window`` segundos"""
+
+    def __init__(self, store, window=WINDOW, top_size=TOP_SIZE):
+        self._store = store
+        self.window = window
+        self.top_size = top_size
+        self._bucket_span = window / BUCKETS
+        self._buckets = [array("I", bytes(4 * WIDTH * DEPTH)) for _ in range(BUCKETS)]
+        self._total = array("I", bytes(4 * WIDTH * DEPTH))  # Suma de las franjas de la ventana
+        self._current = None  # Número de la franja más reciente
+        self._top = {}  # nombre -> última estimación
+        self._heap = []  # (estimación, nombre); entradas viejas se descartan al salir
+
+    def load(self, now=None):
+        """Reconstruir la ventana con las menciones guardadas"""
+        now = now or time.time()
+        self._store.purge_mentions(now - self.window)
+        for created_at, name in self._store.mentions():
+            self._count(name, created_at)
+        self._advance(now)
+        return len(self._top)
+
+    def add(self, item_id, names, created_at=None):
+        """Contar las menciones de un envío (y guardarlas)"""
+        created_at = created_at or time.time()
+        for name in names:
+            self._count(name, created_at)
+        if names:
+            self._store.add_mentions(item_id, created_at, names)
+
+    def count(self, name, now=None):
+        """Envíos de la ventana que mencionan ``name`` (puede pasarse, nunca quedarse corto)"""
+        self._advance(now or time.time())
+        return self._estimate(name)
+
+    def hot(self, limit=10, minimum=2, now=None):
+        """Los ``limit`` nombres más mencionados, con al menos ``minimum`` envíos"""
+        self._advance(now or time.time())
+        ranked = sorted(((self._estimate(name), name) for name in self._top), reverse=True)
+        return [(name, count) for count, name in ranked[:limit] if count >= minimum]
+
+    def _estimate(self, name):
+        total = self._total
+        return min(total[cell] for cell in _cells(name))
+
+    def _count(self, name, created_at):
+        bucket = int(created_at // self._bucket_span)
+        if self._current is not None and bucket <= self._current - BUCKETS:
+            return  # Fuera de la ventana
+        self._advance(created_at)
+        cells = _cells(name)
+        counts = self._buckets[bucket % BUCKETS]
+        total = self._total
+        # Actualización conservadora: solo suben las celdas que marcan el mínimo
+        # de la franja; el resto ya cuentan al menos lo mismo
+        lowest = min(counts[cell] for cell in cells)
+        for cell in cells:
+            if counts[cell] == lowest:
+                counts[cell] += 1
+                total[cell] += 1
+        self._offer(name, min(total[cell] for cell in cells))
+
+    def _advance(self, now):
+        """Vaciar las franjas que han salido de la ventana"""
+        bucket = int(now // self._bucket_span)
+        if self._current is None:
+            self._current = bucket
+            return
+        if bucket <= self._current:
+            return
+        expired = range(self._current + 1, bucket + 1)
+        self._current = bucket
+        if len(expired) >= BUCKETS:
+            for counts in self._buckets:
+                counts[:] = array("I", bytes(len(counts) * 4))
+            self._total[:] = array("I", bytes(len(self._total) * 4))
+        else:
+            total = self._total
+            for number in expired:
+                counts = self._buckets[number % BUCKETS]
+                for cell, value in enumerate(counts):
+                    if value:
+                        total[cell] -= value
+                counts[:] = array("I", bytes(len(counts) * 4))
+        # Las estimaciones del top han bajado: recalcularlas
+        self._top = {name: count for name in self._top if (count := self._estimate(name))}
+        self._heap = [(count, name) for name, count in self._top.items()]
+        heapq.heapify(self._heap)
+
+    def _offer(self, name, estimate):
+        """Mantener en ``_top`` los nombres con más menciones"""
+        top = self._top
+        heap = self._heap
+        if name not in top and len(top) >= self.top_size:
+            # Descartar entradas obsoletas hasta dar con el mínimo real
+            while heap[0][1] not in top or top[heap[0][1]] != heap[0][0]:
+                heapq.heappop(heap)
+            if estimate <= heap[0][0]:
+                return
+            del top[heapq.heappop(heap)[1]]
+        top[name] = estimate
+        heapq.heappush(heap, (estimate, name))
+        if len(heap) > 4 * self.top_size:
+            self._heap = [(count, name) for name, count in top.items()]
+            heapq.heapify(self._heap)
@@ -0,0 +1,214 @@
+"""Métricas del proceso en el formato de texto de Prometheus.
+
+Contadores, histogramas y gauges mínimos, sin dependencias externas. Las
+métricas se registran en ``REGISTRY`` al crearlas y ``REGISTRY.render()``
+produce la respuesta de ``/metrics``. Los gauges pueden calcularse en el
+momento del scrape mediante una función, de modo que valores como la
+profundidad de la cola se leen del store solo cuando alguien los pide.
+"""
+import bisect
+import math
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Segundos: de un acceso a SQLite a una llamada lenta a la Bot API
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrica duplicada: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    TYPE = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}")
+        return tuple(str(label) for label in labels)
+
+
+class Counter(_Metric):
+    TYPE = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """Valor instantáneo; con ``callback`` se calcula en cada scrape.
+
+    ``callback()`` devuelve un número (sin etiquetas) o un iterable de
+    (tupla de etiquetas, valor).
+    """
+
+    TYPE = "gauge"
+
+    def __init__(self, *args, callback=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.callback = callback
+        self._values = {}
+
+    def set(self, value, *labels):
+        self._values[self._key(labels)] = value
+
+    def _samples(self):
+        if self.callback is None:
+            return self._values.items()
+        result = self.callback()
+        if isinstance(result, (int, float)):
+            return [((), result)]
+        return [(self._key(labels), value) for labels, value in result]
+
+    def render(self):
+        for key, value in self._samples():
+            if value is None:
+                continue
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    TYPE = "histogram"
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}  # etiquetas -> [conteos por bucket..., suma, total]
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def count(self, *labels):
+        series = self._series.get(self._key(labels))
+        return series[-1] if series else 0
+
+    def render(self):
+        for key, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, (("le", _format_value(bound)),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(series[-2])}"
+            yield f"{self.name}_count{labels} {series[-1]}"
+
+
+# --- Métricas compartidas por varios módulos ------------------------------
+
+HANDLER_LATENCY = Histogram(
+    "bot_handler_duration_seconds", "Duración de cada handler de updates", ("handler",)
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total", "Excepciones no capturadas en handlers", ("handler",)
+)
+API_LATENCY = Histogram(
+    "telegram_api_request_duration_seconds", "Duración de las llamadas a la Bot API", ("method",)
+)
+API_ERRORS = Counter(
+    "telegram_api_errors_total", "Llamadas a la Bot API que terminaron en error", ("method", "error")
+)
+API_RETRY_AFTER = Counter(
+    "telegram_api_retry_after_total", "Respuestas RetryAfter (429) de la Bot API", ("method",)
+)
+BACKUP_DURATION = Histogram(
+    "bot_backup_duration_seconds", "Duración de cada copia de seguridad",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
+
+def timed_handler(handler, name=None, observer=None):
+    """Envolver un handler de PTB para medir su duración y sus errores.
+
+    ``observer(update, name, segundos)`` recibe además cada medición.
+    """
+    name = name or handler.__name__
+
+    @wraps(handler)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await handler(update, context)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            HANDLER_LATENCY.observe(elapsed, name)
+            if observer is not None:
+                observer(update, name, elapsed)
+
+    return wrapper
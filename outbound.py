@@ -0,0 +1,211 @@
+"""Limitador de envíos salientes hacia la Bot API de Telegram.
+
+Todas las llamadas del bot (send_message, send_poll, delete_message, ...)
+pasan por ``PriorityRateLimiter.process_request``. Cada petición espera a que
+haya token en el cubo global y en el del chat destino, se atiende por
+prioridad (publicaciones antes que confirmaciones) y ante un ``RetryAfter``
+se respeta la espera indicada por Telegram y se reintenta.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from datetime import timedelta
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from metrics import API_ERRORS, API_LATENCY, API_RETRY_AFTER
+
+# Prioridades (menor = antes)
+PRIORITY_PUBLICATION = 0  # Publicaciones en el canal
+PRIORITY_MODERATION = 1  # Grupo de moderación y respuestas a botones
+PRIORITY_NOTIFICATION = 2  # Mensajes privados a usuarios
+
+# Límites de la Bot API
+GLOBAL_RATE = 30  # mensajes/s en total
+GROUP_RATE = 20 / 60  # mensajes/s en un mismo grupo o canal
+PRIVATE_RATE = 1  # mensajes/s en un mismo chat privado
+
+MAX_CHAT_BUCKETS = 10_000  # Cubos de chats inactivos que se conservan
+
+
+class TokenBucket:
+    """Cubo de tokens con bloqueo temporal tras un RetryAfter"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now):
+        """Segundos hasta que haya un token disponible (0 si ya lo hay)"""
+        self._refill(now)
+        blocked = max(0.0, self.blocked_until - now)
+        missing = max(0.0, (1 - self.tokens) / self.rate)
+        return max(blocked, missing)
+
+    def consume(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, now, seconds):
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+    def is_idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """Despachador de envíos con cubos por chat, cubo global y prioridades.
+
+    ``chat_priorities`` asigna la prioridad por defecto según el chat destino;
+    una llamada concreta puede indicarla con ``rate_limit_args={"priority": n}``.
+    """
+
+    def __init__(self, chat_priorities=None, default_priority=PRIORITY_NOTIFICATION, max_retries=5):
+        self.chat_priorities = {str(k): v for k, v in (chat_priorities or {}).items() if k is not None}
+        self.default_priority = default_priority
+        self.max_retries = max_retries
+        self._global = None
+        self._chat_buckets = {}
+        self._waiters = []  # heap de (prioridad, secuencia, chat_id, future)
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._pump_task = None
+
+    async def initialize(self):
+        if self._pump_task is not None:
+            return  # PTB inicializa el bot (y con él el limitador) desde Application y desde Updater
+        loop = asyncio.get_running_loop()
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_RATE, loop.time())
+        self._wakeup = asyncio.Event()
+        self._pump_task = asyncio.create_task(self._pump())
+
+    async def shutdown(self):
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+            try:
+                await self._pump_task
+            except asyncio.CancelledError:
+                pass
+            self._pump_task = None
+        for _, _, _, future in self._waiters:
+            if not future.done():
+                future.cancel()
+        self._waiters.clear()
+
+    @property
+    def queue_depth(self):
+        """Peticiones esperando turno"""
+        return len(self._waiters)
+
+    def _bucket(self, chat_id, now):
+        key = str(chat_id)
+        bucket = self._chat_buckets.get(key)
+        if bucket is None:
+            if len(self._chat_buckets) >= MAX_CHAT_BUCKETS:
+                # Olvidar los chats cuyo cubo está lleno: no aportan información
+                self._chat_buckets = {
+                    k: b for k, b in self._chat_buckets.items() if not b.is_idle(now)
+                }
+            # Grupos y canales tienen id negativo o @username
+            is_group = key.startswith("@") or key.startswith("-")
+            rate = GROUP_RATE if is_group else PRIVATE_RATE
+            bucket = TokenBucket(rate, max(1, round(rate * 60)) if is_group else 1, now)
+            self._chat_buckets[key] = bucket
+        return bucket
+
+    async def _acquire(self, chat_id, priority):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), chat_id, future))
+        self._wakeup.set()
+        await future
+
+    async def _pump(self):
+        """Conceder turnos en orden de prioridad respetando los cubos"""
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            now = loop.time()
+            delay = self._global.wait_time(now) if self._waiters else None
+
+            if delay == 0:
+                delay = math.inf
+                skipped = []
+                while self._waiters:
+                    entry = heapq.heappop(self._waiters)
+                    priority, _, chat_id, future = entry
+                    if future.done():
+                        continue  # El emisor se canceló
+                    bucket = self._bucket(chat_id, now) if chat_id is not None else None
+                    wait = bucket.wait_time(now) if bucket is not None else 0
+                    if wait > 0:
+                        # Ese chat está saturado: no bloquea a los de detrás
+                        skipped.append(entry)
+                        delay = min(delay, wait)
+                        continue
+                    self._global.consume(now)
+                    if bucket is not None:
+                        bucket.consume(now)
+                    future.set_result(None)
+                    delay = 0
+                    break
+                for entry in skipped:
+                    heapq.heappush(self._waiters, entry)
+                if delay == 0:
+                    continue
+
+            try:
+                timeout = None if delay is None or delay == math.inf else delay
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        priority = (rate_limit_args or {}).get("priority")
+        if priority is None:
+            if chat_id is None:
+                # answerCallbackQuery y similares: respuesta inmediata al moderador
+                priority = PRIORITY_MODERATION
+            else:
+                priority = self.chat_priorities.get(str(chat_id), self.default_priority)
+
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_id, priority)
+            started = time.perf_counter()
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                API_RETRY_AFTER.inc(endpoint)
+                API_ERRORS.inc(endpoint, "RetryAfter")
+                if attempt >= self.max_retries:
+                    raise
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                logging.warning(f"⏳ RetryAfter en {endpoint} (chat {chat_id}): esperando {retry_after}s")
+                now = asyncio.get_running_loop().time()
+                if chat_id is not None:
+                    self._bucket(chat_id, now).block(now, retry_after)
+                else:
+                    self._global.block(now, retry_after)
+            except Exception as e:
+                API_ERRORS.inc(endpoint, type(e).__name__)
+                raise
+            finally:
+                # Solo la llamada en sí: la espera en el limitador no cuenta
+                API_LATENCY.observe(time.perf_counter() - started, endpoint)
@@ -0,0 +1,144 @@
+"""Envío al canal de los items de la cola de publicación (outbox).
+
+Cada intento da tres pasos, y cada uno queda confirmado en SQLite antes del
+siguiente:
+
+1. el item pasa de ``queued`` a ``sending`` y suma un intento;
+2. se envía al canal;
+3. si sale bien, se borra; si falla, vuelve a la cola con un reintento
+   programado (espera exponencial) o, si el error no cambia al reintentar o
+   se agotan los intentos, pasa a ``dead`` para que lo revisen los
+   moderadores (/fallidos).
+
+Un item que falla no bloquea la cola: mientras espera su reintento sale el
+siguiente. Tampoco se publica nada dos veces: si no se sabe si el envío llegó
+al canal (el bot cayó entre el envío y el borrado, o Telegram no respondió a
+tiempo), el item no se reintenta solo y pasa a fallidos para que un moderador
+compruebe el canal antes de devolverlo a la cola.
+"""
+import logging
+import time
+from datetime import timedelta
+from typing import Any, NamedTuple, Optional
+
+import httpx
+from telegram.error import BadRequest, ChatMigrated, RetryAfter, TimedOut
+
+from storage import STATUS_DEAD
+
+MAX_ATTEMPTS = 6
+BASE_DELAY = 60  # Segundos antes del primer reintento; se duplica en cada uno
+MAX_DELAY = 3600
+
+# Resultados de un intento
+PUBLISHED = "published"
+RETRY = "retry"
+DEAD = "dead"
+
+UNCERTAIN_CRASH = "el bot se detuvo durante el envío: comprueba el canal antes de reintentar"
+UNCERTAIN_TIMEOUT = "Telegram no respondió a tiempo: comprueba el canal antes de reintentar"
+
+# Timeouts en los que la petición no llegó a salir: se pueden reintentar
+_NOT_SENT = (httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class Attempt(NamedTuple):
+    result: str
+    item: Any
+    error: Optional[Exception] = None
+
+
+def is_permanent(error):
+    """Errores del propio item (``file_id`` caducado, texto demasiado largo...)
+    que se repetirían en cada reintento"""
+    if isinstance(error, ValueError):
+        return True
+    # ChatMigrated o "chat not found" dependen de la configuración, no del item
+    return isinstance(error, BadRequest) and not isinstance(error, ChatMigrated) \
+        and "chat not found" not in error.message.lower()
+
+
+def is_uncertain(error):
+    """La petición pudo llegar a Telegram aunque no haya respuesta"""
+    return isinstance(error, TimedOut) and not isinstance(error.__cause__, _NOT_SENT)
+
+
+class Outbox:
+    """Publicación de la cola con reintentos, espera exponencial y cola de fallidos"""
+
+    def __init__(self, store, queue, max_attempts=MAX_ATTEMPTS, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+        self._store = store
+        self._queue = queue
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.published = 0
+        self.retried = 0
+        self.dead = 0
+
+    def recover(self):
+        """Al arrancar: los envíos que quedaron a medias pasan a fallidos"""
+        buried = self._store.bury_sends(UNCERTAIN_CRASH)
+        self.dead += buried
+        return buried
+
+    def status(self):
+        return {
+            "published": self.published,
+            "retried": self.retried,
+            "dead": self.dead,
+            "dead_letter": self._store.count_items(status=STATUS_DEAD)
+        }
+
+    async def publish_next(self, publish, now=None):
+        """Enviar el próximo item listo con ``await publish(item)``; None si no había ninguno"""
+        item_id = self._queue.peek(now)
+        if item_id is None:
+            return None
+        claimed = self._store.begin_send(item_id)
+        if claimed is None:
+            self._queue.remove(item_id)  # Borrado por otra vía
+            return None
+        item, attempts = claimed
+        try:
+            await publish(item)
+        except Exception as e:
+            return self._failed(item, attempts, e, now or time.time())
+        self._store.delete_item(item.id)
+        self._queue.published(item.id)
+        self.published += 1
+        return Attempt(PUBLISHED, item)
+
+    def requeue(self, item_id):
+        """Devolver un item fallido a la cola"""
+        return self._queue.requeue(item_id)
+
+    def discard(self, item_id):
+        """Borrar un item fallido; devuelve el item o None"""
+        return self._store.delete_item(item_id, status=STATUS_DEAD)
+
+    def dead_items(self, offset=0, limit=10):
+        return self._store.dead_items(offset, limit)
+
+    def _failed(self, item, attempts, error, now):
+        if is_uncertain(error):
+            reason = UNCERTAIN_TIMEOUT
+        elif is_permanent(error) or attempts >= self.max_attempts:
+            reason = f"{type(error).__name__}: {error}"
+        else:
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+            if isinstance(error, RetryAfter):
+                retry_after = error.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                delay = max(delay, retry_after)
+            self._store.retry_send(item.id, now + delay, f"{type(error).__name__}: {error}")
+            self._queue.retry(item.id, now + delay)
+            self.retried += 1
+            logging.warning(f"⚠️ Envío de {item.LABEL} {item.id} falló ({error}); reintento {attempts} en {delay:.0f}s")
+            return Attempt(RETRY, item, error)
+        self._store.bury_send(item.id, reason)
+        self._queue.remove(item.id)
+        self.dead += 1
+        logging.error(f"❌ {item.LABEL.capitalize()} {item.id} pasa a fallidos tras {attempts} intento(s): {reason}")
+        return Attempt(DEAD, item, error)
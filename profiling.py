@@ -0,0 +1,148 @@
+"""Perfilado del proceso en ejecución.
+
+``UpdateTimer`` registra dos ``TypeHandler``: uno en el grupo más bajo, que
+anota cuándo empieza cada update, y otro en el más alto, que mide el total,
+lo vuelca en ``bot_update_duration_seconds`` y registra en el log las updates
+lentas junto con su tipo y el tiempo de cada handler que las atendió.
+
+``capture_profile`` y ``capture_allocations`` ejecutan cProfile o tracemalloc
+durante unos segundos sobre el event loop real (los usan los endpoints
+protegidos de FastAPI). Solo puede haber una captura a la vez.
+"""
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from telegram.ext import TypeHandler
+
+from metrics import Histogram
+
+SLOW_UPDATE_THRESHOLD = 1.0  # Segundos
+MAX_TRACKED_UPDATES = 1000  # Updates en curso que se recuerdan como mucho
+MAX_CAPTURE_SECONDS = 60
+
+UPDATE_LATENCY = Histogram(
+    "bot_update_duration_seconds", "Duración total de cada update, de todos sus handlers", ("kind",)
+)
+
+# Atributos de Update en orden de preferencia para clasificarla
+_UPDATE_KINDS = (
+    "callback_query", "message", "edited_message", "channel_post", "edited_channel_post",
+    "poll", "poll_answer", "my_chat_member", "chat_member", "chat_join_request", "inline_query",
+)
+_MESSAGE_KINDS = ("text", "voice", "poll", "photo", "video", "sticker", "document", "audio")
+
+
+def update_kind(update):
+    """Tipo legible de una update: ``callback_query``, ``message:voice``..."""
+    for attr in _UPDATE_KINDS:
+        value = getattr(update, attr, None)
+        if value is None:
+            continue
+        if attr == "message":
+            for content in _MESSAGE_KINDS:
+                if getattr(value, content, None):
+                    if content == "text" and value.text.startswith("/"):
+                        return "message:command"
+                    return f"message:{content}"
+        return attr
+    return type(update).__name__
+
+
+class UpdateTimer:
+    """Cronómetro por update con hooks previo y posterior a los handlers"""
+
+    def __init__(self, threshold=SLOW_UPDATE_THRESHOLD, max_tracked=MAX_TRACKED_UPDATES):
+        self.threshold = threshold
+        self.max_tracked = max_tracked
+        self._running = OrderedDict()  # id(update) -> (inicio, [(handler, segundos)])
+        self.slow_updates = 0
+
+    def install(self, application, first_group=-1000, last_group=1000):
+        application.add_handler(TypeHandler(object, self._before), group=first_group)
+        application.add_handler(TypeHandler(object, self._after), group=last_group)
+
+    def record(self, update, handler_name, duration):
+        """Anotar lo que tardó un handler (lo llama ``metrics.timed_handler``)"""
+        entry = self._running.get(id(update))
+        if entry is not None:
+            entry[1].append((handler_name, duration))
+
+    async def _before(self, update, context):
+        self._running[id(update)] = (time.perf_counter(), [])
+        while len(self._running) > self.max_tracked:
+            self._running.popitem(last=False)  # El hook posterior nunca llegó
+
+    async def _after(self, update, context):
+        entry = self._running.pop(id(update), None)
+        if entry is None:
+            return
+        started, handlers = entry
+        total = time.perf_counter() - started
+        kind = update_kind(update)
+        UPDATE_LATENCY.observe(total, kind)
+        if total >= self.threshold:
+            self.slow_updates += 1
+            detail = ", ".join(f"{name} {duration * 1000:.0f} ms" for name, duration in handlers) or "sin handlers"
+            logging.warning(f"🐢 Update lenta ({kind}): {total * 1000:.0f} ms [{detail}]")
+
+
+class CaptureBusy(RuntimeError):
+    """Ya hay otra captura en curso"""
+
+
+_capture_lock = asyncio.Lock()
+
+
+async def capture_profile(seconds, sort="cumulative", limit=40):
+    """cProfile del event loop durante ``seconds`` segundos, como texto de pstats"""
+    if _capture_lock.locked():
+        raise CaptureBusy("Ya hay una captura en curso")
+    seconds = min(max(seconds, 0.1), MAX_CAPTURE_SECONDS)
+    async with _capture_lock:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.sort_stats(sort).print_stats(limit)
+    return f"cProfile durante {seconds:.1f}s, ordenado por {sort}\n\n{output.getvalue()}"
+
+
+async def capture_allocations(seconds, limit=25, frames=1):
+    """Diferencia de tracemalloc entre el inicio y el final de ``seconds`` segundos"""
+    if _capture_lock.locked():
+        raise CaptureBusy("Ya hay una captura en curso")
+    seconds = min(max(seconds, 0.1), MAX_CAPTURE_SECONDS)
+    async with _capture_lock:
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(frames)
+        try:
+            before = tracemalloc.take_snapshot()
+            await asyncio.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+        finally:
+            if started_here:
+                tracemalloc.stop()
+
+    ignore = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    )
+    before = before.filter_traces(ignore)
+    after = after.filter_traces(ignore)
+    lines = [f"tracemalloc durante {seconds:.1f}s: top {limit} por crecimiento", ""]
+    lines.extend(str(stat) for stat in after.compare_to(before, "lineno")[:limit])
+    total = sum(stat.size for stat in after.statistics("filename"))
+    lines.append("")
+    lines.append(f"Memoria trazada al final: {total / 1e6:.1f} MB")
+    return "\n".join(lines)
@@ -0,0 +1,209 @@
+"""Cola de publicación automática con prioridades, horas programadas y reparto por tipo.
+
+La cola vive en el ``StateStore`` (items con estado ``queued``, su
+``queue_seq``, ``priority`` y ``publish_at``); aquí se indexa en memoria:
+
+* un diccionario ``item_id -> entrada`` para encontrar cualquier item en O(1);
+* un min-heap por tipo con los items listos, ordenados por (prioridad, orden
+  de llegada): menor prioridad sale antes;
+* un min-heap con los items programados para una hora (``publish_at``) o
+  esperando un reintento tras un envío fallido (``retry_at``, ver outbox.py),
+  que pasan a su heap de listos cuando llega el momento.
+
+Insertar, cancelar, subir o programar un item cuesta O(log n); las entradas
+sustituidas se marcan y se descartan al llegar a la cima. Entre tipos con la
+misma prioridad sale el que lleva más tiempo sin publicarse, así una racha de
+confesiones no deja sin turno a encuestas y audios.
+"""
+import heapq
+import itertools
+import time
+
+from storage import STATUS_QUEUED
+
+# Campos de una entrada (lista para poder marcarla como retirada). La versión,
+# única, desempata las copias de un mismo item antes de llegar a comparar ids
+_PRIORITY, _SEQ, _VERSION, _ID, _TYPE, _PUBLISH_AT, _RETRY_AT = range(7)
+
+
+def _in_order(heap):
+    """Entradas vigentes de un heap en orden, sin modificarlo (O(k log k) para k)"""
+    if not heap:
+        return
+    frontier = [(heap[0], 0)]
+    while frontier:
+        entry, index = heapq.heappop(frontier)
+        if entry[_ID] is not None:
+            yield entry
+        for child in (2 * index + 1, 2 * index + 2):
+            if child < len(heap):
+                heapq.heappush(frontier, (heap[child], child))
+
+
+class PublicationQueue:
+    """Índice en memoria de la cola de publicación respaldado por el store"""
+
+    def __init__(self, store):
+        self._store = store
+        self._entries = {}  # item_id -> [priority, seq, versión, item_id, type, publish_at, retry_at]
+        self._ready = {}  # tipo -> heap de entradas listas
+        self._scheduled = []  # (hora, seq, entrada) aún no listas
+        self._served = {}  # tipo -> turno en que se publicó por última vez
+        self._turns = itertools.count()
+        self._versions = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, item_id):
+        return item_id in self._entries
+
+    def load(self):
+        """Reconstruir el índice con los items en cola del store"""
+        self._entries = {}
+        self._ready = {}
+        self._scheduled = []
+        for item_id, item_type, seq, priority, publish_at, retry_at in self._store.queued_entries():
+            self._insert(priority, seq, item_id, item_type, publish_at, retry_at)
+        return len(self._entries)
+
+    def add(self, item_id, item_type, priority=0, publish_at=None):
+        """Pasar un item pendiente a la cola; False si ya no estaba pendiente"""
+        seq = self._store.enqueue(item_id, priority, publish_at)
+        if seq is None:
+            return False
+        self._insert(priority, seq, item_id, item_type, publish_at)
+        return True
+
+    def peek(self, now=None):
+        """Id del próximo item a publicar, o None si no hay ninguno listo"""
+        self._release(now or time.time())
+        best = None
+        for item_type, heap in self._ready.items():
+            while heap and heap[0][_ID] is None:
+                heapq.heappop(heap)
+            if heap:
+                key = (heap[0][_PRIORITY], self._served.get(item_type, -1), heap[0][_SEQ])
+                if best is None or key < best[0]:
+                    best = (key, heap[0][_ID])
+        return best[1] if best else None
+
+    def published(self, item_id):
+        """Retirar un item ya publicado y anotar el turno de su tipo"""
+        entry = self._discard(item_id)
+        if entry is not None:
+            self._served[entry[_TYPE]] = next(self._turns)
+        return entry is not None
+
+    def retry(self, item_id, retry_at):
+        """Apartar hasta ``retry_at`` un item cuyo envío falló (el store ya lo sabe)"""
+        entry = self._entries.get(item_id)
+        if entry is None:
+            return False
+        entry[_ID] = None
+        self._insert(entry[_PRIORITY], entry[_SEQ], item_id, entry[_TYPE], entry[_PUBLISH_AT], retry_at)
+        return True
+
+    def requeue(self, item_id):
+        """Devolver al final de la cola un item fallido; False si no estaba entre los fallidos"""
+        row = self._store.requeue(item_id)
+        if row is None:
+            return False
+        seq, item_type = row
+        self._insert(0, seq, item_id, item_type, None)
+        return True
+
+    def remove(self, item_id):
+        """Retirar un item del índice (el store no se toca)"""
+        return self._discard(item_id) is not None
+
+    def cancel(self, item_id):
+        """Sacar un item de la cola y borrarlo; devuelve el item o None.
+
+        Solo se borra si sigue en cola: un item que ya se está enviando
+        (``sending``) no se puede cancelar.
+        """
+        if item_id not in self._entries:
+            return None
+        item = self._store.delete_item(item_id, status=STATUS_QUEUED)
+        if item is not None:
+            self._discard(item_id)
+        return item
+
+    def move_to_front(self, item_id, now=None):
+        """Dar al item la mayor prioridad de la cola y publicarlo en cuanto toque"""
+        entry = self._entries.get(item_id)
+        if entry is None:
+            return False
+        self._release(now or time.time())
+        heads = [heap[0][_PRIORITY] for heap in self._ready.values() if heap]
+        priority = min(heads + [entry[_PRIORITY]]) - 1
+        self._update(entry, priority, None)
+        return True
+
+    def schedule(self, item_id, publish_at):
+        """Publicar el item no antes de ``publish_at`` (None: en cuanto toque)"""
+        entry = self._entries.get(item_id)
+        if entry is None:
+            return False
+        self._update(entry, entry[_PRIORITY], publish_at)
+        return True
+
+    def ordered(self, now=None):
+        """Items listos en el orden en que se publicarían: (item_id, tipo)"""
+        self._release(now or time.time())
+        served = dict(self._served)
+        turns = itertools.count(next(self._turns))
+        streams = {item_type: _in_order(heap) for item_type, heap in self._ready.items()}
+        heads = {item_type: next(stream, None) for item_type, stream in streams.items()}
+        heads = {item_type: head for item_type, head in heads.items() if head is not None}
+        while heads:
+            item_type = min(
+                heads, key=lambda t: (heads[t][_PRIORITY], served.get(t, -1), heads[t][_SEQ])
+            )
+            entry = heads[item_type]
+            yield entry[_ID], item_type
+            served[item_type] = next(turns)
+            head = next(streams[item_type], None)
+            if head is None:
+                del heads[item_type]
+            else:
+                heads[item_type] = head
+
+    def page(self, offset=0, limit=10, now=None):
+        """``limit`` items listos a partir de la posición ``offset`` (empezando en 0)"""
+        return list(itertools.islice(self.ordered(now), offset, offset + limit))
+
+    def scheduled(self, limit=10):
+        """Los próximos items programados o a la espera de reintento: (hora, item_id, tipo)"""
+        upcoming = heapq.nsmallest(limit, (item for item in self._scheduled if item[2][_ID] is not None))
+        return [(publish_at, entry[_ID], entry[_TYPE]) for publish_at, _, entry in upcoming]
+
+    def _insert(self, priority, seq, item_id, item_type, publish_at, retry_at=None):
+        entry = [priority, seq, next(self._versions), item_id, item_type, publish_at, retry_at]
+        self._entries[item_id] = entry
+        ready_at = max(publish_at or 0, retry_at or 0)
+        if ready_at > time.time():
+            heapq.heappush(self._scheduled, (ready_at, seq, entry))
+        else:
+            heapq.heappush(self._ready.setdefault(entry[_TYPE], []), entry)
+
+    def _update(self, entry, priority, publish_at):
+        self._store.update_queue_entry(entry[_ID], priority, publish_at)
+        item_id = entry[_ID]
+        entry[_ID] = None  # La copia vieja queda en su heap hasta llegar a la cima
+        self._insert(priority, entry[_SEQ], item_id, entry[_TYPE], publish_at, entry[_RETRY_AT])
+
+    def _discard(self, item_id):
+        entry = self._entries.pop(item_id, None)
+        if entry is not None:
+            entry[_ID] = None
+        return entry
+
+    def _release(self, now):
+        """Pasar a listos los items programados cuya hora ya llegó"""
+        scheduled = self._scheduled
+        while scheduled and scheduled[0][0] <= now:
+            _, _, entry = heapq.heappop(scheduled)
+            if entry[_ID] is not None:
+                heapq.heappush(self._ready.setdefault(entry[_TYPE], []), entry)
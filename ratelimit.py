@@ -0,0 +1,82 @@
+"""Límite de envíos por usuario con ventana deslizante.
+
+Cada tipo de contenido (texto, encuesta, voz, pregunta) tiene su propio límite
+``max_hits`` por ``window`` segundos. Solo se guardan los usuarios activos: las
+entradas (usuario, tipo) se mantienen en orden LRU y se descartan cuando su
+último envío sale de la ventana más larga o cuando se supera ``max_users``, así
+que la memoria depende de los usuarios recientes y no de todos los que han
+escrito alguna vez.
+"""
+import time
+from collections import OrderedDict
+
+# tipo -> (envíos permitidos, ventana en segundos)
+DEFAULT_LIMITS = {
+    "text": (1, 60),
+    "poll": (1, 60),
+    "voice": (1, 60),
+    "question": (1, 60),
+}
+
+DEFAULT_MAX_USERS = 100_000
+
+
+def parse_limits(spec, defaults=DEFAULT_LIMITS):
+    """Interpretar ``"text=1/60,poll=2/300"`` sobre los límites por defecto"""
+    limits = dict(defaults)
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        kind, _, value = part.partition("=")
+        hits, _, window = value.partition("/")
+        limits[kind.strip()] = (int(hits), float(window))
+    return limits
+
+
+class SlidingWindowLimiter:
+    """Ventana deslizante por usuario y tipo con expulsión LRU/TTL"""
+
+    def __init__(self, limits=None, max_users=DEFAULT_MAX_USERS):
+        self.limits = dict(limits or DEFAULT_LIMITS)
+        self.max_users = max_users
+        self._ttl = max(window for _, window in self.limits.values())
+        # (user_id, tipo) -> marcas de tiempo dentro de la ventana, en orden LRU
+        self._hits = OrderedDict()
+
+    def __len__(self):
+        return len(self._hits)
+
+    def _evict(self, now):
+        hits = self._hits
+        ttl = self._ttl
+        while hits:
+            oldest = next(iter(hits.values()))
+            if now - oldest[-1] < ttl and len(hits) <= self.max_users:
+                break
+            hits.popitem(last=False)
+
+    def retry_after(self, user_id, kind, now=None):
+        """Segundos que debe esperar el usuario (0 si puede enviar ya)"""
+        hits = self._hits.get((user_id, kind))
+        if hits is None:
+            return 0
+        now = now or time.time()
+        max_hits, window = self.limits[kind]
+        if len(hits) < max_hits:
+            return 0
+        # hits[-max_hits] es el envío que debe salir de la ventana
+        return max(0, window - (now - hits[-max_hits]))
+
+    def hit(self, user_id, kind, now=None):
+        """Registrar un envío del usuario"""
+        now = now or time.time()
+        max_hits, window = self.limits[kind]
+        key = (user_id, kind)
+        hits = self._hits.pop(key, None)
+        if hits is None or max_hits == 1:
+            self._hits[key] = (now,)
+        else:
+            recent = tuple(t for t in hits if now - t < window)
+            self._hits[key] = recent[max(0, len(recent) - max_hits + 1):] + (now,)
+        self._evict(now)
@@ -0,0 +1,246 @@
+"""Reglas de contenido aplicadas antes de la moderación.
+
+Las normas que muestra /confesion (política, ofensas, mención repetida de una
+persona, datos privados) se describen en un fichero JSON::
+
+    {"rules": [
+        {"name": "politica", "action": "tag", "terms": ["psoe", "vox"]},
+        {"name": "datos_privados", "action": "priority", "patterns": ["phone", "email"]},
+        {"name": "mencion_repetida", "action": "priority", "patterns": ["handle"], "repeat": 3},
+        {"name": "enlaces", "action": "reject", "patterns": ["url"], "regex": ["t\\\\.me/"]}
+    ]}
+
+``terms`` son palabras o frases completas; se buscan todas a la vez con un
+autómata de Aho-Corasick sobre el texto normalizado (sin tildes, mayúsculas ni
+signos), en una sola pasada lineal. ``patterns`` son expresiones predefinidas
+(``PATTERNS``) y ``regex`` expresiones propias, que se aplican al texto
+original; las predefinidas solo se ejecutan si el texto contiene lo que
+necesitan para coincidir (``TRIGGERS``: una arroba, un dígito...). ``repeat`` exige que un mismo término o valor aparezca al menos esas
+veces. Las acciones, de menor a mayor: ``tag`` (etiqueta en el mensaje de
+moderación), ``priority`` (aviso destacado y envío prioritario) y ``reject``
+(rechazo automático sin pasar por moderación).
+
+El fichero se vuelve a leer cuando cambia (se comprueba como mucho cada
+``check_interval`` segundos); si el nuevo no es válido se conservan las reglas
+anteriores.
+"""
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter, deque
+from typing import NamedTuple
+
+from duplicates import normalize
+
+ACTION_TAG = "tag"
+ACTION_PRIORITY = "priority"
+ACTION_REJECT = "reject"
+ACTIONS = (ACTION_TAG, ACTION_PRIORITY, ACTION_REJECT)  # De menor a mayor severidad
+
+PATTERNS = {
+    # Móvil o fijo español (9 cifras empezando por 6-9) o número con prefijo
+    # internacional explícito; los separadores son espacios o guiones, así que
+    # no coinciden fechas, horas ni cantidades ("15-03-2024", "1 000 000 000")
+    "phone": r"(?<![\w+.,-])(?:\+\d{1,3}[ -]?\d(?:[ -]?\d){7,10}|(?:0034[ -]?)?[6-9]\d(?:[ -]?\d){7})(?!\d)",
+    "email": r"(?<![\w.+-])[\w.+-]+@[\w-]+(?:\.[\w-]+)+",
+    "handle": r"(?<![\w@])@[A-Za-z]\w{3,31}",
+    "url": r"(?:https?://|www\.|t\.me/)\S+",
+}
+# Subcadenas (en minúsculas) sin las que cada patrón no puede coincidir
+TRIGGERS = {
+    "phone": tuple("0123456789"),
+    "email": ("@",),
+    "handle": ("@",),
+    "url": ("http", "www.", "t.me/"),
+}
+
+CHECK_INTERVAL = 5  # Segundos mínimos entre comprobaciones del fichero
+
+
+class Rule(NamedTuple):
+    name: str
+    action: str
+    repeat: int
+
+
+class Hit(NamedTuple):
+    rule: str
+    action: str
+    value: str  # Término o texto que activó la regla
+
+
+class Verdict(NamedTuple):
+    action: str  # La más severa de las reglas activadas, o None
+    hits: tuple
+
+    @property
+    def rejected(self):
+        return self.action == ACTION_REJECT
+
+    @property
+    def prioritised(self):
+        return self.action == ACTION_PRIORITY
+
+    def note(self):
+        """Resumen para el mensaje de moderación (None si no hay coincidencias)"""
+        if not self.hits:
+            return None
+        by_rule = {}
+        for hit in self.hits:
+            by_rule.setdefault((hit.rule, hit.action), []).append(hit.value)
+        lines = []
+        for (rule, action), values in by_rule.items():
+            icon = "🚨" if action == ACTION_PRIORITY else "🏷️" if action == ACTION_TAG else "⛔"
+            shown = ", ".join(dict.fromkeys(values))
+            lines.append(f"{icon} {rule}: {shown[:80]}")
+        return "\n".join(lines)
+
+
+NO_MATCH = Verdict(None, ())
+
+
+class AhoCorasick:
+    """Autómata determinista: una transición por carácter, sin retrocesos"""
+
+    def __init__(self, patterns):
+        """``patterns``: iterable de (cadena, valor); ``search`` devuelve los valores"""
+        goto = [{}]
+        outputs = [()]
+        for pattern, value in patterns:
+            state = 0
+            for char in pattern:
+                nxt = goto[state].get(char)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto.append({})
+                    outputs.append(())
+                    goto[state][char] = nxt
+                state = nxt
+            outputs[state] += (value,)
+
+        # Enlaces de fallo en anchura; cada estado hereda las transiciones y las
+        # salidas de su estado de fallo, así la búsqueda nunca retrocede
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            delta[state] = {**delta[fail[state]], **goto[state]}
+            for char, nxt in goto[state].items():
+                fail[nxt] = delta[fail[state]].get(char, 0) if state else 0
+                outputs[nxt] += outputs[fail[nxt]]
+                queue.append(nxt)
+        self._delta = delta
+        self._outputs = [values or None for values in outputs]
+
+    def __len__(self):
+        return len(self._delta)
+
+    def search(self, text):
+        """Valores de todos los patrones presentes en ``text`` (con repeticiones)"""
+        delta = self._delta
+        outputs = self._outputs
+        found = []
+        state = 0
+        for char in text:
+            state = delta[state].get(char, 0)
+            if outputs[state] is not None:
+                found.extend(outputs[state])
+        return found
+
+
+class RuleSet:
+    """Reglas compiladas: un autómata para todos los términos y una regex para el resto"""
+
+    def __init__(self, config):
+        self.rules = []
+        terms = []
+        sources = {}  # regex -> (disparadores, índices de las reglas que la usan)
+        for index, spec in enumerate(config.get("rules", [])):
+            name = spec["name"]
+            action = spec.get("action", ACTION_TAG)
+            if action not in ACTIONS:
+                raise ValueError(f"Acción desconocida en la regla {name!r}: {action!r}")
+            self.rules.append(Rule(name, action, int(spec.get("repeat", 1))))
+            patterns = [(PATTERNS[pattern], TRIGGERS.get(pattern)) for pattern in spec.get("patterns", [])]
+            for source, triggers in patterns + [(source, None) for source in spec.get("regex", [])]:
+                sources.setdefault(source, (triggers, []))[1].append(index)
+            for term in spec.get("terms", []):
+                normalized = normalize(term)
+                if normalized:
+                    # Espacios a ambos lados: solo palabras completas
+                    terms.append((f" {normalized} ", (index, normalized)))
+        self.automaton = AhoCorasick(terms)
+        self._regexes = [
+            (re.compile(source, re.IGNORECASE), triggers, owners) for source, (triggers, owners) in sources.items()
+        ]
+
+    def __len__(self):
+        return len(self.rules)
+
+    def evaluate(self, text):
+        if not text or not self.rules:
+            return NO_MATCH
+        counts = Counter(self.automaton.search(f" {normalize(text)} "))
+        lowered = text.lower()
+        for regex, triggers, owners in self._regexes:
+            if triggers and not any(trigger in lowered for trigger in triggers):
+                continue
+            for match in regex.finditer(text):
+                value = match.group(0).lower()
+                for index in owners:
+                    counts[index, value] += 1
+
+        hits = [
+            Hit(self.rules[index].name, self.rules[index].action, value)
+            for (index, value), count in counts.items()
+            if count >= self.rules[index].repeat
+        ]
+        if not hits:
+            return NO_MATCH
+        action = max((hit.action for hit in hits), key=ACTIONS.index)
+        return Verdict(action, tuple(hits))
+
+
+class RuleEngine:
+    """``RuleSet`` cargado de un fichero que se recarga al cambiar"""
+
+    def __init__(self, path, check_interval=CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self.rules = RuleSet({})
+        self._mtime = None
+        self._checked_at = 0.0
+        self.reloads = 0
+
+    def load(self):
+        """Leer el fichero si ha cambiado; devuelve True si se cargaron reglas nuevas"""
+        self._checked_at = time.monotonic()
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            if self._mtime is not None:
+                logging.warning(f"⚠️ {self.path} ya no existe: se mantienen las reglas cargadas")
+            return False
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                rules = RuleSet(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError, re.error) as e:
+            logging.error(f"❌ Reglas no válidas en {self.path}, se mantienen las anteriores: {e}")
+            return False
+        self.rules = rules
+        self.reloads += 1
+        logging.info(f"📏 {len(rules)} regla(s) cargadas de {self.path} ({len(rules.automaton)} estados)")
+        return True
+
+    def evaluate(self, text):
+        """``Verdict`` de ``text`` con las reglas vigentes"""
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.load()
+        return self.rules.evaluate(text)
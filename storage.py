@@ -0,0 +1,456 @@
+"""Almacenamiento del estado del bot en SQLite (modo WAL).
+
+Sustituye a los diccionarios globales: cada item pendiente o en cola es una
+fila de ``items`` indexada por id, usuario, tipo, estado y fecha, de modo que
+las consultas son O(log n), la memoria del proceso no crece con el backlog y
+tras una caída el estado está disponible en cuanto se abre la base de datos.
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from items import make_item
+
+# Estados de un item
+STATUS_PENDING = "pending"  # Esperando moderación
+STATUS_QUEUED = "queued"  # Aprobado, en la cola de publicación automática
+STATUS_PROCESSING = "processing"  # Publicándose ahora mismo (ver claim_item)
+STATUS_SENDING = "sending"  # Enviándose al canal desde la cola (ver outbox.py)
+STATUS_DEAD = "dead"  # Su publicación falló sin remedio: la revisan los moderadores
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    queue_seq INTEGER,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_items_user ON items(user_id);
+CREATE INDEX IF NOT EXISTS idx_items_type_status ON items(type, status, created_at);
+CREATE INDEX IF NOT EXISTS idx_items_status_created ON items(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_items_queue ON items(status, queue_seq);
+
+CREATE TABLE IF NOT EXISTS bans (
+    user_id INTEGER PRIMARY KEY,
+    until REAL NOT NULL,
+    strikes INTEGER NOT NULL DEFAULT 1,
+    last_ban_at REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_bans_until ON bans(until);
+
+CREATE TABLE IF NOT EXISTS scheduled_deletions (
+    chat_id TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    delete_at REAL NOT NULL,
+    PRIMARY KEY (chat_id, message_id)
+);
+
+CREATE TABLE IF NOT EXISTS fingerprints (
+    item_id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    exact INTEGER NOT NULL,
+    signature BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_created ON fingerprints(created_at);
+
+CREATE TABLE IF NOT EXISTS mentions (
+    item_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (item_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_mentions_created ON mentions(created_at);
+
+-- Los límites de envío viven ahora en memoria (ratelimit.py)
+DROP TABLE IF EXISTS submissions;
+"""
+
+# Columnas añadidas después de crear la tabla: (tabla, columna, definición)
+MIGRATIONS = (
+    ("bans", "strikes", "INTEGER NOT NULL DEFAULT 1"),
+    ("bans", "last_ban_at", "REAL NOT NULL DEFAULT 0"),
+    ("items", "message_id", "INTEGER"),
+    ("items", "priority", "INTEGER NOT NULL DEFAULT 0"),
+    ("items", "publish_at", "REAL"),
+    ("items", "attempts", "INTEGER NOT NULL DEFAULT 0"),
+    ("items", "retry_at", "REAL"),
+    ("items", "last_error", "TEXT"),
+)
+
+# Columnas que lee _row_to_item
+ITEM_COLUMNS = "id, type, status, user_id, created_at, payload, message_id"
+
+
+class StateStore:
+    """Capa de acceso al estado persistente del bot"""
+
+    def __init__(self, path="bot_state.db"):
+        self.path = path
+        # El servidor FastAPI consulta desde otro hilo: una conexión compartida
+        # protegida por un lock es suficiente para este volumen
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # FULL: cada commit queda en disco antes de confirmar al usuario
+            self._conn.execute("PRAGMA synchronous=FULL")
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+
+    def _migrate(self):
+        """Añadir a bases de datos existentes las columnas nuevas del esquema"""
+        for table, column, definition in MIGRATIONS:
+            columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def _executemany(self, sql, rows):
+        """Varias filas en una sola transacción (un solo fsync)"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(sql, rows)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _fetchone(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @property
+    def changes(self):
+        """Número total de filas modificadas desde que se abrió la conexión"""
+        return self._conn.total_changes
+
+    # --- Items -----------------------------------------------------------
+
+    @staticmethod
+    def _row_to_item(row):
+        item_id, item_type, status, user_id, created_at, payload, message_id = row
+        item = make_item(item_type, item_id, user_id, created_at, json.loads(payload), status)
+        item.message_id = message_id
+        return item
+
+    def add_item(self, item, status=STATUS_PENDING):
+        """Guardar un item nuevo (ver items.py)"""
+        now = time.time()
+        item.created_at = item.created_at or now
+        item.status = status
+        self._execute(
+            "INSERT OR REPLACE INTO items (id, type, status, user_id, created_at, updated_at, payload) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (item.id, item.TYPE, status, item.user_id, item.created_at, now,
+             json.dumps(item.payload(), ensure_ascii=False, separators=(',', ':'))),
+        )
+
+    def get_item(self, item_id, item_type=None, status=STATUS_PENDING):
+        """Devolver el item (ver items.py), o None si ya no existe"""
+        sql = f"SELECT {ITEM_COLUMNS} FROM items WHERE id = ?"
+        params = [item_id]
+        if item_type is not None:
+            sql += " AND type = ?"
+            params.append(item_type)
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+        row = self._fetchone(sql, params)
+        return self._row_to_item(row) if row else None
+
+    def has_item(self, item_id, item_type=None, status=STATUS_PENDING):
+        return self.get_item(item_id, item_type, status) is not None
+
+    def delete_item(self, item_id, status=None):
+        """Eliminar un item (solo si está en ``status``, si se indica) y devolverlo (None si no existía)"""
+        sql = "DELETE FROM items WHERE id = ?"
+        params = [item_id]
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+        with self._lock:
+            row = self._conn.execute(f"{sql} RETURNING {ITEM_COLUMNS}", params).fetchone()
+        return self._row_to_item(row) if row else None
+
+    def set_message_id(self, item_id, message_id):
+        """Recordar el mensaje del grupo de moderación que muestra el item"""
+        self._execute("UPDATE items SET message_id = ? WHERE id = ?", (message_id, item_id))
+
+    def pending_items(self, item_type=None, created_before=None, limit=-1):
+        """Items pendientes, del más antiguo al más reciente"""
+        sql = f"SELECT {ITEM_COLUMNS} FROM items WHERE status = ?"
+        params = [STATUS_PENDING]
+        if item_type is not None:
+            sql += " AND type = ?"
+            params.append(item_type)
+        if created_before is not None:
+            sql += " AND created_at <= ?"
+            params.append(created_before)
+        sql += " ORDER BY created_at LIMIT ?"
+        params.append(limit)
+        return [self._row_to_item(row) for row in self._fetchall(sql, params)]
+
+    def claim_item(self, item_id):
+        """Reservar un item pendiente para publicarlo; False si otro ya lo hizo"""
+        cursor = self._execute(
+            "UPDATE items SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (STATUS_PROCESSING, time.time(), item_id, STATUS_PENDING),
+        )
+        return cursor.rowcount == 1
+
+    def release_item(self, item_id):
+        """Devolver a pendientes un item reservado cuya publicación falló"""
+        self._execute(
+            "UPDATE items SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (STATUS_PENDING, time.time(), item_id, STATUS_PROCESSING),
+        )
+
+    def max_item_id(self):
+        return self._fetchone("SELECT MAX(id) FROM items")[0] or 0
+
+    def count_items(self, item_type=None, status=STATUS_PENDING):
+        sql = "SELECT COUNT(*) FROM items WHERE status = ?"
+        params = [status]
+        if item_type is not None:
+            sql += " AND type = ?"
+            params.append(item_type)
+        return self._fetchone(sql, params)[0]
+
+    def item_stats(self):
+        """Lista de (tipo, estado, número de items, created_at del más antiguo)"""
+        return self._fetchall(
+            "SELECT type, status, COUNT(*), MIN(created_at) FROM items GROUP BY type, status"
+        )
+
+    # --- Cola de publicación --------------------------------------------
+
+    def enqueue(self, item_id, priority=0, publish_at=None):
+        """Pasar un item pendiente al final de la cola; devuelve su ``queue_seq`` o None"""
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE items SET status = ?, updated_at = ?, priority = ?, publish_at = ?, "
+                "queue_seq = (SELECT COALESCE(MAX(queue_seq), 0) + 1 FROM items WHERE status = ?) "
+                "WHERE id = ? AND status = ? RETURNING queue_seq",
+                (STATUS_QUEUED, time.time(), priority, publish_at, STATUS_QUEUED, item_id, STATUS_PENDING),
+            ).fetchone()
+        return row[0] if row else None
+
+    def queued_entries(self):
+        """Lista de (id, type, queue_seq, priority, publish_at, retry_at) de los items en cola"""
+        return self._fetchall(
+            "SELECT id, type, queue_seq, priority, publish_at, retry_at FROM items WHERE status = ?",
+            (STATUS_QUEUED,),
+        )
+
+    def update_queue_entry(self, item_id, priority, publish_at):
+        self._execute(
+            "UPDATE items SET priority = ?, publish_at = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (priority, publish_at, time.time(), item_id, STATUS_QUEUED),
+        )
+
+    def queue_length(self):
+        return self.count_items(status=STATUS_QUEUED)
+
+    # --- Envíos de la cola (outbox) -------------------------------------
+
+    def begin_send(self, item_id):
+        """Marcar un item en cola como enviándose y sumarle un intento: (item, intentos) o None"""
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE items SET status = ?, attempts = attempts + 1, updated_at = ? "
+                f"WHERE id = ? AND status = ? RETURNING {ITEM_COLUMNS}, attempts",
+                (STATUS_SENDING, time.time(), item_id, STATUS_QUEUED),
+            ).fetchone()
+        return (self._row_to_item(row[:-1]), row[-1]) if row else None
+
+    def retry_send(self, item_id, retry_at, error):
+        """Devolver a la cola un envío fallido, sin salir antes de ``retry_at``"""
+        self._execute(
+            "UPDATE items SET status = ?, retry_at = ?, last_error = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (STATUS_QUEUED, retry_at, error, time.time(), item_id, STATUS_SENDING),
+        )
+
+    def bury_send(self, item_id, error, status=STATUS_SENDING):
+        """Pasar a fallidos un envío (de la cola, o un item reservado con ``claim_item``) que no se va a reintentar"""
+        self._execute(
+            "UPDATE items SET status = ?, attempts = MAX(attempts, 1), retry_at = NULL, last_error = ?, "
+            "updated_at = ? WHERE id = ? AND status = ?",
+            (STATUS_DEAD, error, time.time(), item_id, status),
+        )
+
+    def bury_sends(self, error, status=STATUS_SENDING):
+        """Tras una caída, pasar a fallidos los envíos (de la cola, o reservados
+        con ``claim_item``) que no se sabe si llegaron"""
+        cursor = self._execute(
+            "UPDATE items SET status = ?, attempts = MAX(attempts, 1), retry_at = NULL, last_error = ?, "
+            "updated_at = ? WHERE status = ?",
+            (STATUS_DEAD, error, time.time(), status),
+        )
+        return cursor.rowcount
+
+    def dead_items(self, offset=0, limit=10):
+        """Lista de (item, intentos, último error, hora del fallo), del fallo más reciente al más antiguo"""
+        rows = self._fetchall(
+            f"SELECT {ITEM_COLUMNS}, attempts, last_error, updated_at FROM items WHERE status = ? "
+            "ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+            (STATUS_DEAD, limit, offset),
+        )
+        return [(self._row_to_item(row[:-3]), *row[-3:]) for row in rows]
+
+    def requeue(self, item_id):
+        """Devolver un item fallido al final de la cola con los intentos a cero; (queue_seq, type) o None"""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE items SET status = ?, updated_at = ?, priority = 0, publish_at = NULL, "
+                "attempts = 0, retry_at = NULL, last_error = NULL, "
+                "queue_seq = (SELECT COALESCE(MAX(queue_seq), 0) + 1 FROM items WHERE status = ?) "
+                "WHERE id = ? AND status = ? RETURNING queue_seq, type",
+                (STATUS_QUEUED, time.time(), STATUS_QUEUED, item_id, STATUS_DEAD),
+            ).fetchone()
+
+    # --- Sanciones -------------------------------------------------------
+
+    def ban_user(self, user_id, until, strikes=1, banned_at=None):
+        self._execute(
+            "INSERT INTO bans (user_id, until, strikes, last_ban_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET until = excluded.until, "
+            "strikes = excluded.strikes, last_ban_at = excluded.last_ban_at",
+            (int(user_id), until, strikes, banned_at if banned_at is not None else time.time()),
+        )
+
+    def get_ban(self, user_id):
+        """(until, strikes, last_ban_at) del usuario, o None"""
+        return self._fetchone(
+            "SELECT until, strikes, last_ban_at FROM bans WHERE user_id = ?", (int(user_id),)
+        )
+
+    def active_bans(self, now):
+        """Lista de (user_id, until) de las sanciones aún vigentes"""
+        return self._fetchall("SELECT user_id, until FROM bans WHERE until > ?", (now,))
+
+    def purge_bans(self, now, strike_cutoff):
+        """Borrar sanciones vencidas que ya no cuentan como reincidencia"""
+        cursor = self._execute(
+            "DELETE FROM bans WHERE until <= ? AND last_ban_at < ?", (now, strike_cutoff)
+        )
+        return cursor.rowcount
+
+    def count_bans(self):
+        return self._fetchone("SELECT COUNT(*) FROM bans")[0]
+
+    # --- Borrados programados -------------------------------------------
+
+    def add_deletions(self, chat_id, message_ids, delete_at):
+        self._executemany(
+            "INSERT OR REPLACE INTO scheduled_deletions (chat_id, message_id, delete_at) VALUES (?, ?, ?)",
+            [(str(chat_id), message_id, delete_at) for message_id in message_ids],
+        )
+
+    def remove_deletions(self, chat_id, message_ids):
+        self._executemany(
+            "DELETE FROM scheduled_deletions WHERE chat_id = ? AND message_id = ?",
+            [(str(chat_id), message_id) for message_id in message_ids],
+        )
+
+    def scheduled_deletions(self):
+        """Lista de (delete_at, chat_id, message_id) pendientes de borrar"""
+        return self._fetchall("SELECT delete_at, chat_id, message_id FROM scheduled_deletions")
+
+    # --- Huellas de duplicados --------------------------------------------
+
+    def add_fingerprint(self, item_id, created_at, exact, signature):
+        self._execute(
+            "INSERT OR REPLACE INTO fingerprints (item_id, created_at, exact, signature) VALUES (?, ?, ?, ?)",
+            (item_id, created_at, exact, signature),
+        )
+
+    def fingerprints(self):
+        """Lista de (item_id, created_at, exact, signature) en orden de llegada"""
+        return self._fetchall(
+            "SELECT item_id, created_at, exact, signature FROM fingerprints ORDER BY created_at"
+        )
+
+    def purge_fingerprints(self, before):
+        cursor = self._execute("DELETE FROM fingerprints WHERE created_at < ?", (before,))
+        return cursor.rowcount
+
+    # --- Menciones ---------------------------------------------------------
+
+    def add_mentions(self, item_id, created_at, names):
+        self._executemany(
+            "INSERT OR IGNORE INTO mentions (item_id, name, created_at) VALUES (?, ?, ?)",
+            [(item_id, name, created_at) for name in names],
+        )
+
+    def mentions(self):
+        """Lista de (created_at, name) en orden de llegada"""
+        return self._fetchall("SELECT created_at, name FROM mentions ORDER BY created_at")
+
+    def purge_mentions(self, before):
+        cursor = self._execute("DELETE FROM mentions WHERE created_at < ?", (before,))
+        return cursor.rowcount
+
+    # --- Copias de seguridad ---------------------------------------------
+
+    def is_empty(self):
+        return (
+            self._fetchone("SELECT COUNT(*) FROM items")[0] == 0
+            and self.count_bans() == 0
+        )
+
+    def backup_to(self, path):
+        """Copia consistente de la base de datos (API de backup de SQLite).
+
+        Lee con una conexión propia de solo lectura: en modo WAL ve una
+        instantánea fija mientras la conexión principal sigue escribiendo, así
+        que la copia no retiene ``_lock`` ni bloquea a los handlers.
+        """
+        source = sqlite3.connect(Path(self.path).resolve().as_uri() + "?mode=ro", uri=True)
+        target = sqlite3.connect(path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+
+    def import_legacy(self, state):
+        """Importar el estado del antiguo backup JSON (dicts + cola)"""
+        kinds = {
+            "pending_confessions": "text",
+            "pending_polls": "poll",
+            "pending_voices": "voice",
+            "pending_questions": "question",
+        }
+        with self._lock:
+            self._conn.execute("BEGIN")
+        try:
+            for name, item_type in kinds.items():
+                for item_id, data in state.get(name, {}).items():
+                    self.add_item(make_item(item_type, int(item_id), data["user_id"], data.get("timestamp"), data))
+            for data in state.get("publication_queue", []):
+                self.add_item(make_item(data["_type"], data["_id"], data["user_id"], data.get("timestamp"), data))
+                self.enqueue(data["_id"])
+            for user_id, until in state.get("banned_users", {}).items():
+                self.ban_user(int(user_id), until)
+        except Exception:
+            self._execute("ROLLBACK")
+            raise
+        self._execute("COMMIT")